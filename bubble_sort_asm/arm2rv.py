@@ -12,15 +12,31 @@ ARM (armv4t/arm7tdmi) → RV32I Assembly Translator
   6. 前索引写回  str rd,[rn,#imm]!    →  addi rn,rn,imm + sw rd,0(rn)
   7. 后索引写回  ldr rd,[rn],#imm     →  lw rd,0(rn) + addi rn,rn,imm
   8. smull / umull / smlal            →  mul + mulh[u]
+  9. 临时寄存器                        →  轮转池 t1..t5（与 _REG_MAP 不相交），
+                                          叶函数内 cmp / rsb 的立即数在入口处一次性装入常驻寄存器
+ 10. 条件执行 movgt / addlt / ldrne…   →  无分支 slt/sltu + and/xor 选择，或跳过分支；
+                                          按 NOP 数 + 跳转冲刷逐处估算周期，取较小者；
+                                          mi / pl（含 bmi / bpl）只在与 0 比较后翻译，否则 [UNTRANSLATED]
+
+直接交接（不经过文本往返）:
+  Translator.translate_records() 产出 rv32i_asm_improved.iter_sections 格式的条目，
+  指令条目为 ('CODE', (mn, args, (ARM 行号, ARM 原文)))，汇编器不再去注释 / 分段 / 正则拆助记符；
+  assemble_arm() 串起 翻译 → assemble_sections，返回内存中的镜像 dict，
+  img["provenance"][i] 为第 i 条 RV 指令的 ARM 来源行，hazard_report() 据此把 RAW 冒险指回 ARM 源码。
 
 用法:
-  python3 arm_to_rv32i.py input_arm.s [output_rv32i.s]
+  python3 arm_to_rv32i.py input_arm.s [output_rv32i.s] [--predicate auto|branchless|branchy]
+  python3 arm2rv.py input_arm.s --asm [--nops optimal] [--imem imem.hex --dmem dmem.hex]
+      # 内存中翻译 + 汇编 → <stem>.listing / <stem>.vh（listing 每行带 ← L<ARM 行号>）+ 冒险来源报告
 """
 
+import os
 import re
 import sys
 from typing import Dict, List, Optional, Set, Tuple
 
+from rv32i_isa import parse_int
+
 # ═══════════════════════════════════════════════════════════════════════════
 #  寄存器映射  ARM → RV32I  (尽量保持 ABI 语义一致)
 # ═══════════════════════════════════════════════════════════════════════════
@@ -177,29 +193,153 @@ class Translator:
         'asr': ('srai', 'sra'),
     }
 
+    # 临时寄存器池：不与任何 ARM 寄存器的映射重合，写它们不会覆盖 ARM 可见的值。
+    # 轮转分配 —— 相邻 ARM 指令各自的临时值落在不同寄存器上，挂起的 cmp 操作数不会被后面的展开覆盖。
+    _SCRATCH: Tuple[str, ...] = ('t1', 't2', 't3', 't4', 't5')
+    _MAX_CONSTS = 2      # 叶函数常驻常量最多占几个（其余至少留 2 个给轮转 + 1 个给挂起的 cmp）
+
+    # 条件执行：cond → (比较, 交换操作数, 取反)。flag = 比较(x, y) ∈ {0, 1}（cmp x, y），
+    # 条件成立 ⇔ flag ^ 取反。mi / pl 只在与 0 比较时（cmp rX,#0 或 _FLAG_NZ）等于 lt / ge，见 _cond_known
+    _COND_FLAG: Dict[str, Tuple[str, bool, bool]] = {
+        'eq': ('seq',  False, False), 'ne': ('seq',  False, True),
+        'lt': ('slt',  False, False), 'ge': ('slt',  False, True),
+        'gt': ('slt',  True,  False), 'le': ('slt',  True,  True),
+        'lo': ('sltu', False, False), 'hs': ('sltu', False, True),
+        'cc': ('sltu', False, False), 'cs': ('sltu', False, True),
+        'hi': ('sltu', True,  False), 'ls': ('sltu', True,  True),
+        'mi': ('slt',  False, False), 'pl': ('slt',  False, True),
+    }
+    _COND_NOT: Dict[str, str] = {
+        'eq': 'ne', 'ne': 'eq', 'lt': 'ge', 'ge': 'lt', 'gt': 'le', 'le': 'gt',
+        'lo': 'hs', 'hs': 'lo', 'cc': 'cs', 'cs': 'cc', 'hi': 'ls', 'ls': 'hi',
+        'mi': 'pl', 'pl': 'mi',
+    }
+    # UAL（addsgt / ldrbeq）与旧语法（addgts / ldreqb）都接受；带 s 的条件指令按不改标志处理
+    _PRED_RE = re.compile(
+        r'^(mov|mvn|add|sub|rsb|and|orr|eor|bic|lsl|lsr|asr|'
+        r'ldrsb|ldrsh|ldrb|ldrh|ldr|strb|strh|str)s?'
+        r'(eq|ne|lt|ge|gt|le|lo|hs|cc|cs|hi|ls|mi|pl)(sb|sh|s|b|h)?$')
+    _MEM_OPS = {'ldr', 'ldrb', 'ldrh', 'ldrsb', 'ldrsh', 'str', 'strb', 'strh'}
+
+    # 标志位的生命期：cmp 之后一直有效（条件分支不改标志，落空路径上的条件指令照用），
+    # 到标签（可能从别处跳来）、调用、无条件转移或下一条改标志的指令为止。
+    # _FLAG_NZ 的结果按“与 0 比较”记下 —— 只有 N / Z 与之相符，C / V 不跟踪，所以只认 eq / ne / mi / pl；
+    # _FLAG_KILL 只作废。
+    _FLAG_NZ = {'adds', 'subs', 'rsbs', 'muls', 'ands', 'orrs', 'eors'}
+    _FLAG_KILL = {'tst', 'teq', 'movs', 'mvns', 'bics', 'lsls', 'lsrs', 'asrs', 'rors',
+                  'adcs', 'sbcs', 'rscs', 'smulls', 'umulls', 'smlals',
+                  'b', 'bl', 'bx', 'blx', 'swi', 'svc'}
+    _NZ_CONDS = {'eq', 'ne', 'mi', 'pl'}
+
+    _TAKEN_CYCLES = 2     # 跳转成立占 2 个周期（ID 冲刷一拍，同 rv32i_sim 的 step = 2）
+    _P_COND       = 0.5   # 代价模型里条件成立的概率（静态翻译不知道数据，取对半）
+
     _DROP = {
         '.cpu', '.eabi_attribute', '.arch', '.syntax', '.arm', '.thumb',
         '.fpu', '.code', '.force_thumb', '.thumb_func',
     }
 
-    def __init__(self):
+    def __init__(self, predicate: str = 'auto'):
+        if predicate not in ('auto', 'branchless', 'branchy'):
+            raise ValueError(f'predicate 须为 auto / branchless / branchy: {predicate!r}')
+        self.predicate:       str                        = predicate
         self._out:            List[str]                  = []
         self._cmp:            Optional[Tuple[str, str]]  = None
+        self._cmp_nz:         bool                       = False  # _cmp 来自 _FLAG_NZ 指令（只认 eq / ne / mi / pl）
         self._pool:           Dict[str, str]             = {}   # label → 符号名
         self._num_pool:       Dict[str, str]             = {}   # label → 数值字符串
         self._suppress_lines: Set[int]                   = set()
+        self._records:        Optional[List[tuple]]      = None   # translate_records 时收集
+        self._section:        str                        = 'text'
+        self._src:            Optional[Tuple[int, str]]  = None   # 当前 ARM 源行 (行号, 原文)
+        self.globls:          List[str]                  = []
+        self.notes:           List[Tuple[int, str]]      = []     # (ARM 行号, 警告 / 未翻译)
+        self._rot:            int                        = 0      # 轮转指针
+        self._leaf:           Set[str]                   = set()  # 不含 bl / swi 的函数
+        self._func:           Optional[str]              = None   # 刚见到 .type %function、待入口标签
+        self._entry:          Optional[Tuple[int, int]]  = None   # 当前叶函数入口在 _out / _records 中的位置
+        self._consts:         Dict[str, str]             = {}     # 立即数 → 常驻寄存器（当前叶函数）
+        self._written:        Set[str]                   = set()  # 本函数入口以来写过的临时寄存器
+        self._lines:          List[str]                  = []
+        self._idx:            int                        = 0      # 当前 ARM 行下标
+        self._cmp_gen:        int                        = 0      # 每条 cmp 加一，flag 缓存按代次失效
+        self._flag:           Dict[Tuple[int, str, bool], str] = {}   # (cmp 代次, 比较, 交换) → flag 寄存器
+        self._pinned:         Set[str]                   = set()  # 条件执行展开中途占用的临时寄存器
+        self._lbl:            int                        = 0
+        self.pred_sites:      List[Tuple[int, str, str, Optional[float], Optional[float]]] = []
+        #                     (ARM 行号, 条件指令, 选用方案, branchless 周期, branchy 周期；访存为 None)
+        self._const_src:      List[Tuple[str, str, Optional[Tuple[int, str]]]] = []   # (reg, imm, 首次使用的 ARM 行)
 
     # ── 公共入口 ─────────────────────────────────────────────────────────
     def translate(self, lines: List[str]) -> str:
+        self._run(lines)
+        return '\n'.join(self._out) + '\n'
+
+    def translate_records(self, lines: List[str]) -> List[tuple]:
+        """
+        返回 iter_sections 格式的条目（可直接交给 collect_sections）：
+          ('LABEL', name) / ('RLABEL', name) / ('WORD', value)
+          ('CODE', (mn, args, (ARM 行号, ARM 原文)))
+        """
+        self._records = []
+        self._run(lines)
+        return self._records
+
+    def _run(self, lines: List[str]):
         self._scan_literal_pool(lines)
+        self._scan_functions(lines)
         self._emit_rv_header()
+        self._lines = lines
         for idx, line in enumerate(lines):
             if idx not in self._suppress_lines:
+                self._idx = idx
+                self._src = (idx + 1, line.strip())
                 self._process_line(line)
-        return '\n'.join(self._out) + '\n'
+        self._end_function()
 
     def _emit(self, s: str):
         self._out.append(s)
+        if self._records is not None:
+            self._record(s)
+
+    # ── 结构化条目 ───────────────────────────────────────────────────────
+    #
+    # 生成的行只有四种形状：'label:'、'\t<mn>\t<args>'、'\t# 注释'、伪操作（原样透传）。
+    # 段切换与 .word 的处理与 rv32i_asm_improved.iter_sections 相同。
+    #
+    def _record(self, s: str):
+        t = s.strip()
+        if t.startswith('#'):
+            if self._src:
+                self.notes.append((self._src[0], t.lstrip('# ')))
+            return
+        if t.endswith(':') and not s.startswith('\t'):
+            kind = 'RLABEL' if self._section == 'rodata' else 'LABEL'
+            self._records.append((kind, t[:-1]))
+            return
+        if t.startswith('.'):
+            self._directive(t)
+            return
+        if self._section != 'text':
+            return
+        mn, _, args = t.partition('\t')
+        self._records.append(('CODE', (mn, args.split('#', 1)[0].strip(), self._src)))
+
+    def _directive(self, t: str):
+        lo = t.lower()
+        if lo.startswith('.section') and '.rodata' in lo:
+            self._section = 'rodata'
+        elif lo == '.text' or lo.startswith('.text '):
+            self._section = 'text'
+        elif lo == '.data':
+            self._section = 'data'
+        elif lo == '.rodata':
+            self._section = 'rodata'
+        elif lo.startswith('.globl'):
+            self.globls.append(t.split()[1])
+        elif lo.startswith('.word') and self._section == 'rodata':
+            val = parse_int(t.split(None, 1)[1].strip())
+            self._records.append(('WORD', val & 0xFFFFFFFF))
 
     def _warn(self, msg: str):
         self._emit(f'\t# [WARNING] {msg}')
@@ -245,6 +385,86 @@ class Translator:
                                 self._num_pool[label] = val   # 数值常量
             i += 1
 
+    def _scan_functions(self, lines: List[str]):
+        """
+        找出叶函数（.type f, %function … .size f 之间没有 bl / blx / swi / svc）。
+        t 寄存器是 caller-saved，被调函数可以随意改写，只有叶函数里常驻常量才安全。
+        """
+        cur = None
+        for line in lines:
+            s = re.sub(r'\s*@.*$', '', line).strip()
+            m = re.match(r'^\.type\s+([\w.$]+)\s*,\s*%function', s)
+            if m:
+                cur = m.group(1)
+                self._leaf.add(cur)
+            elif s.startswith('.size'):
+                cur = None
+            elif cur and s and s.split()[0].lower() in ('bl', 'blx', 'swi', 'svc'):
+                self._leaf.discard(cur)
+
+    # ── 临时寄存器分配 ───────────────────────────────────────────────────
+    #
+    # 活跃的临时值：挂起的 cmp 操作数（到条件分支消费为止）、叶函数的常驻常量、
+    # 本次 cmp 的条件 flag（供后续条件指令复用），以及条件执行展开中途钉住的值。
+    # 轮转跳过这些，其余的临时值都在同一条 ARM 指令的展开内部用完。
+    # 常驻常量在函数入口装入，活跃区间从入口开始 —— 只能选入口以来没被写过的寄存器。
+    #
+    def _busy(self) -> Set[str]:
+        busy = set(self._consts.values()) | self._pinned
+        if self._cmp:
+            busy.update(self._cmp)
+            busy.update(r for k, r in self._flag.items() if k[0] == self._cmp_gen)
+        return busy
+
+    def _scratch(self) -> str:
+        busy = self._busy()
+        for _ in range(len(self._SCRATCH)):
+            r = self._SCRATCH[self._rot]
+            self._rot = (self._rot + 1) % len(self._SCRATCH)
+            if r not in busy:
+                self._written.add(r)
+                return r
+        raise RuntimeError('arm2rv: 临时寄存器池耗尽')
+
+    def _const(self, imm: str) -> str:
+        """
+        返回装有立即数 imm 的寄存器。叶函数内在函数入口一次性装入（循环里的 cmp r3, #20
+        不再每轮 li 一次，也不再与紧随的分支构成 dist-1 RAW）；否则就地 li 到一个轮转寄存器。
+        """
+        r = self._consts.get(imm)
+        if r:
+            return r
+        busy = self._busy()
+        fresh = [r for r in self._SCRATCH if r not in self._written and r not in busy]
+        if self._entry is not None and fresh and len(self._consts) < self._MAX_CONSTS:
+            r = fresh[0]
+            self._written.add(r)
+            self._consts[imm] = r
+            self._const_src.append((r, imm, self._src))
+            return r
+        r = self._scratch()
+        self._emit(f'\tli\t{r},{imm}')
+        return r
+
+    def _begin_function(self, name: str):
+        self._end_function()
+        if name in self._leaf:
+            self._entry = (len(self._out),
+                           len(self._records) if self._records is not None else 0)
+
+    def _end_function(self):
+        """把常驻常量的 li 插到叶函数入口标签之后"""
+        if self._entry is not None:
+            at_out, at_rec = self._entry
+            for k, (r, imm, src) in enumerate(self._const_src):
+                self._out.insert(at_out + k, f'\tli\t{r},{imm}')
+                if self._records is not None:
+                    self._records.insert(at_rec + k, ('CODE', ('li', f'{r},{imm}', src)))
+        self._entry = None
+        self._written = set()
+        self._consts = {}
+        self._const_src = []
+
     # ── RV32I 文件头 ──────────────────────────────────────────────────────
     def _emit_rv_header(self):
         self._emit('\t.option nopic')
@@ -262,6 +482,10 @@ class Translator:
         if lm:
             label = lm.group(1)
             self._emit(f'{label}:')
+            self._cmp = None
+            if label == self._func:
+                self._func = None
+                self._begin_function(label)
             rest = s[lm.end():].strip()
             if rest and not rest.startswith('@'):
                 self._translate_instr_line(rest)
@@ -271,6 +495,10 @@ class Translator:
             tok = s.split()[0].lower()
             if tok in self._DROP:
                 return
+            if tok == '.type' and re.search(r',\s*%function', s):
+                self._func = s.split()[1].rstrip(',')
+            elif tok == '.size':
+                self._end_function()
             if tok == '.global':
                 self._emit(line.rstrip().replace('.global', '.globl', 1))
             elif tok == '.file':
@@ -287,7 +515,14 @@ class Translator:
         parts = s.split(None, 1)
         mnem  = parts[0].lower()
         ops_str = parts[1].strip() if len(parts) > 1 else ''
+        if self._cmp and mnem not in self._COND_BRANCH and not self._PRED_RE.match(mnem):
+            self._guard_cmp(mnem, ops_str)
         self._dispatch(mnem, ops_str)
+        if mnem in self._FLAG_NZ:
+            self._cmp_gen += 1
+            self._cmp, self._cmp_nz = (rmap(split_ops(ops_str)[0]), 'zero'), True
+        elif mnem in self._FLAG_KILL or (mnem == 'pop' and 'pc' in ops_str.lower()):
+            self._cmp = None
 
     # ═══════════════════════════════════════════════════════════════════════
     #  指令分发
@@ -319,30 +554,36 @@ class Translator:
         # RV32I: bge  a3, a2, .L4    if a3 ≥ a2 goto .L4  （交换操作数）
         #
         if mnem in self._COND_BRANCH:
-            label = ops[0]
-            rv_br, swap = self._COND_BRANCH[mnem]
-            if self._cmp:
-                rs1, rs2 = self._cmp
-                if swap:
-                    rs1, rs2 = rs2, rs1
-                self._emit(f'\t{rv_br}\t{rs1},{rs2},{label}')
-                self._cmp = None
-            else:
-                self._warn(f'{mnem} 没有前置 cmp，默认与 zero 比较')
-                self._emit(f'\t{rv_br}\tzero,zero,{label}')
+            self._branch(mnem, ops[0])
+            return
+
+        # ── 条件执行（movgt / addlt / ldrne …，见下方“条件执行”一节）─────
+        pm = self._PRED_RE.match(mnem)
+        if pm:
+            self._predicated(pm, ops_str)
             return
 
-        # ── CMP ──────────────────────────────────────────────────────────
+        # ── CMP / CMN ────────────────────────────────────────────────────
+        #
+        # cmn rn, #imm 按 cmp rn, #-imm 处理（gas 对这两者也互换编码）；cmn 寄存器没有对应的比较，作废标志
+        #
         if mnem in ('cmp', 'cmn'):
+            self._cmp_gen += 1
+            self._cmp_nz = False
             rs1 = rmap(ops[0])
             op2 = ops[1]
+            if mnem == 'cmn':
+                if not op2.startswith('#'):
+                    self._cmp = None
+                    self._emit(f'\t# [UNTRANSLATED] {mnem} {ops_str}')
+                    return
+                op2 = '#' + str(-parse_int(op2[1:]))
             if op2.startswith('#'):
                 imm = op2[1:]
                 if imm == '0':
                     self._cmp = (rs1, 'zero')
                 else:
-                    self._emit(f'\tli\tt4,{imm}')
-                    self._cmp = (rs1, 't4')
+                    self._cmp = (rs1, self._const(imm))
             else:
                 self._cmp = (rs1, rmap(op2))
             return
@@ -386,8 +627,7 @@ class Translator:
             if op2 == '#0':
                 self._emit(f'\tneg\t{rd},{rn}')
             else:
-                self._emit(f'\tli\tt4,{op2[1:]}')
-                self._emit(f'\tsub\t{rd},t4,{rn}')
+                self._emit(f'\tsub\t{rd},{self._const(op2[1:])},{rn}')
             return
 
         if mnem in ('mul', 'muls'):
@@ -419,13 +659,14 @@ class Translator:
         # smlal: rdlo += (rn *s rm) 低32位，rdhi += 高32位（带累加）
         if mnem in ('smlal', 'smlals'):
             rdlo, rdhi, rn, rm = (rmap(ops[i]) for i in range(4))
-            self._emit(f'\tmul\tt5,{rn},{rm}')
-            self._emit(f'\tmulh\tt6,{rn},{rm}')
-            self._emit(f'\tadd\t{rdlo},{rdlo},t5')
-            # 处理低32位进位：if rdlo < t5 then rdhi++
-            self._emit(f'\tsltu\tt5,{rdlo},t5')
-            self._emit(f'\tadd\t{rdhi},{rdhi},t5')
-            self._emit(f'\tadd\t{rdhi},{rdhi},t6')
+            lo, hi = self._scratch(), self._scratch()
+            self._emit(f'\tmul\t{lo},{rn},{rm}')
+            self._emit(f'\tmulh\t{hi},{rn},{rm}')
+            self._emit(f'\tadd\t{rdlo},{rdlo},{lo}')
+            # 处理低32位进位：if rdlo < lo then rdhi++
+            self._emit(f'\tsltu\t{lo},{rdlo},{lo}')
+            self._emit(f'\tadd\t{rdhi},{rdhi},{lo}')
+            self._emit(f'\tadd\t{rdhi},{rdhi},{hi}')
             return
 
         if mnem == 'sdiv':
@@ -468,8 +709,9 @@ class Translator:
             if op2.startswith('#'):
                 self._emit(f'\tandi\t{rd},{rn},{~int(op2[1:])}')
             else:
-                self._emit(f'\tnot\tt4,{rmap(op2)}')
-                self._emit(f'\tand\t{rd},{rn},t4')
+                t = self._scratch()
+                self._emit(f'\tnot\t{t},{rmap(op2)}')
+                self._emit(f'\tand\t{rd},{rn},{t}')
             return
 
         # ── 移位运算 ─────────────────────────────────────────────────────
@@ -486,16 +728,17 @@ class Translator:
             rd, rn, op2 = rmap(ops[0]), rmap(ops[1]), ops[2]
             if op2.startswith('#'):
                 amt = int(op2[1:])
-                self._emit(f'\tsrli\tt4,{rn},{amt}')
+                t = self._scratch()
+                self._emit(f'\tsrli\t{t},{rn},{amt}')
                 self._emit(f'\tslli\t{rd},{rn},{32 - amt}')
-                self._emit(f'\tor\t{rd},{rd},t4')
+                self._emit(f'\tor\t{rd},{rd},{t}')
             else:
                 rv_amt = rmap(op2)
-                self._emit(f'\tsrl\tt4,{rn},{rv_amt}')
-                self._emit(f'\tli\tt5,32')
-                self._emit(f'\tsub\tt5,t5,{rv_amt}')
-                self._emit(f'\tsll\t{rd},{rn},t5')
-                self._emit(f'\tor\t{rd},{rd},t4')
+                t, u = self._scratch(), self._scratch()
+                self._emit(f'\tsrl\t{t},{rn},{rv_amt}')
+                self._emit(f'\tneg\t{u},{rv_amt}')
+                self._emit(f'\tsll\t{rd},{rn},{u}')
+                self._emit(f'\tor\t{rd},{rd},{t}')
             return
 
         # ── 加载指令 ─────────────────────────────────────────────────────
@@ -586,6 +829,82 @@ class Translator:
 
         self._emit(f'\t# [UNTRANSLATED] {mnem} {ops_str}')
 
+    def _branch(self, mnem: str, label: str):
+        rv_br, swap = self._COND_BRANCH[mnem]
+        if not self._cond_known(mnem[1:]):
+            self._emit(f'\t# [UNTRANSLATED] {mnem} {label}{self._unknown_why(mnem[1:])}')
+            return
+        rs1, rs2 = self._cmp
+        if swap:
+            rs1, rs2 = rs2, rs1
+        self._emit(f'\t{rv_br}\t{rs1},{rs2},{label}')
+
+    def _cond_known(self, cc: str) -> bool:
+        """当前标志能否表达条件 cc：有挂起的比较，且来自 _FLAG_NZ 时 cc 只看 N / Z"""
+        if self._cmp is None:
+            return False
+        if cc in ('mi', 'pl'):          # N = x - y 的符号位，溢出时 ≠ lt；与 0 比较才不会溢出
+            return self._cmp[1] == 'zero'
+        return not self._cmp_nz or cc in self._NZ_CONDS
+
+    def _unknown_why(self, cc: str) -> str:
+        if self._cmp is not None and cc in ('mi', 'pl'):
+            return '（mi / pl 只支持与 0 比较）'
+        return '（标志来源未知）'
+
+    # ── 比较操作数被改写 ─────────────────────────────────────────────────
+    #
+    # ARM 的标志在 cmp 时就算好了，RV 的比较却在条件分支 / 条件指令处才做。
+    # 非条件指令要写挂起比较的操作数时：后面（下一个作废点之前）还有条件分支 / 条件指令，
+    # 就先把操作数快照到临时寄存器；否则比较已经没人用了，直接作废。
+    #
+    def _writes(self, mnem: str, ops_str: str) -> Set[str]:
+        """一条非条件 ARM 指令写的寄存器（RV 名）"""
+        ops = split_ops(ops_str)
+        if not ops or mnem in ('cmp', 'cmn', 'tst', 'teq', 'nop', 'b', 'bl', 'bx', 'swi', 'svc'):
+            return set()
+        if mnem in ('push', 'pop'):
+            regs = ['sp'] + (parse_reglist(ops_str) if mnem == 'pop' else [])
+        elif mnem[:3] in ('ldm', 'stm'):
+            regs = [ops[0].rstrip('!')] if ops[0].endswith('!') else []
+            if mnem.startswith('ldm'):
+                regs += parse_reglist(ops_str[ops_str.index('{'):])
+        elif mnem in ('smull', 'umull', 'smlal', 'smulls', 'umulls', 'smlals'):
+            regs = ops[:2]
+        elif mnem.startswith(('ldr', 'str')) and len(ops) > 1:
+            regs = [] if mnem.startswith('str') else ops[:1]
+            if ops[1].endswith('!') or len(ops) > 2:
+                regs.append(ops[1].strip('[]!').split(',')[0])
+        else:
+            regs = ops[:1]
+        return {rmap(r.strip()) for r in regs}
+
+    def _flags_live(self, i: int) -> bool:
+        """第 i 行之后、下一个作废点之前还有没有条件分支 / 条件指令"""
+        while True:
+            nxt = self._next_instr(i)
+            if nxt is None:
+                return False
+            j, mn, ops_str = nxt
+            if mn in self._COND_BRANCH or self._PRED_RE.match(mn):
+                return True
+            if mn in ('cmp', 'cmn') or mn in self._FLAG_NZ or mn in self._FLAG_KILL \
+                    or (mn == 'pop' and 'pc' in ops_str.lower()):
+                return False
+            i = j
+
+    def _guard_cmp(self, mnem: str, ops_str: str):
+        hit = self._writes(mnem, ops_str) & set(self._cmp)
+        if not hit:
+            return
+        if not self._flags_live(self._idx):
+            self._cmp = None
+            return
+        for r in sorted(hit):
+            snap = self._scratch()
+            self._emit(f'\tmv\t{snap},{r}')
+            self._cmp = tuple(snap if x == r else x for x in self._cmp)
+
     # ═══════════════════════════════════════════════════════════════════════
     #  Load / Store 辅助（统一处理前索引写回、后索引写回、普通偏移）
     # ═══════════════════════════════════════════════════════════════════════
@@ -605,15 +924,16 @@ class Translator:
     #
     _SHIFT_TO_RV = {'lsl': 'slli', 'lsr': 'srli', 'asr': 'srai'}
 
-    def _compute_addr(self, info: dict, tmp: str = 't5') -> str:
+    def _compute_addr(self, info: dict, tmp: Optional[str] = None) -> str:
         """
         根据 parse_mem_full 结果计算有效地址。
         - 对于 imm 模式直接返回 'imm(base)' 字符串
-        - 对于 reg/regshift 模式先 emit 地址计算指令，返回 '0(tmp)'
+        - 对于 reg/regshift 模式先 emit 地址计算指令，返回 '0(tmp)'（tmp 缺省取轮转池）
         """
         if info['mode'] == 'imm':
             return f"{info['offset']}({info['base']})"
-        elif info['mode'] == 'reg':
+        tmp = tmp or self._scratch()
+        if info['mode'] == 'reg':
             self._emit(f"\tadd\t{tmp},{info['base']},{info['offset']}")
             return f'0({tmp})'
         else:  # regshift
@@ -663,25 +983,368 @@ class Translator:
             addr = self._compute_addr(info)
             self._emit(f'\t{op}\t{rs},{addr}')
 
+    # ═══════════════════════════════════════════════════════════════════════
+    #  条件执行（predication）
+    # ═══════════════════════════════════════════════════════════════════════
+    #
+    #  ARM:  cmp   r2, r3                  两种 RV32I 展开，逐处按代价选择：
+    #        movgt r2, r3
+    #
+    #  branchy                              branchless（c = flag，m = 全 0 / 全 1 掩码）
+    #        bge   a3,a2,.Lpred0                  slt  c,a3,a2
+    #        mv    a2,a3                          xor  x,a3,a2
+    #  .Lpred0:                                   neg  m,c
+    #                                             and  x,x,m
+    #                                             xor  a2,a2,x
+    #
+    #  互补的一对（movgt rd,#1 / movle rd,#0 这类 GCC 的布尔值写法）合并成一个选择：
+    #  值为 1 / 0 时就是 flag 本身（slt rd,a3,a2），两边都不用分支。
+    #  同一条 cmp 后的多条条件指令共用一个 flag 寄存器。
+    #
+    #  代价 = 每种展开（连同前面最多 2 条指令）按 compute_nops 排出的 NOP，
+    #        在条件成立 / 不成立两条路径上走一遍的周期数（跳转成立记 _TAKEN_CYCLES），按 _P_COND 加权。
+    #  访存指令不做无分支展开（store 不能无条件执行，load 可能越界）。
+    #
+    def _next_instr(self, i: int) -> Optional[Tuple[int, str, str]]:
+        """第 i 行之后的下一条 ARM 指令 (行下标, 助记符, 操作数)；先遇到标签 / 伪操作则为 None"""
+        for j in range(i + 1, len(self._lines)):
+            if j in self._suppress_lines:
+                continue
+            s = re.sub(r'\s*@.*$', '', self._lines[j]).strip()
+            if not s:
+                continue
+            if s.startswith('.') or re.match(r'^[\.\w]+\s*:', s):
+                return None
+            parts = s.split(None, 1)
+            return j, parts[0].lower(), parts[1].strip() if len(parts) > 1 else ''
+        return None
+
+    def _pred_parts(self, pm) -> Tuple[str, str]:
+        op, cc, suf = pm.group(1), pm.group(2), pm.group(3) or ''
+        return (op + suf if suf in ('b', 'h', 'sb', 'sh') else op), cc
+
+    def _predicated(self, pm, ops_str: str):
+        base, cc = self._pred_parts(pm)
+        if not self._cond_known(cc):
+            self._emit(f'\t# [UNTRANSLATED] {pm.group(0)} {ops_str}{self._unknown_why(cc)}')
+            return
+        rd = rmap(split_ops(ops_str)[0])
+        sites = [(base, ops_str)]
+
+        # 互补的一对：movgt rd,… / movle rd,…（同一 rd，都不访存）
+        last = self._idx
+        nxt = self._next_instr(self._idx)
+        nm = self._PRED_RE.match(nxt[1]) if nxt else None
+        if nm and base not in self._MEM_OPS:
+            base2, cc2 = self._pred_parts(nm)
+            if cc2 == self._COND_NOT[cc] and base2 not in self._MEM_OPS \
+                    and rmap(split_ops(nxt[2])[0]) == rd:
+                sites.append((base2, nxt[2]))
+                self._suppress_lines.add(nxt[0])
+                last = nxt[0]
+
+        # 要写的是 cmp 的操作数、而后面还有条件指令 / 条件分支：先把操作数快照下来
+        if rd in self._cmp and self._flags_live(last):
+            snap = self._scratch()
+            self._emit(f'\tmv\t{snap},{rd}')
+            self._cmp = tuple(snap if r == rd else r for r in self._cmp)
+
+        name = pm.group(0) + (f'/{self._lines[last].split()[0]}' if len(sites) > 1 else '')
+        lower = {'branchless': lambda: self._pred_branchless(cc, rd, sites),
+                 'branchy':    lambda: self._pred_branchy(cc, sites)}
+        if base in self._MEM_OPS:
+            costs, choice = (None, None), 'branchy'
+        else:
+            costs = tuple(self._pred_cost(self._trial(lower[k])) for k in ('branchless', 'branchy'))
+            if self.predicate != 'auto':
+                choice = self.predicate
+            else:
+                choice = 'branchless' if costs[0] < costs[1] else 'branchy'
+            if costs[0] == float('inf'):
+                choice = 'branchy'
+        self.pred_sites.append((self._src[0], name, choice, costs[0], costs[1]))
+        lower[choice]()
+
+    # ── 两种展开 ─────────────────────────────────────────────────────────
+    def _pred_branchy(self, cc: str, sites: List[Tuple[str, str]]):
+        skip = self._label()
+        self._branch('b' + self._COND_NOT[cc], skip)
+        self._dispatch(*sites[0])
+        if len(sites) > 1:
+            end = self._label()
+            self._emit(f'\tj\t{end}')
+            self._emit(f'{skip}:')
+            self._dispatch(*sites[1])
+            skip = end
+        self._emit(f'{skip}:')
+
+    def _pred_branchless(self, cc: str, rd: str, sites: List[Tuple[str, str]]):
+        vals = [self._pred_imm(b, o) for b, o in sites]
+        if len(sites) > 1 and {vals[0], vals[1]} == {0, 1}:
+            # 布尔值：rd = cond（或 !cond）本身
+            key = self._flag_key(cc)
+            c = self._flag.get(key)
+            inv = self._COND_FLAG[cc][2] ^ (vals[0] == 0)
+            if c is None:
+                self._emit_flag(rd, cc)
+                c = rd
+            if inv:
+                self._emit(f'\txori\t{rd},{c},1')
+            elif c != rd:
+                self._emit(f'\tmv\t{rd},{c}')
+            return
+        c, inv = self._flag_reg(cc), self._COND_FLAG[cc][2]
+        self._pinned.add(c)
+        vt = self._pred_value(*sites[0])
+        vf = self._pred_value(*sites[1]) if len(sites) > 1 else rd
+        if vt != vf:
+            x = self._scratch()
+            self._pinned.add(x)
+            m = self._scratch()
+            self._emit(f'\txor\t{x},{vt},{vf}')
+            self._emit(f'\taddi\t{m},{c},-1' if inv else f'\tneg\t{m},{c}')
+            self._emit(f'\tand\t{x},{x},{m}')
+            self._emit(f'\txor\t{rd},{vf},{x}')
+        elif vt != rd:
+            self._emit(f'\tmv\t{rd},{vt}')
+        self._pinned.clear()
+
+    def _pred_imm(self, base: str, ops_str: str) -> Optional[int]:
+        ops = split_ops(ops_str)
+        if base == 'mov' and len(ops) == 2 and ops[1].startswith('#'):
+            try:
+                return parse_int(ops[1][1:])
+            except ValueError:
+                return None
+        return None
+
+    def _pred_value(self, base: str, ops_str: str) -> str:
+        """无条件算出条件指令要写的值，返回所在寄存器（mov 寄存器 / 常量不另占临时寄存器）"""
+        ops = split_ops(ops_str)
+        if base == 'mov' and len(ops) == 2:
+            if ops[1].startswith('#'):
+                return self._const(ops[1][1:])
+            return rmap(ops[1])
+        v = self._scratch()
+        self._pinned.add(v)
+        self._dispatch(base, ', '.join([v] + ops[1:]))
+        return v
+
+    def _flag_key(self, cc: str) -> Tuple[int, str, bool]:
+        op, swap, _ = self._COND_FLAG[cc]
+        return self._cmp_gen, op, swap
+
+    def _flag_reg(self, cc: str) -> str:
+        key = self._flag_key(cc)
+        if key not in self._flag:
+            c = self._scratch()
+            self._emit_flag(c, cc)
+            self._flag[key] = c
+        return self._flag[key]
+
+    def _emit_flag(self, dst: str, cc: str):
+        op, swap, _ = self._COND_FLAG[cc]
+        x, y = self._cmp[::-1] if swap else self._cmp
+        if op != 'seq':
+            self._emit(f'\t{op}\t{dst},{x},{y}')
+        elif y == 'zero' or x == 'zero':
+            self._emit(f'\tseqz\t{dst},{x if y == "zero" else y}')
+        else:
+            self._emit(f'\txor\t{dst},{x},{y}')
+            self._emit(f'\tseqz\t{dst},{dst}')
+
+    def _label(self) -> str:
+        self._lbl += 1
+        return f'.Lpred{self._lbl - 1}'
+
+    # ── 代价模型 ─────────────────────────────────────────────────────────
+    def _trial(self, fn) -> Optional[List[str]]:
+        """试跑一种展开：返回它生成的行，再把翻译器状态恢复原样；临时寄存器不够时为 None"""
+        n_out = len(self._out)
+        n_rec = len(self._records) if self._records is not None else 0
+        saved = (len(self.notes), self._rot, set(self._written), dict(self._consts),
+                 list(self._const_src), dict(self._flag), self._lbl, set(self._pinned),
+                 self._cmp, self._cmp_nz, set(self._suppress_lines))
+        try:
+            fn()
+            lines = self._out[n_out:]
+        except RuntimeError:
+            lines = None
+        del self._out[n_out:]
+        if self._records is not None:
+            del self._records[n_rec:]
+        (n_notes, self._rot, self._written, self._consts, self._const_src, self._flag,
+         self._lbl, self._pinned, self._cmp, self._cmp_nz, self._suppress_lines) = saved
+        del self.notes[n_notes:]
+        return lines
+
+    def _pred_cost(self, lines: Optional[List[str]]) -> float:
+        """一段展开的期望周期数（含与前 2 条指令之间的 NOP）；None → 不可行"""
+        if lines is None:
+            return float('inf')
+        from rv32i_asm_improved import expand_pseudo, compute_nops
+
+        def parse(ls):
+            items = []
+            for l in ls:
+                t = l.strip()
+                if not t or t.startswith('#') or t.startswith('.'):
+                    continue
+                if t.endswith(':') and not l.startswith('\t'):
+                    items.append(('LABEL', t[:-1]))
+                    continue
+                mn, _, args = t.partition('\t')
+                items.append((mn, args))
+            return items
+
+        prefix = []
+        for l in reversed(self._out):
+            it = parse([l])
+            if not it:
+                continue
+            if it[0][0] == 'LABEL' or len(prefix) == 2:
+                break
+            prefix.insert(0, it[0])
+
+        seq = parse(lines)
+        flat, first = [], {}
+        for k, it in enumerate(prefix + seq):
+            if k == len(prefix):
+                n_pre = len(flat)
+            if it[0] == 'LABEL':
+                continue
+            first[k] = len(flat)
+            flat += [(e, a, it[0], it[1]) for e, a in expand_pseudo(*it)]
+        if len(flat) == len(prefix) or not seq:
+            return 0.0
+        nops, _ = compute_nops(flat)
+        labels = {it[1]: k for k, it in enumerate(seq) if it[0] == 'LABEL'}
+        base = sum(nops[:n_pre])      # 前缀指令后面因本段而补的 NOP
+
+        def walk(cond: bool) -> float:
+            cyc, k = float(base), 0
+            while k < len(seq):
+                it = seq[k]
+                if it[0] == 'LABEL':
+                    k += 1
+                    continue
+                f = first[len(prefix) + k]
+                n = len(expand_pseudo(*it))
+                cyc += n + sum(nops[f:f + n])
+                tgt = it[1].split(',')[-1]
+                if it[0] == 'j' or (it[0].startswith('b') and tgt in labels and not cond):
+                    cyc += self._TAKEN_CYCLES - 1
+                    k = labels.get(tgt, len(seq))
+                else:
+                    k += 1
+            return cyc
+
+        return self._P_COND * walk(True) + (1 - self._P_COND) * walk(False)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+#  arm2rv → assemble 内存流水线
+# ═══════════════════════════════════════════════════════════════════════════
+def assemble_arm(lines: List[str], src_name: str = '<memory>',
+                 rodata_base: Optional[int] = None, stack_top: Optional[int] = None,
+                 timings: Optional[dict] = None, opt=None, policy: str = 'raw',
+                 predicate: str = 'auto') -> Optional[dict]:
+    """
+    ARM 源行 → RV32I 镜像 dict（不生成中间 .s 文本）；没有指令时返回 None。
+    镜像另有 "provenance"（每条指令的 (ARM 行号, 原文)，启动存根为 None）、"notes"（翻译警告）
+    与 "pred_sites"（每处条件执行选用的展开及两种展开的估算周期）。
+    """
+    import rv32i_asm_improved as asm
+    tr = Translator(predicate)
+    with asm.phase(timings, 'translate'):
+        text_raw, rodata_data, rodata_labels = asm.collect_sections(tr.translate_records(lines))
+    img = asm.assemble_sections(
+        text_raw, rodata_data, rodata_labels, src_name,
+        rodata_base=asm.DEFAULT_RODATA_BASE if rodata_base is None else rodata_base,
+        stack_top=asm.DEFAULT_STACK_TOP if stack_top is None else stack_top,
+        timings=timings, opt=opt, policy=policy, globls=tr.globls)
+    if img is not None:
+        img['notes'] = tr.notes
+        img['pred_sites'] = tr.pred_sites
+    return img
+
+
+def hazard_report(img: dict) -> List[str]:
+    """
+    每个插了 NOP 的 RAW 冒险一行：RV slot、冒险说明、生产者 / 消费者的 ARM 行。
+    同一 ARM 行翻译出的多条 RV 指令之间的冒险（如非叶函数里 cmp #imm 的 li → 分支）也在这里现形。
+    """
+    prov = img.get('provenance') or [None] * len(img['encoded'])
+    enc = img['encoded']
+    out = []
+    for i, e in enumerate(enc):
+        haz = e[8]
+        if not haz:
+            continue
+        j = min(i + (1 if 'dist-1' in haz else 2), len(enc) - 1)
+        p, c = prov[i], prov[j]
+        where = lambda x: f'L{x[0]:<4} {x[1]}' if x else '(startup)'
+        asm_str = f'{e[3]} {e[4]}'.strip()
+        out.append(f'  slot {e[1]:4d}  {asm_str:<24} {haz}\n'
+                   f'      producer {where(p)}\n'
+                   f'      consumer {where(c)}')
+    return out
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 #  命令行入口
 # ═══════════════════════════════════════════════════════════════════════════
 def main():
-    if len(sys.argv) < 2:
-        print(f'用法: python3 {sys.argv[0]} input_arm.s [output_rv32i.s]',
-              file=sys.stderr)
-        sys.exit(1)
-
-    with open(sys.argv[1], 'r') as f:
+    import argparse
+    parser = argparse.ArgumentParser(description='ARM → RV32I 翻译（可选直接在内存中汇编）')
+    parser.add_argument('src', help='ARM 汇编源文件')
+    parser.add_argument('out', nargs='?', default=None, help='输出 RV32I .s（默认 stdout）')
+    parser.add_argument('--asm', action='store_true',
+                        help='不写中间 .s：翻译结果直接交给汇编器，写 <stem>.listing / <stem>.vh')
+    parser.add_argument('--nops', default='raw', metavar='POLICY',
+                        help='--asm 的 NOP 填充策略（见 rv32i_policy.py，默认 raw）')
+    parser.add_argument('--imem', default=None, help='--asm 时另写 imem.hex（需同时给 --dmem）')
+    parser.add_argument('--dmem', default=None, help='--asm 时另写 dmem.hex')
+    parser.add_argument('--predicate', default='auto', choices=('auto', 'branchless', 'branchy'),
+                        help='条件执行（movgt / addlt …）的展开：按代价自动选择（默认）或强制一种')
+    args = parser.parse_args()
+
+    with open(args.src, 'r') as f:
         lines = f.readlines()
 
-    result = Translator().translate(lines)
-
-    if len(sys.argv) >= 3:
-        with open(sys.argv[2], 'w') as f:
+    if args.asm:
+        import rv32i_asm_improved as asm
+        img = assemble_arm(lines, os.path.basename(args.src), policy=args.nops,
+                           predicate=args.predicate)
+        if img is None:
+            print('[WARN] 没有找到任何指令'); sys.exit(1)
+        stem = os.path.splitext(args.src)[0]
+        asm.print_summary(img)
+        asm.write_listing(img, stem + '.listing')
+        asm.write_vh(img, stem + '.vh')
+        print(f'[输出] {stem}.listing')
+        print(f'[输出] {stem}.vh')
+        if args.imem and args.dmem:
+            asm.write_hex(img, args.imem, args.dmem)
+            print(f'[输出] {args.imem}')
+            print(f'[输出] {args.dmem}')
+        for n, msg in img['notes']:
+            print(f'[NOTE] L{n}: {msg}')
+        for n, name, choice, bl, br in img['pred_sites']:
+            why = '访存只走分支' if bl is None else f'branchless {bl:g} / branchy {br:g} cyc'
+            print(f'[PRED] L{n:<4} {name:<14} {choice:<10} ({why})')
+        rep = hazard_report(img)
+        print(f'[HAZARD] {len(rep)} 处插入 NOP 的 RAW 冒险（ARM 来源）')
+        for r in rep:
+            print(r)
+        return
+
+    result = Translator(args.predicate).translate(lines)
+
+    if args.out:
+        with open(args.out, 'w') as f:
             f.write(result)
-        print(f'translated → {sys.argv[2]}')
+        print(f'translated → {args.out}')
     else:
         sys.stdout.write(result)
 
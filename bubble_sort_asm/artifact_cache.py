@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+artifact_cache.py  —  工具链内容寻址缓存（arm2rv → 汇编 → 仿真 / 上板）
+=============================================================================
+每个阶段的产物按 key = sha256(阶段名, 工具版本, 选项, 所有输入内容) 存放。
+工具版本取工具源文件及其导入的核心模块的 hash（见 asm_modules），改了任何一个缓存自动失效。
+
+  <root>/objects/<k[:2]>/<k>/     一个条目 = 若干命名文件 + meta.json
+  <root>/stats.json               各阶段 hit / miss 计数
+
+  LRU：命中时 touch 条目目录；总大小超过上限时按 mtime 从旧到新淘汰。
+  条目以“临时目录 + os.replace”写入；发布条目、淘汰与 stats.json 的读-改-写
+  都在 <root>/.lock 的文件锁内进行，多进程并发安全。
+
+  默认目录 ~/.cache/rv32i（环境变量 RV32I_CACHE_DIR 覆盖）
+  默认上限 256M（环境变量 RV32I_CACHE_MAX 或 --max-size 覆盖，支持 K/M/G）
+
+【命令行】
+  python artifact_cache.py translate  sort_arm.s  sort_rv32i_gen.s
+  python artifact_cache.py assemble   sort_rv32i_gen.s  [--rodata 0x400] [--stack 0x300]
+  python artifact_cache.py assemble   sort_rv32i_gen.s  --nops optimal --opt promote,peephole
+  python artifact_cache.py run  --input imem.hex --input dmem.hex  -- ./run_hw.sh ./pip_reg imem.hex dmem.hex
+  python artifact_cache.py stats
+  python artifact_cache.py evict | clear
+
+  只改 dmem 输入的参数扫描中，translate / assemble 的 key 不变，全部命中。
+"""
+
+import os, sys, json, time, fcntl, shutil, hashlib, tempfile, argparse, subprocess
+from contextlib import contextmanager
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "RV32I_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "rv32i"))
+DEFAULT_MAX_BYTES = 256 << 20
+
+
+def parse_size(s):
+    """'256M' / '1G' / '4096' → 字节数"""
+    s = str(s).strip().upper()
+    mult = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}.get(s[-1:], 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+def tool_version(*paths):
+    """工具源文件内容的 hash（前 12 位）"""
+    h = hashlib.sha256()
+    for p in paths:
+        with open(p, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+# 汇编器核心：rv32i_asm_improved 及它导入的表 / writer / 策略模块；--opt / --shadow 用到时再加上对应模块
+_ASM_CORE = ("rv32i_asm_improved.py", "rv32i_isa.py", "rv32i_writers.py", "rv32i_policy.py")
+
+def asm_modules(opt=None, shadow=False):
+    """一次汇编实际用到的工具源文件（绝对路径），作为 tool_version 的输入"""
+    names = list(_ASM_CORE)
+    if opt or shadow:
+        names += ["rv32i_opt.py", "rv32i_sim.py"]       # pass 的 ISS 校验 / 剖析在 rv32i_sim
+    if opt and "rewrites" in opt:
+        names.append("rv32i_superopt.py")
+    if shadow:
+        names.append("rv32i_shadow.py")
+    paths = [os.path.join(_HERE, n) for n in names]
+    if opt and "rewrites" in opt:
+        import rv32i_asm_improved as asm
+        if os.path.exists(asm.REWRITES_PATH):           # 改写库也是 rewrites pass 的输入
+            paths.append(asm.REWRITES_PATH)
+    for spec in (opt.split(",") if isinstance(opt, str) else opt or ()):
+        name, _, arg = spec.partition("=")
+        if name == "layout" and arg and os.path.exists(arg):
+            paths.append(os.path.abspath(arg))          # layout=PATH：profile 内容也是输入
+    return paths
+
+def _as_bytes(x):
+    return x if isinstance(x, bytes) else str(x).encode("utf-8")
+
+def _dir_size(path):
+    total = 0
+    for dp, _, files in os.walk(path):
+        for fn in files:
+            try: total += os.path.getsize(os.path.join(dp, fn))
+            except OSError: pass
+    return total
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  缓存本体
+# ─────────────────────────────────────────────────────────────────────────────
+class ArtifactCache:
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or DEFAULT_CACHE_DIR
+        env_max = os.environ.get("RV32I_CACHE_MAX")
+        self.max_bytes = (max_bytes if max_bytes is not None
+                          else parse_size(env_max) if env_max else DEFAULT_MAX_BYTES)
+        self.obj_dir = os.path.join(self.root, "objects")
+        os.makedirs(self.obj_dir, exist_ok=True)
+
+    # ── key ──────────────────────────────────────────────────────────────────
+    @staticmethod
+    def key(stage, version, options, inputs):
+        """inputs: bytes / str 列表（文件内容）；options: 可 JSON 序列化的 dict"""
+        h = hashlib.sha256()
+        for part in (stage, version, json.dumps(options, sort_keys=True)):
+            h.update(_as_bytes(part)); h.update(b"\0")
+        for data in inputs:
+            b = _as_bytes(data)
+            h.update(str(len(b)).encode()); h.update(b"\0"); h.update(b)
+        return h.hexdigest()
+
+    @contextmanager
+    def _lock(self):
+        """缓存目录的进程间互斥锁（flock）"""
+        with open(os.path.join(self.root, ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _path(self, key):
+        return os.path.join(self.obj_dir, key[:2], key)
+
+    # ── get / put ────────────────────────────────────────────────────────────
+    def get(self, key):
+        """命中返回 {name: bytes}，并刷新 LRU 时间；未命中返回 None"""
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            files = {}
+            for name in meta["files"]:
+                with open(os.path.join(path, "f_" + name), "rb") as f:
+                    files[name] = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        try: os.utime(path)
+        except OSError: pass
+        return files
+
+    def put(self, key, stage, files):
+        """files: {name: bytes}；原子写入后按上限淘汰"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(path))
+        size = 0
+        for name, data in files.items():
+            data = _as_bytes(data)
+            with open(os.path.join(tmp, "f_" + name), "wb") as f:
+                f.write(data)
+            size += len(data)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"stage": stage, "files": sorted(files), "size": size,
+                       "created": time.time()}, f)
+        with self._lock():
+            try:
+                os.replace(tmp, path)
+            except OSError:         # 另一进程已写入同一 key
+                shutil.rmtree(tmp, ignore_errors=True)
+            self.evict()
+
+    def cached(self, stage, version, options, inputs, produce, keep=None):
+        """
+        命中直接返回；否则调用 produce() → {name: bytes}，写入缓存后返回。
+        keep(files) 为假时只返回、不写入（如失败的命令）。
+        """
+        k = self.key(stage, version, options, inputs)
+        files = self.get(k)
+        self._count(stage, files is not None)
+        if files is None:
+            files = {n: _as_bytes(v) for n, v in produce().items()}
+            if keep is None or keep(files):
+                self.put(k, stage, files)
+        return files
+
+    # ── 统计 ─────────────────────────────────────────────────────────────────
+    def _count(self, stage, hit):
+        path = os.path.join(self.root, "stats.json")
+        with self._lock():          # 读-改-写：不加锁时并发进程的计数会互相覆盖
+            st = self.load_stats()
+            ent = st.setdefault(stage, {"hit": 0, "miss": 0})
+            ent["hit" if hit else "miss"] += 1
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(st, f, indent=1)
+            os.replace(tmp, path)
+
+    def load_stats(self):
+        try:
+            with open(os.path.join(self.root, "stats.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def entries(self):
+        """[(mtime, size, path)]"""
+        out = []
+        for sub in os.listdir(self.obj_dir):
+            d = os.path.join(self.obj_dir, sub)
+            if not os.path.isdir(d): continue
+            for k in os.listdir(d):
+                if k.startswith(".tmp-"): continue
+                p = os.path.join(d, k)
+                try: out.append((os.path.getmtime(p), _dir_size(p), p))
+                except OSError: pass
+        return out
+
+    # ── LRU 淘汰 ─────────────────────────────────────────────────────────────
+    def evict(self, max_bytes=None):
+        """淘汰最久未用的条目直到总大小 ≤ 上限，返回淘汰条目数"""
+        cap = self.max_bytes if max_bytes is None else max_bytes
+        ents = sorted(self.entries())
+        total = sum(e[1] for e in ents)
+        n = 0
+        for mtime, size, p in ents:
+            if total <= cap: break
+            shutil.rmtree(p, ignore_errors=True)
+            total -= size
+            n += 1
+        return n
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.obj_dir, exist_ok=True)
+
+    def report(self):
+        ents = self.entries()
+        total = sum(e[1] for e in ents)
+        lines = [f"cache   : {self.root}",
+                 f"entries : {len(ents)}   size {total/1024:.1f} KiB / cap {self.max_bytes/1024:.0f} KiB",
+                 f"{'stage':<12} {'hit':>8} {'miss':>8} {'hit%':>7}"]
+        for stage, c in sorted(self.load_stats().items()):
+            tot = c["hit"] + c["miss"]
+            lines.append(f"{stage:<12} {c['hit']:>8} {c['miss']:>8}"
+                         f" {100.0 * c['hit'] / tot if tot else 0:>6.1f}%")
+        return "\n".join(lines)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  各阶段封装
+# ─────────────────────────────────────────────────────────────────────────────
+def translate(cache, arm_path, out_path=None):
+    """arm2rv：ARM .s → RV32I .s"""
+    from arm2rv import Translator
+    with open(arm_path, "r") as f:
+        text = f.read()
+    # 条件执行的代价模型调用汇编器的 expand_pseudo / compute_nops，翻译结果也随汇编器核心变化
+    files = cache.cached("translate",
+                         tool_version(os.path.join(_HERE, "arm2rv.py"), *asm_modules()), {},
+                         [text],
+                         lambda: {"out.s": Translator().translate(text.splitlines(True))})
+    if out_path:
+        with open(out_path, "wb") as f:
+            f.write(files["out.s"])
+    return files["out.s"].decode("utf-8")
+
+def assemble(cache, src_path, rodata_base=None, stack_top=None, policy="raw", opt=None,
+             shadow=False):
+    """
+    rv32i_asm_improved：源文件 → <stem>.listing / <stem>.vh，返回 assemble() 的结果 dict。
+    policy / opt（pass 列表，如 "promote,peephole"）/ shadow 同 rv32i_asm_improved 的 --nops / --opt / --shadow。
+    """
+    import rv32i_asm_improved as asm
+    rodata_base = asm.DEFAULT_RODATA_BASE if rodata_base is None else rodata_base
+    stack_top   = asm.DEFAULT_STACK_TOP   if stack_top   is None else stack_top
+    with open(src_path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    src_name = os.path.basename(src_path)
+
+    def produce():
+        hook = None
+        if opt:
+            from rv32i_opt import make_hook
+            hook = make_hook(opt)
+        img = asm.assemble_lines(text.splitlines(True), src_name,
+                                 rodata_base=rodata_base, stack_top=stack_top,
+                                 opt=hook, shadow=shadow, policy=policy)
+        if img is None:
+            raise ValueError(f"{src_path}: 没有找到任何指令")
+        with tempfile.TemporaryDirectory() as td:
+            asm.write_listing(img, os.path.join(td, "l"))
+            asm.write_vh(img, os.path.join(td, "v"))
+            with open(os.path.join(td, "l"), "rb") as f: listing = f.read()
+            with open(os.path.join(td, "v"), "rb") as f: vh = f.read()
+        return {"listing": listing, "vh": vh,
+                "result.json": json.dumps(asm.image_result(img))}
+
+    files = cache.cached("assemble", tool_version(*asm_modules(opt, shadow)),
+                         {"rodata": rodata_base, "stack": stack_top, "name": src_name,
+                          "policy": policy, "opt": opt or "", "shadow": bool(shadow)},
+                         [text], produce)
+    stem = os.path.splitext(src_path)[0]
+    for ext in ("listing", "vh"):
+        with open(f"{stem}.{ext}", "wb") as f:
+            f.write(files[ext])
+    return json.loads(files["result.json"])
+
+def run(cache, cmd, inputs, outputs=()):
+    """
+    任意命令（仿真 / run_hw.sh）：key = 命令行 + 各输入文件内容。
+    缓存 stdout 和指定的输出文件，命中时直接回放；只缓存退出码为 0 的结果
+    （失败可能是板子没连上等暂时性原因，下次应当重跑）。
+    """
+    contents = []
+    for p in inputs:
+        with open(p, "rb") as f:
+            contents.append(f.read())
+
+    def produce():
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        files = {"stdout": proc.stdout, "rc": str(proc.returncode)}
+        for i, p in enumerate(outputs):
+            if os.path.exists(p):
+                with open(p, "rb") as f:
+                    files[f"out{i}"] = f.read()
+        return files
+
+    files = cache.cached("run", "1", {"cmd": list(cmd), "outputs": list(outputs)},
+                         contents, produce, keep=lambda f: f["rc"] == b"0")
+    for i, p in enumerate(outputs):
+        if f"out{i}" in files:
+            with open(p, "wb") as f:
+                f.write(files[f"out{i}"])
+    return int(files["rc"]), files["stdout"]
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RV32I 工具链内容寻址缓存")
+    parser.add_argument("--cache-dir", default=None, help=f"缓存目录（默认 {DEFAULT_CACHE_DIR}）")
+    parser.add_argument("--max-size",  default=None, help="缓存上限，如 256M / 1G")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("translate", help="arm2rv 翻译（缓存）")
+    p.add_argument("src"); p.add_argument("out")
+
+    p = sub.add_parser("assemble", help="RAW-aware 汇编（缓存）")
+    p.add_argument("src")
+    p.add_argument("--rodata", default=None)
+    p.add_argument("--stack",  default=None)
+    p.add_argument("--nops",   default="raw", metavar="POLICY", help="NOP 填充策略（默认 raw）")
+    p.add_argument("--opt",    default=None, help="逗号分隔的 rv32i_opt pass")
+    p.add_argument("--shadow", action="store_true", help="分支影子槽模式（只支持 --nops raw）")
+
+    p = sub.add_parser("run", help="缓存任意命令的输出（仿真 / 上板）")
+    p.add_argument("--input",  action="append", default=[], help="参与 key 的输入文件")
+    p.add_argument("--output", action="append", default=[], help="需要缓存的输出文件")
+    p.add_argument("command", nargs=argparse.REMAINDER)
+
+    sub.add_parser("stats", help="命中率统计")
+    sub.add_parser("evict", help="按上限执行 LRU 淘汰")
+    sub.add_parser("clear", help="清空缓存")
+    args = parser.parse_args(argv)
+
+    cache = ArtifactCache(args.cache_dir,
+                          parse_size(args.max_size) if args.max_size else None)
+
+    if args.cmd == "translate":
+        translate(cache, args.src, args.out)
+        print(f"translated → {args.out}")
+    elif args.cmd == "assemble":
+        res = assemble(cache, args.src,
+                       int(args.rodata, 16) if args.rodata else None,
+                       int(args.stack, 16) if args.stack else None,
+                       args.nops, args.opt, args.shadow)
+        stem = os.path.splitext(args.src)[0]
+        print(f"[输出] {stem}.listing  ({res['total_slots']} slots)")
+        print(f"[输出] {stem}.vh")
+    elif args.cmd == "run":
+        cmd = args.command[1:] if args.command[:1] == ["--"] else args.command
+        if not cmd:
+            parser.error("run 需要 -- <command>")
+        rc, out = run(cache, cmd, args.input, args.output)
+        sys.stdout.buffer.write(out)
+        return rc
+    elif args.cmd == "stats":
+        print(cache.report())
+    elif args.cmd == "evict":
+        with cache._lock():
+            n = cache.evict()
+        print(f"evicted {n} entries")
+    elif args.cmd == "clear":
+        cache.clear()
+        print(f"cleared {cache.root}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
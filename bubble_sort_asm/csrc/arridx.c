@@ -0,0 +1,6 @@
+int main(){
+    int a[3];
+    a[0]=0; a[1]=1; a[2]=1;
+    a[a[2]+1]=9;
+    return a[2];
+}
@@ -0,0 +1,32 @@
+	.file	"arridx.c"
+	.option nopic
+	.attribute arch, "rv32i2p0"
+	.attribute unaligned_access, 0
+	.attribute stack_align, 16
+	.text
+	.align	2
+	.globl	main
+	.type	main, @function
+main:
+	addi	sp,sp,-32
+	sw	s0,28(sp)
+	addi	s0,sp,32
+	sw	zero,-32(s0)
+	li	a5,1
+	sw	a5,-28(s0)
+	li	a5,1
+	sw	a5,-24(s0)
+	lw	a5,-24(s0)
+	addi	a5,a5,1
+	slli	a5,a5,2
+	addi	a5,a5,-16
+	add	a5,a5,s0
+	li	a4,9
+	sw	a4,-16(a5)
+	lw	a5,-24(s0)
+	mv	a0,a5
+	lw	s0,28(sp)
+	addi	sp,sp,32
+	jr	ra
+	.size	main, .-main
+	.ident	"GCC: () 9.3.0"
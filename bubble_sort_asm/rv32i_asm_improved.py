@@ -17,110 +17,52 @@ rv32i_asm.py  —  RV32I Assembler for Early-Branch Pipeline  (v2 with RAW NOP i
 【命令行】
   python rv32i_asm.py  source.asm
   python rv32i_asm.py  source.asm  --rodata 0x400  --stack 0x300
+  python rv32i_asm.py  source.asm  --metrics json       # 各阶段耗时 + 代码质量计数（JSON）
+  python rv32i_asm.py  source.asm  --profile            # 各阶段耗时表 + cProfile 热点
+  python rv32i_asm.py  source.asm  --opt peephole       # NOP 插入前的优化（rv32i_opt.py）
+  python rv32i_asm.py  source.asm  --opt promote --unroll 2
+  python rv32i_asm.py  source.asm  --opt rewrites       # 应用 rv32i_superopt.py --save 生成的改写库
+  python rv32i_sim.py  source.asm --opt promote --profile-out p.json
+  python rv32i_asm.py  source.asm  --opt promote --profile-layout p.json   # 热路径顺序落入
+  python rv32i_asm.py  big.s       --stream       # 流式汇编，内存不随源文件增长（见 rv32i_stream.py）
+  python rv32i_asm.py  source.asm  --shadow       # 实验性：分支影子槽（RTL 需 BRANCH_SHADOW=1，见 rv32i_shadow.py）
+  python rv32i_asm.py  source.asm  --nops optimal # NOP 填充策略：fixed / raw / optimal / scheduled / barrel[=N]
+  python rv32i_asm.py  source.asm  --imem imem.hex --dmem dmem.hex   # 另写 run_hw.sh 用的 hex
+
+【共享核心】
+  本文件是唯一的汇编器核心：rv32i_asm.py（fixed）与 netfpga/sw/rv32i_asm.py（fixed）、
+  rv32i_asm_dbg.py（raw）都只是选定 NOP 策略的薄包装；策略插件见 rv32i_policy.py。
 
 【输出文件】
   <stem>.listing  — 地址/hex/汇编对照表，含冒险原因注释
   <stem>.vh       — Verilog task：load_icache + load_dcache
+  imem.hex / dmem.hex — 给出 --imem / --dmem 时（pip_reg 顺序格式）
 """
 
-import re, sys, os, argparse
+import sys, os, time
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  用户可调参数
 # ─────────────────────────────────────────────────────────────────────────────
 DEFAULT_RODATA_BASE = 0x400
 DEFAULT_STACK_TOP   = 0x300
-BYTES_PER_SLOT      = 4
-NOP_WORD            = 0x00000013   # addi x0,x0,0
-HALT_WORD           = 0x00000063   # beq x0,x0,0
+# rv32i_superopt.py 的改写库；--opt rewrites 时应用（见 rv32i_opt.rewrites）
+REWRITES_PATH = os.environ.get("RV32I_REWRITES",
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                            "rv32i_rewrites.json"))
+ICACHE_WORDS        = 512          # Icache / Dcache 深度（word）
+DCACHE_WORDS        = 512
 
 # ─────────────────────────────────────────────────────────────────────────────
-#  寄存器映射
+#  寄存器 / 指令表 / slot 常量 / 预编译正则 / 基础解析：见 rv32i_isa.py；
+#  摘要与 listing / vh / hex writer：见 rv32i_writers.py（此处均 re-export）
 # ─────────────────────────────────────────────────────────────────────────────
-REGS = {f"x{i}": i for i in range(32)}
-REGS.update({
-    "zero":0, "ra":1,  "sp":2,  "gp":3,  "tp":4,
-    "t0":5,   "t1":6,  "t2":7,
-    "s0":8,   "fp":8,  "s1":9,
-    "a0":10,  "a1":11, "a2":12, "a3":13, "a4":14, "a5":15, "a6":16, "a7":17,
-    "s2":18,  "s3":19, "s4":20, "s5":21, "s6":22, "s7":23,
-    "s8":24,  "s9":25, "s10":26,"s11":27,
-    "t3":28,  "t4":29, "t5":30, "t6":31,
-})
-
-ABI_NAME = {
-    0:"zero",1:"ra",2:"sp",3:"gp",4:"tp",
-    5:"t0",6:"t1",7:"t2",8:"s0",9:"s1",
-    10:"a0",11:"a1",12:"a2",13:"a3",14:"a4",15:"a5",16:"a6",17:"a7",
-    18:"s2",19:"s3",20:"s4",21:"s5",22:"s6",23:"s7",
-    24:"s8",25:"s9",26:"s10",27:"s11",
-    28:"t3",29:"t4",30:"t5",31:"t6",
-}
-
-# ─────────────────────────────────────────────────────────────────────────────
-#  指令表
-# ─────────────────────────────────────────────────────────────────────────────
-INST = {
-    "add":  ("R",0x33,0,0x00), "sub":  ("R",0x33,0,0x20),
-    "sll":  ("R",0x33,1,0x00), "slt":  ("R",0x33,2,0x00),
-    "sltu": ("R",0x33,3,0x00), "xor":  ("R",0x33,4,0x00),
-    "srl":  ("R",0x33,5,0x00), "sra":  ("R",0x33,5,0x20),
-    "or":   ("R",0x33,6,0x00), "and":  ("R",0x33,7,0x00),
-    "addi": ("I",0x13,0), "slti": ("I",0x13,2), "sltiu":("I",0x13,3),
-    "xori": ("I",0x13,4), "ori":  ("I",0x13,6), "andi": ("I",0x13,7),
-    "slli": ("IS",0x13,1,0x00),"srli": ("IS",0x13,5,0x00),"srai": ("IS",0x13,5,0x20),
-    "lb":("I",0x03,0),"lh":("I",0x03,1),"lw":("I",0x03,2),
-    "lbu":("I",0x03,4),"lhu":("I",0x03,5),
-    "sb":("S",0x23,0),"sh":("S",0x23,1),"sw":("S",0x23,2),
-    "beq":("B",0x63,0),"bne":("B",0x63,1),
-    "blt":("B",0x63,4),"bge":("B",0x63,5),
-    "bltu":("B",0x63,6),"bgeu":("B",0x63,7),
-    "lui":("U",0x37),"auipc":("U",0x17),
-    "jal":("J",0x6F),
-    "jalr":("I",0x67,0),
-    "ecall":("SYS",0x73,0),"ebreak":("SYS",0x73,1),
-}
-
-# ─────────────────────────────────────────────────────────────────────────────
-#  工具函数
-# ─────────────────────────────────────────────────────────────────────────────
-def R(name):
-    name = name.strip()
-    if name not in REGS:
-        raise ValueError(f"未知寄存器: {name!r}")
-    return REGS[name]
-
-def parse_int(s):
-    s = s.strip()
-    neg = s.startswith('-')
-    if neg: s = s[1:]
-    base = 16 if s.lower().startswith('0x') else 10
-    return (-1 if neg else 1) * int(s, base)
-
-def hi20(addr): return ((addr + 0x800) >> 12) & 0xFFFFF
-def lo12(addr):
-    v = addr & 0xFFF
-    return v - 0x1000 if v >= 0x800 else v
-
-def split_args(s):
-    """把 'rd, rs1, imm' 或 'rd, imm(rs1)' 标准化拆开"""
-    s = re.sub(r'(-?[\w.]+)\((\w+)\)', r'\1,\2', s)
-    parts = re.split(r'[\s,]+', s.strip())
-    return [p for p in parts if p]
-
-def resolve_hi_lo(arg, labels):
-    arg = arg.strip()
-    m_hi = re.match(r'%hi\(([^)]+)\)', arg)
-    m_lo = re.match(r'%lo\(([^)]+)\)', arg)
-    if m_hi:
-        lbl = m_hi.group(1).strip()
-        if lbl not in labels: raise ValueError(f"未定义标签: {lbl!r} (用于 %hi)")
-        return hi20(labels[lbl])
-    if m_lo:
-        lbl = m_lo.group(1).strip()
-        if lbl not in labels: raise ValueError(f"未定义标签: {lbl!r} (用于 %lo)")
-        return lo12(labels[lbl])
-    return parse_int(arg)
+from rv32i_isa import (
+    REGS, ABI_NAME, INST, R, parse_int, hi20, lo12, split_args, resolve_hi_lo,
+    BYTES_PER_SLOT, NOP_WORD, HALT_WORD,
+    SKIP_RE, ALIGN_RE, LABEL_RE, MNEMONIC_RE, GLOBL_RE, COMMENT_RE,
+)
+from rv32i_writers import slot_labels, print_summary, write_listing, write_vh, write_hex
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  RAW 冒险分析辅助函数
@@ -322,29 +264,32 @@ def encode_one(mn, args_str, byte_pc, labels):
 # ─────────────────────────────────────────────────────────────────────────────
 def should_skip(line):
     if not line or line.startswith('//'): return True
-    return bool(re.match(r'^\.(file|option|attribute|globl|type|size|ident)', line))
+    return bool(SKIP_RE.match(line))
 
 # ─────────────────────────────────────────────────────────────────────────────
-#  主汇编流程
+#  汇编各阶段
+#    read → preprocess → split_sections → expand_text → compute_nops
+#    → layout → build_labels → encode_all → 各 writer
+#  assemble_lines() 串起前面各阶段，返回内存中的镜像 dict（不写文件）
 # ─────────────────────────────────────────────────────────────────────────────
-def assemble(src_path, rodata_base=DEFAULT_RODATA_BASE, stack_top=DEFAULT_STACK_TOP):
-    stem = os.path.splitext(src_path)[0]
-
-    # ── 读取 & 预处理 ─────────────────────────────────────────────────────────
-    with open(src_path, encoding="utf-8", errors="replace") as f:
-        raw = f.readlines()
-    lines = []
+def clean(raw):
+    """去注释、strip，逐行产出非空行（生成器，流式模式 rv32i_stream.py 直接使用）"""
     for line in raw:
-        line = re.split(r'(?<!\S)#|//|@', line)[0].strip()
-        if line: lines.append(line)
+        line = COMMENT_RE.split(line, 1)[0].strip()
+        if line: yield line
 
-    # ── 分段收集 ──────────────────────────────────────────────────────────────
-    section       = "text"
-    text_raw      = []    # ('LABEL', name) | ('CODE', line_str)
-    rodata_data   = []    # int word values
-    rodata_labels = {}    # label → byte offset within rodata section
-    rodata_pc     = 0
+def preprocess(raw):
+    """去注释、strip，丢弃空行"""
+    return list(clean(raw))
 
+def iter_sections(lines):
+    """
+    逐行产出 (kind, val)：
+      ('LABEL', name) / ('CODE', line_str) : text 段
+      ('RLABEL', name)                     : rodata 标签（偏移 = 此前 WORD 数 × 4）
+      ('WORD', value)                      : rodata 字
+    """
+    section = "text"
     for line in lines:
         lo = line.lower()
         if lo.startswith('.section') and '.rodata' in lo: section = "rodata"; continue
@@ -352,89 +297,120 @@ def assemble(src_path, rodata_base=DEFAULT_RODATA_BASE, stack_top=DEFAULT_STACK_
         if lo == '.data':   section = "data";   continue
         if lo == '.rodata': section = "rodata"; continue
         if should_skip(line): continue
-        if re.match(r'\.(align|p2align|balign)\s', lo): continue
+        if ALIGN_RE.match(lo): continue
 
-        if line.endswith(':') or (re.match(r'^[\w.]+\s*:', line) and not line.startswith('.')):
-            lbl  = re.match(r'^([\w.]+)\s*:', line).group(1)
+        m = LABEL_RE.match(line)
+        if line.endswith(':') or (m and not line.startswith('.')):
+            lbl  = m.group(1)
             rest = line[line.index(':')+1:].strip()
-            if section == "rodata":
-                rodata_labels[lbl] = rodata_pc
-            else:
-                text_raw.append(('LABEL', lbl))
-            if rest: text_raw.append(('CODE', rest))
+            yield ('RLABEL' if section == "rodata" else 'LABEL'), lbl
+            if rest: yield 'CODE', rest
             continue
 
         if lo.startswith('.word') and section == "rodata":
             val = parse_int(line.split(None, 1)[1].strip())
-            rodata_data.append(val & 0xFFFFFFFF)
-            rodata_pc += 4
+            yield 'WORD', val & 0xFFFFFFFF
             continue
 
         if section == "text":
-            text_raw.append(('CODE', line))
+            yield 'CODE', line
 
-    # ── 注入启动存根：li sp, STACK_TOP ───────────────────────────────────────
-    startup = []
-    if stack_top != 0:
-        if -2048 <= stack_top < 2048:
-            startup = [('CODE', f"addi sp,x0,{stack_top}")]
+def split_sections(lines):
+    """
+    返回 (text_raw, rodata_data, rodata_labels)
+      text_raw      : [('LABEL', name) | ('CODE', line_str)]
+      rodata_data   : int word values
+      rodata_labels : label → byte offset within rodata section
+    """
+    return collect_sections(iter_sections(lines))
+
+def collect_sections(items):
+    """iter_sections 格式的 (kind, val) 流 → (text_raw, rodata_data, rodata_labels)"""
+    text_raw      = []
+    rodata_data   = []
+    rodata_labels = {}
+    for kind, val in items:
+        if kind == 'WORD':
+            rodata_data.append(val)
+        elif kind == 'RLABEL':
+            rodata_labels[val] = 4 * len(rodata_data)
         else:
-            h = hi20(stack_top); l = lo12(stack_top)
-            startup = [('CODE', f"lui sp,{h}"), ('CODE', f"addi sp,sp,{l}")]
-    text_raw = startup + text_raw
-
-    # ─────────────────────────────────────────────────────────────────────────
-    #  Pass 1：展开伪指令，收集指令列表
-    #          标签记录为【指令序号】，不是字节地址（字节地址要等 NOP 计算后才知道）
-    # ─────────────────────────────────────────────────────────────────────────
-    instructions  = []    # (emn, eargs, orig_mn, orig_args)
-    labels_by_idx = {}    # label_name → instruction index
-
+            text_raw.append((kind, val))
+    return text_raw, rodata_data, rodata_labels
+
+def startup_stub(stack_top):
+    """启动存根：li sp, STACK_TOP"""
+    if stack_top == 0:
+        return []
+    if -2048 <= stack_top < 2048:
+        return [('CODE', f"addi sp,x0,{stack_top}")]
+    h = hi20(stack_top); l = lo12(stack_top)
+    return [('CODE', f"lui sp,{h}"), ('CODE', f"addi sp,sp,{l}")]
+
+def iter_expand(text_raw, prov=None):
+    """
+    text 段条目 → 线性 IR 流：('LABEL', name) 或展开后的指令 (emn, eargs, orig_mn, orig_args)
+    CODE 的值也可以是已拆好的 (mn, args, src)（arm2rv 直接交接，不再过正则）；
+    prov 为 dict 时记录 id(指令元组) → src（来源行），优化 pass 重排后仍然有效
+    """
     for item_type, item_val in text_raw:
         if item_type == 'LABEL':
-            labels_by_idx[item_val] = len(instructions)
+            yield item_type, item_val
             continue
-        line = item_val
-        m = re.match(r'([\w.]+)(.*)', line)
+        if type(item_val) is tuple:
+            mn, args, src = item_val
+            mn = sys.intern(mn)
+            for (emn, eargs) in expand_pseudo(mn, args):
+                inst = (sys.intern(emn), eargs, mn, args)
+                if prov is not None: prov[id(inst)] = src
+                yield inst
+            continue
+        m = MNEMONIC_RE.match(item_val)
         if not m: continue
-        mn   = m.group(1).strip().lower()
+        mn   = sys.intern(m.group(1).strip().lower())
         args = m.group(2).strip().lstrip(',').strip()
         for (emn, eargs) in expand_pseudo(mn, args):
-            instructions.append((emn, eargs, mn, args))
-
-    N = len(instructions)
-    if N == 0:
-        print("[WARN] 没有找到任何指令"); return {}
+            yield sys.intern(emn), eargs, mn, args
 
-    # ─────────────────────────────────────────────────────────────────────────
-    #  RAW 冒险分析 → 每条指令后需要插入的 NOP 数
-    # ─────────────────────────────────────────────────────────────────────────
-    nops_after, haz_info = compute_nops(instructions)
+def expand_text(text_raw, prov=None):
+    """
+    展开伪指令，收集指令列表。
+    标签记录为【指令序号】，不是字节地址（字节地址要等 NOP 计算后才知道）
+    返回 (instructions, labels_by_idx)，instructions 元素为 (emn, eargs, orig_mn, orig_args)
+    """
+    instructions  = []
+    labels_by_idx = {}
+    for it in iter_expand(text_raw, prov):
+        if len(it) == 2:
+            labels_by_idx[it[1]] = len(instructions)
+        else:
+            instructions.append(it)
+    return instructions, labels_by_idx
 
-    # ─────────────────────────────────────────────────────────────────────────
-    #  计算各指令的字节 PC（按实际 NOP 数累加）
-    # ─────────────────────────────────────────────────────────────────────────
+def layout(nops_after):
+    """按实际 NOP 数累加各指令的字节 PC，返回 (byte_pcs, total_bytes)"""
     byte_pcs = []
     pc = 0
-    for i in range(N):
+    for n in nops_after:
         byte_pcs.append(pc)
-        pc += BYTES_PER_SLOT * (1 + nops_after[i])
-    total_bytes = pc
-    total_slots = total_bytes // BYTES_PER_SLOT
-    halt_byte_pc = byte_pcs[N - 1]
-
-    # ─────────────────────────────────────────────────────────────────────────
-    #  构建最终标签字节地址表
-    # ─────────────────────────────────────────────────────────────────────────
+        pc += BYTES_PER_SLOT * (1 + n)
+    return byte_pcs, pc
+
+def build_labels(rodata_labels, labels_by_idx, byte_pcs, total_bytes, rodata_base):
+    """构建最终标签字节地址表"""
     labels = {}
     for lbl, offset in rodata_labels.items():
         labels[lbl] = rodata_base + offset
+    N = len(byte_pcs)
     for lbl, idx in labels_by_idx.items():
         labels[lbl] = byte_pcs[idx] if idx < N else total_bytes
+    return labels
 
-    # ─────────────────────────────────────────────────────────────────────────
-    #  Pass 2：编码（标签地址已经正确）
-    # ─────────────────────────────────────────────────────────────────────────
+def encode_all(instructions, byte_pcs, labels, nops_after, haz_info):
+    """
+    编码（标签地址已经正确）。返回 encoded 列表，元素为
+    (bpc, slot_idx, word, orig_mn, orig_args, emn, eargs, n_nop, haz)
+    """
     encoded = []
     for i, (emn, eargs, orig_mn, orig_args) in enumerate(instructions):
         bpc      = byte_pcs[i]
@@ -448,158 +424,224 @@ def assemble(src_path, rodata_base=DEFAULT_RODATA_BASE, stack_top=DEFAULT_STACK_
             )
         encoded.append((bpc, slot_idx, word, orig_mn, orig_args,
                          emn, eargs, nops_after[i], haz_info[i]))
+    return encoded
 
-    # ─────────────────────────────────────────────────────────────────────────
-    #  统计 & 打印
-    # ─────────────────────────────────────────────────────────────────────────
+def make_image(src_name, encoded, labels, rodata_data, rodata_base, stack_top):
+    """汇总统计，返回镜像 dict（writer 与 print_summary 的统一输入）"""
+    N = len(encoded)
+    nops_after = [e[7] for e in encoded]
+    haz_info   = [e[8] for e in encoded]
     total_nops = sum(nops_after)
-    haz_d1 = sum(1 for h in haz_info if 'dist-1' in h)
-    haz_d2 = sum(1 for h in haz_info if 'dist-2' in h)
-
-    print(f"\n{'='*65}")
-    print(f" assemble succeed（RAW dependency of NOP insert）")
-    print(f"  real instr  : {N}")
-    print(f"  inserts NOPs : {total_nops}  (compared {N*2}，save {N*2 - total_nops} )")
-    print(f"  total slots    : {total_slots}  (compared {N*3}，decreased {N*3 - total_slots} slots)")
-    print(f"  HALT byte PC: {halt_byte_pc}  (slot {halt_byte_pc//4})")
-    print(f"  STACK_TOP   : 0x{stack_top:04X} = {stack_top}")
-    print(f"  RODATA_BASE : 0x{rodata_base:04X} → Dcache word {rodata_base//4}")
-    if rodata_data:
-        print(f"  .rodata     : {len(rodata_data)} words → Dcache[{rodata_base//4}..{rodata_base//4+len(rodata_data)-1}]")
-    print(f"\n  RAW hazard counts:")
-    print(f"    dist-1（+2 NOP）: {haz_d1} ")
-    print(f"    dist-2（+1 NOP）: {haz_d2} ")
-    print(f"\n  tag address:")
-    for k, v in sorted(labels.items(), key=lambda x: x[1]):
-        if v < rodata_base:
-            print(f"    {k:25s} byte={v:5d}  slot={v//4:4d}")
-        else:
-            print(f"    {k:25s} byte=0x{v:04X}  Dcache word {v//4}")
-    print(f"{'='*65}\n")
-
-    # ─────────────────────────────────────────────────────────────────────────
-    #  生成 Listing
-    # ─────────────────────────────────────────────────────────────────────────
-    slot2lbl = {}
-    for lbl, bpc_ in labels.items():
-        if bpc_ < rodata_base:
-            slot2lbl.setdefault(bpc_ // BYTES_PER_SLOT, []).append(lbl)
-
-    with open(stem + ".listing", "w", encoding="utf-8") as lf:
-        lf.write(f"RV32I Listing — {os.path.basename(src_path)}\n")
-        lf.write(f"  RODATA_BASE=0x{rodata_base:04X}  STACK_TOP=0x{stack_top:04X}\n")
-        lf.write(f"  {N} insts  {total_nops} NOPs  {total_slots} slots  "
-                 f"HALT byte PC={halt_byte_pc}\n")
-        lf.write(f"  dist-1 hazards={haz_d1}(+2NOP)  dist-2 hazards={haz_d2}(+1NOP)\n")
-        lf.write("─" * 82 + "\n")
-        lf.write(f"{'BytePC':>7} {'Slot':>5}  {'Hex':>10}  {'Assembly':<36} Hazard\n")
-        lf.write("─" * 82 + "\n")
-
-        for (bpc, slot_idx, word, orig_mn, orig_args,
-             emn, eargs, n_nop, haz) in encoded:
-            for lbl in slot2lbl.get(slot_idx, []):
-                lf.write(f"{'':>7} {'':>5}  {'':>10}  <{lbl}>:\n")
-            asm_str = f"{orig_mn} {orig_args}".strip()
-            lf.write(f"{bpc:7d} {slot_idx:5d}  0x{word:08X}  {asm_str:<36} {haz}\n")
-            for k in range(n_nop):
-                lf.write(f"{'':>7} {slot_idx+1+k:5d}  0x{NOP_WORD:08X}  (NOP)\n")
-
-        lf.write("─" * 82 + "\n")
-        lf.write(f"Total: {N} instructions, {total_slots} slots"
-                 f"  (fixed-2-NOP would be {N*3} slots, saved {N*3-total_slots})\n")
-
-    # ─────────────────────────────────────────────────────────────────────────
-    #  生成 Verilog .vh
-    # ─────────────────────────────────────────────────────────────────────────
-    with open(stem + ".vh", "w", encoding="utf-8") as vf:
-        vf.write(f"// {'='*60}\n")
-        vf.write(f"// Auto-generated by rv32i_asm.py (RAW-aware NOP insertion)\n")
-        vf.write(f"// Source : {os.path.basename(src_path)}\n")
-        vf.write(f"// Insts  : {N}   NOPs inserted: {total_nops}   Slots: {total_slots}\n")
-        vf.write(f"// HALT byte PC = {halt_byte_pc}  (slot {halt_byte_pc//4})\n")
-        vf.write(f"// STACK_TOP    = 0x{stack_top:04X} = {stack_top}\n")
-        vf.write(f"// RODATA_BASE  = 0x{rodata_base:04X} → Dcache word {rodata_base//4}\n")
-        if rodata_data:
-            s0_est  = stack_top - 4
-            arr_est = s0_est - 44
-            vf.write(f"// Array result (bubble sort): arr_base≈0x{arr_est:04X}"
-                     f" → Dcache word {arr_est//4}..{arr_est//4+len(rodata_data)-1}\n")
-        vf.write(f"// {'='*60}\n\n")
-
-        # ── load_icache ───────────────────────────────────────────────────────
-        vf.write("// ─────────────────────────────────────────────\n")
-        vf.write("// Task: load_icache\n")
-        vf.write("// ─────────────────────────────────────────────\n")
-        vf.write("task load_icache;\n")
-        vf.write("integer _ki;\n")
-        vf.write("begin\n")
-        vf.write("    for (_ki = 0; _ki < 512; _ki = _ki + 1)\n")
-        vf.write("        dut.Imm.mem[_ki] = 32'h00000013; // NOP\n\n")
-
-        for (bpc, slot_idx, word, orig_mn, orig_args,
-             emn, eargs, n_nop, haz) in encoded:
-            lbls = slot2lbl.get(slot_idx, [])
-            if lbls:
-                vf.write(f"    // ── {'  '.join('<'+l+'>' for l in lbls)}"
-                         f" (byte {bpc}) ──\n")
-            asm_str = f"{orig_mn} {orig_args}".strip()
-            haz_com = f"  // {haz}" if haz else ""
-            vf.write(f"    dut.Imm.mem[{slot_idx:3d}] = 32'h{word:08X};"
-                     f" // {asm_str}{haz_com}\n")
-            for k in range(n_nop):
-                vf.write(f"    dut.Imm.mem[{slot_idx+1+k:3d}] = 32'h{NOP_WORD:08X}; // NOP\n")
-
-        vf.write(f"\n    $display(\"[ICACHE] {N} insts, {total_slots} slots,"
-                 f" HALT byte PC={halt_byte_pc}\");\n")
-        vf.write("end\nendtask\n\n")
-
-        # ── load_dcache ───────────────────────────────────────────────────────
-        vf.write("// ─────────────────────────────────────────────\n")
-        vf.write("// Task: load_dcache\n")
-        if rodata_data:
-            vf.write(f"// .rodata → Dcache word {rodata_base//4}"
-                     f"..{rodata_base//4+len(rodata_data)-1}\n")
-        vf.write("// ★ 修改测试数据只需改此 task ★\n")
-        vf.write("// ─────────────────────────────────────────────\n")
-        vf.write("task load_dcache;\n")
-        vf.write("integer _kd;\n")
-        vf.write("begin\n")
-        vf.write("    for (_kd = 0; _kd < 512; _kd = _kd + 1)\n")
-        vf.write("        dut.mm_stage_inst.Dmm.mem[_kd] = 32'h00000000;\n\n")
-
-        if rodata_data:
-            vf.write(f"    // .rodata (.LC0 等) → Dcache word {rodata_base//4} 起\n")
-            vf.write(f"    // ★ 修改测试输入请改这里 ★\n")
-            bw = rodata_base // 4
-            for idx, val in enumerate(rodata_data):
-                sv = val if val < 0x80000000 else val - 0x100000000
-                vf.write(f"    dut.mm_stage_inst.Dmm.mem[{bw+idx}]"
-                         f" = 32'h{val & 0xFFFFFFFF:08X}; // {sv}\n")
-            vf.write(f"\n    // ★ 输入快照（用于完整性验证）★\n")
-            vf.write(f"    for (i = 0; i < ARR_LEN; i = i + 1)\n")
-            vf.write(f"        input_snapshot[i] = dut.mm_stage_inst.Dmm.mem[{bw} + i];\n")
-        else:
-            vf.write("    // 无 .rodata；如需预设数据请在此添加\n")
+    total_slots = N + total_nops
+    return {
+        "src_name":     src_name,
+        "encoded":      encoded,
+        "labels":       labels,
+        "rodata_data":  rodata_data,
+        "rodata_base":  rodata_base,
+        "stack_top":    stack_top,
+        "n_insts":      N,
+        "total_nops":   total_nops,
+        "total_slots":  total_slots,
+        "halt_byte_pc": encoded[N - 1][0],
+        "haz_d1":       sum(1 for h in haz_info if 'dist-1' in h),
+        "haz_d2":       sum(1 for h in haz_info if 'dist-2' in h),
+    }
+
+class _Phase:
+    """phase() 的 with 对象（不用 contextlib：CLI 默认不计时，省掉它的导入）"""
+    __slots__ = ("timings", "name", "t0")
 
-        vf.write(f"\n    $display(\"[DCACHE] 数据预加载完成\");\n")
-        vf.write("end\nendtask\n")
+    def __init__(self, timings=None, name=None):
+        self.timings, self.name = timings, name
 
-    print(f"[输出] {stem}.listing")
-    print(f"[输出] {stem}.vh")
+    def __enter__(self):
+        if self.timings is not None:
+            self.t0 = time.perf_counter()
+        return self
 
+    def __exit__(self, *exc):
+        if self.timings is not None:
+            self.timings[self.name] = (self.timings.get(self.name, 0.0)
+                                       + (time.perf_counter() - self.t0) * 1e3)
+        return False
+
+_NO_PHASE = _Phase()
+
+def phase(timings, name):
+    """把 with 块的墙钟时间（ms）累加到 timings[name]；timings 为 None 时不计时"""
+    return _NO_PHASE if timings is None else _Phase(timings, name)
+
+def assemble_lines(raw, src_name="<memory>",
+                   rodata_base=DEFAULT_RODATA_BASE, stack_top=DEFAULT_STACK_TOP,
+                   timings=None, opt=None, shadow=False, policy="raw"):
+    """
+    源文本行 → 镜像 dict；没有指令时返回 None。
+    timings 传入 dict 时记录各阶段耗时；
+    opt 为 NOP 插入前的优化回调 (instructions, labels_by_idx, ctx) → (instructions, labels_by_idx)
+    （见 rv32i_opt.make_hook）；ctx = {"globls": .globl 符号列表,
+                                     "symbols": rodata 标签 → 字节地址（与代码布局无关，布局前已知）}
+    shadow 为 True 时按分支影子槽模式填槽（rv32i_shadow.fill），镜像只能在 BRANCH_SHADOW=1 的 RTL 上运行
+    policy 为 NOP 填充策略名（见 rv32i_policy.py：fixed / raw / optimal / scheduled / barrel[=N]）
+    """
+    with phase(timings, "split"):
+        lines = preprocess(raw)
+        text_raw, rodata_data, rodata_labels = split_sections(lines)
+    globls = None
+    if opt is not None:
+        globls = [m.group(1) for line in raw for m in [GLOBL_RE.match(line)] if m]
+    return assemble_sections(text_raw, rodata_data, rodata_labels, src_name,
+                             rodata_base=rodata_base, stack_top=stack_top, timings=timings,
+                             opt=opt, shadow=shadow, policy=policy, globls=globls)
+
+def assemble_sections(text_raw, rodata_data, rodata_labels, src_name="<memory>",
+                      rodata_base=DEFAULT_RODATA_BASE, stack_top=DEFAULT_STACK_TOP,
+                      timings=None, opt=None, shadow=False, policy="raw", globls=None):
+    """
+    assemble_lines 的后半段：split_sections / collect_sections 的结果 → 镜像 dict。
+    CODE 条目带来源 (mn, args, src) 时，镜像另有 "provenance"：每条指令的 src（无来源为 None）
+    """
+    if shadow and policy != "raw":
+        raise ValueError("--shadow 只支持 raw NOP 策略")
+    text_raw = startup_stub(stack_top) + text_raw
+    prov = {}
+    with phase(timings, "expand"):
+        instructions, labels_by_idx = expand_text(text_raw, prov)
+    expanded = instructions        # 保持原指令元组存活，prov 的 id 在函数内不会被复用
+    if opt is not None and instructions:
+        with phase(timings, "opt"):
+            ctx = {"globls":  list(globls or ()),
+                   "symbols": {l: rodata_base + off for l, off in rodata_labels.items()}}
+            instructions, labels_by_idx = opt(instructions, labels_by_idx, ctx)
+    if not instructions:
+        return None
+    shadow_rep = None
+    if shadow:
+        from rv32i_shadow import fill, fix_nops
+        with phase(timings, "shadow"):
+            shadow_rep = {}
+            instructions, labels_by_idx = fill(instructions, labels_by_idx, shadow_rep)
+
+    # RAW 冒险分析 → 每条指令后需要插入的 NOP 数（默认 raw 不经过插件注册表）
+    with phase(timings, "hazard"):
+        if policy == "raw":
+            nops_after, haz_info = compute_nops(instructions)
+        else:
+            from rv32i_policy import get_policy
+            instructions, labels_by_idx, nops_after, haz_info = \
+                get_policy(policy)(instructions, labels_by_idx)
+        if shadow:
+            fix_nops(instructions, nops_after, haz_info)
+    with phase(timings, "layout"):
+        byte_pcs, total_bytes = layout(nops_after)
+        labels  = build_labels(rodata_labels, labels_by_idx, byte_pcs, total_bytes, rodata_base)
+    with phase(timings, "encode"):
+        encoded = encode_all(instructions, byte_pcs, labels, nops_after, haz_info)
+    with phase(timings, "image"):
+        img = make_image(src_name, encoded, labels, rodata_data, rodata_base, stack_top)
+        img["shadow"] = shadow_rep
+        img["policy"] = policy
+        if prov:
+            img["provenance"] = [prov.get(id(it)) for it in instructions]
+        del expanded
+        return img
+
+def image_words(img):
+    """镜像 dict → Icache word 列表（含 NOP，slot 0 起）"""
+    words = []
+    for e in img["encoded"]:
+        words.append(e[2])
+        words.extend([NOP_WORD] * e[7])
+    return words
+
+def image_result(img):
+    """assemble() 的返回值（供 TB 生成使用）"""
     return {
-        "halt_byte_pc": halt_byte_pc,
-        "total_slots":  total_slots,
-        "rodata_base":  rodata_base,
-        "rodata_words": len(rodata_data),
-        "stack_top":    stack_top,
-        "labels":       labels,
+        "halt_byte_pc": img["halt_byte_pc"],
+        "total_slots":  img["total_slots"],
+        "rodata_base":  img["rodata_base"],
+        "rodata_words": len(img["rodata_data"]),
+        "stack_top":    img["stack_top"],
+        "labels":       img["labels"],
+    }
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  主汇编流程
+# ─────────────────────────────────────────────────────────────────────────────
+def metrics(img, timings):
+    """机器可读报告：各阶段耗时（ms）+ 代码质量计数"""
+    N = img["n_insts"]
+    return {
+        "src":      img["src_name"],
+        "phases_ms": {k: round(v, 4) for k, v in timings.items()},
+        "total_ms": round(sum(timings.values()), 4),
+        "counters": {
+            "insts":          N,
+            "nops":           img["total_nops"],
+            "slots":          img["total_slots"],
+            "nops_saved":     N * 2 - img["total_nops"],
+            "haz_d1":         img["haz_d1"],
+            "haz_d2":         img["haz_d2"],
+            "halt_byte_pc":   img["halt_byte_pc"],
+            "icache_words":   img["total_slots"],
+            "icache_capacity": ICACHE_WORDS,
+            "icache_util":    round(img["total_slots"] / ICACHE_WORDS, 4),
+            "rodata_words":   len(img["rodata_data"]),
+        },
     }
 
+def print_profile(timings):
+    total = sum(timings.values()) or 1e-9
+    print(f"  {'phase':<10} {'ms':>10} {'%':>6}")
+    for k, v in timings.items():
+        print(f"  {k:<10} {v:>10.3f} {100 * v / total:>5.1f}%")
+    print(f"  {'total':<10} {total:>10.3f}")
+
+def assemble(src_path, rodata_base=DEFAULT_RODATA_BASE, stack_top=DEFAULT_STACK_TOP,
+             timings=None, quiet=False, opt=None, shadow=False, policy="raw",
+             imem_path=None, dmem_path=None):
+    """
+    汇编并写 <stem>.listing / <stem>.vh；imem_path / dmem_path 给出时另写 hex（write_hex）。
+    timings 传入 dict 时记录 read / 各阶段 / 各 writer 耗时；quiet 不打印 banner。
+    """
+    stem = os.path.splitext(src_path)[0]
+
+    with phase(timings, "read"):
+        with open(src_path, encoding="utf-8", errors="replace") as f:
+            raw = f.readlines()
+
+    img = assemble_lines(raw, os.path.basename(src_path),
+                         rodata_base=rodata_base, stack_top=stack_top, timings=timings,
+                         opt=opt, shadow=shadow, policy=policy)
+    if img is None:
+        print("[WARN] 没有找到任何指令", file=sys.stderr if quiet else sys.stdout); return {}
+
+    if not quiet:
+        print_summary(img)
+    with phase(timings, "write_listing"):
+        write_listing(img, stem + ".listing")
+    with phase(timings, "write_vh"):
+        write_vh(img, stem + ".vh")
+    if imem_path and dmem_path:
+        with phase(timings, "write_hex"):
+            write_hex(img, imem_path, dmem_path)
+    if not quiet:
+        print(f"[输出] {stem}.listing")
+        print(f"[输出] {stem}.vh")
+        if imem_path and dmem_path:
+            print(f"[输出] {imem_path}")
+            print(f"[输出] {dmem_path}")
+
+    res = image_result(img)
+    if timings is not None:
+        res["metrics"] = metrics(img, timings)
+    return res
+
 # ─────────────────────────────────────────────────────────────────────────────
 #  命令行入口
 # ─────────────────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
+    import argparse
     parser = argparse.ArgumentParser(
         description="RV32I Assembler for Early-Branch Pipeline (RAW-aware NOP insertion)")
     parser.add_argument("src",      help="汇编源文件 (.asm / .s)")
@@ -607,9 +649,89 @@ if __name__ == "__main__":
                         help=f"rodata 字节基址（默认 0x{DEFAULT_RODATA_BASE:X}）")
     parser.add_argument("--stack",  default=None,
                         help=f"sp 初始值（默认 0x{DEFAULT_STACK_TOP:X}）")
+    parser.add_argument("--opt", default=None,
+                        help="NOP 插入前的优化 pass，逗号分隔（见 rv32i_opt.py，如 peephole）")
+    parser.add_argument("--unroll", type=int, default=None, metavar="N",
+                        help="计数内层循环展开 N 份（追加 pass unroll=N）")
+    parser.add_argument("--profile-layout", default=None, metavar="PROFILE",
+                        help="按 rv32i_sim.py --profile-out 的边计数重排基本块（追加 pass layout，"
+                             "profile 需用相同的 --opt 生成）")
+    parser.add_argument("--shadow", action="store_true",
+                        help="实验性：分支影子槽模式（跳转后的 slot 执行而不冲刷；RTL 需 BRANCH_SHADOW=1）")
+    parser.add_argument("--nops", default="raw", metavar="POLICY",
+                        help="NOP 填充策略：fixed / raw / optimal / scheduled / barrel[=N]"
+                             "（见 rv32i_policy.py，默认 raw）")
+    parser.add_argument("--imem", default=None, help="另写 imem.hex（run_hw.sh 格式，需同时给 --dmem）")
+    parser.add_argument("--dmem", default=None, help="另写 dmem.hex（run_hw.sh 格式）")
+    parser.add_argument("--stream", action="store_true",
+                        help="流式汇编（内存有界，输出相同；不能与 --opt / --shadow 等整程序 pass 同用）")
+    parser.add_argument("--metrics", choices=["json"], default=None,
+                        help="把各阶段耗时与代码质量计数以 JSON 输出到 stdout（不打印 banner）")
+    parser.add_argument("--profile", action="store_true",
+                        help="打印各阶段耗时表与 cProfile 热点函数")
     args = parser.parse_args()
 
     rodata_base = int(args.rodata, 16) if args.rodata else DEFAULT_RODATA_BASE
     stack_top   = int(args.stack,  16) if args.stack  else DEFAULT_STACK_TOP
 
-    assemble(args.src, rodata_base=rodata_base, stack_top=stack_top)
\ No newline at end of file
+    if bool(args.imem) != bool(args.dmem):
+        parser.error("--imem 与 --dmem 需同时给出")
+    if args.nops != "raw":
+        if args.shadow:
+            parser.error("--shadow 只支持 --nops raw")
+        from rv32i_policy import get_policy
+        try:
+            get_policy(args.nops)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.stream:
+        if (args.opt or args.unroll or args.profile_layout or args.shadow
+                or args.nops != "raw" or args.imem):
+            parser.error("--stream 不能与 --opt / --unroll / --profile-layout / --shadow / --nops / "
+                         "--imem 同用")
+        from rv32i_stream import assemble as assemble_stream
+        timings = {} if args.metrics else None
+        res = assemble_stream(args.src, rodata_base, stack_top, timings=timings,
+                              quiet=bool(args.metrics))
+        if args.metrics and res:
+            import json
+            json.dump(res["metrics"], sys.stdout, indent=2)
+        sys.exit(0)
+
+    opt = None
+    if args.unroll:
+        args.opt = ",".join(filter(None, [args.opt, f"unroll={args.unroll}"]))
+    if args.profile_layout:
+        args.opt = ",".join(filter(None, [args.opt, f"layout={args.profile_layout}"]))
+    if args.opt:
+        from rv32i_opt import make_hook
+        opt = make_hook(args.opt)
+
+    if not (args.metrics or args.profile):
+        assemble(args.src, rodata_base=rodata_base, stack_top=stack_top, opt=opt,
+                 shadow=args.shadow, policy=args.nops, imem_path=args.imem, dmem_path=args.dmem)
+        sys.exit(0)
+
+    timings = {}
+    if args.profile:
+        import cProfile, pstats
+        prof = cProfile.Profile()
+        res = prof.runcall(assemble, args.src, rodata_base, stack_top,
+                           timings=timings, quiet=bool(args.metrics), opt=opt,
+                           shadow=args.shadow, policy=args.nops,
+                           imem_path=args.imem, dmem_path=args.dmem)
+        # cProfile 自身会放大耗时，阶段表仅用于相对比较
+        out = sys.stderr if args.metrics else sys.stdout
+        print("[PROFILE] phases (cProfile 开启，绝对值偏大)", file=out)
+        _stdout, sys.stdout = sys.stdout, out
+        print_profile(timings)
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(15)
+        sys.stdout = _stdout
+    else:
+        res = assemble(args.src, rodata_base, stack_top, timings=timings, quiet=True, opt=opt,
+                       shadow=args.shadow, policy=args.nops,
+                       imem_path=args.imem, dmem_path=args.dmem)
+    if args.metrics and res:
+        import json
+        json.dump(res["metrics"], sys.stdout, indent=2)
+        print()
\ No newline at end of file
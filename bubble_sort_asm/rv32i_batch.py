@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+rv32i_batch.py  —  多源文件并行汇编（assemble-many）
+=============================================================================
+回归目录里的 risc/*.s 与大量生成变体，原来每个文件一次
+`python rv32i_asm_improved.py`。这里用 ProcessPoolExecutor 一次性处理：
+
+  · 源文件按 --chunksize 分块交给 worker（减少 IPC 往返）
+  · 每个文件返回结构化结果 {src, ok, insts, nops, slots, haz_d1, haz_d2, ms, error}
+    单个文件失败不影响其它文件
+  · <stem>.listing / <stem>.vh 先写临时文件再 os.replace，不会留下半截输出
+  · --out-dir 下保留源文件相对于公共上级目录的路径（a/x.s、b/x.s → <out>/a/x.*、<out>/b/x.*）；
+    仍会落到同一输出的不同源文件（x.s 与 x.asm）直接报错，不互相覆盖
+  · 汇总吞吐量（files/s、lines/s）与 worker 数
+
+【命令行】
+  python rv32i_batch.py assemble-many risc/*.s
+  python rv32i_batch.py assemble-many gen/*.s -j 8 --chunksize 16 --out-dir build --json report.json
+  退出码：存在失败文件时为 1
+"""
+
+import os, sys, json, time, argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from rv32i_asm_improved import (
+    DEFAULT_RODATA_BASE, DEFAULT_STACK_TOP,
+    assemble_lines, write_listing, write_vh,
+)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  原子写：writer 写入同目录临时文件，再 os.replace
+# ─────────────────────────────────────────────────────────────────────────────
+def _atomic(writer, img, path):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        writer(img, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  worker：一个文件 → 结果 dict（异常不外抛）
+# ─────────────────────────────────────────────────────────────────────────────
+def assemble_one(src, out_dir=None, rodata_base=DEFAULT_RODATA_BASE,
+                 stack_top=DEFAULT_STACK_TOP):
+    t0 = time.perf_counter()
+    res = {"src": src, "ok": False, "lines": 0}
+    try:
+        with open(src, encoding="utf-8", errors="replace") as f:
+            raw = f.readlines()
+        res["lines"] = len(raw)
+        img = assemble_lines(raw, os.path.basename(src),
+                             rodata_base=rodata_base, stack_top=stack_top)
+        if img is None:
+            raise ValueError("没有找到任何指令")
+        stem = os.path.splitext(os.path.basename(src) if out_dir else src)[0]
+        if out_dir:
+            stem = os.path.join(out_dir, stem)
+        _atomic(write_listing, img, stem + ".listing")
+        _atomic(write_vh, img, stem + ".vh")
+        res.update(ok=True, insts=img["n_insts"], nops=img["total_nops"],
+                   slots=img["total_slots"], haz_d1=img["haz_d1"], haz_d2=img["haz_d2"],
+                   outputs=[stem + ".listing", stem + ".vh"])
+    except Exception as e:
+        res["error"] = f"{type(e).__name__}: " + " | ".join(
+            l.strip() for l in str(e).strip().splitlines())
+    res["ms"] = round((time.perf_counter() - t0) * 1e3, 3)
+    return res
+
+
+def _star(job):
+    return assemble_one(*job)
+
+
+def output_dirs(sources, out_dir=None):
+    """
+    每个源文件的输出目录（None = 与源文件同目录）。out_dir 下保留相对于公共上级目录的路径。
+    不同源文件得到同一输出 stem 时抛 ValueError。
+    """
+    if out_dir and sources:
+        absd = [os.path.dirname(os.path.abspath(s)) for s in sources]
+        root = os.path.commonpath(absd)
+        dirs = [os.path.normpath(os.path.join(out_dir, os.path.relpath(d, root))) for d in absd]
+    else:
+        dirs = [None] * len(sources)
+    seen = {}
+    for s, d in zip(sources, dirs):
+        stem = os.path.splitext(os.path.basename(s) if d else s)[0]
+        key = os.path.abspath(os.path.join(d, stem) if d else stem)
+        prev = seen.setdefault(key, s)
+        if os.path.abspath(prev) != os.path.abspath(s):
+            raise ValueError(f"{prev} 与 {s} 的输出同为 {key}.listing / .vh")
+    return dirs
+
+
+def assemble_many(sources, jobs=None, chunksize=None, out_dir=None,
+                  rodata_base=DEFAULT_RODATA_BASE, stack_top=DEFAULT_STACK_TOP):
+    """
+    返回 (results, summary)；results 与 sources 同序。
+    jobs=1 时不起进程池（便于调试与对比单核基线）。
+    输出路径冲突（见 output_dirs）时在汇编任何文件之前抛 ValueError。
+    """
+    jobs = jobs or os.cpu_count() or 1
+    dirs = output_dirs(sources, out_dir)
+    for d in set(dirs) - {None}:
+        os.makedirs(d, exist_ok=True)
+    work = [(s, d, rodata_base, stack_top) for s, d in zip(sources, dirs)]
+    if chunksize is None:       # 每个 worker 约 4 块，兼顾负载均衡与 IPC 开销
+        chunksize = max(1, len(work) // (jobs * 4))
+
+    t0 = time.perf_counter()
+    if jobs == 1 or len(work) <= 1:
+        results = [_star(w) for w in work]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            results = list(ex.map(_star, work, chunksize=chunksize))
+    wall = time.perf_counter() - t0
+
+    ok = [r for r in results if r["ok"]]
+    lines = sum(r["lines"] for r in results)
+    summary = {"files": len(results), "ok": len(ok), "failed": len(results) - len(ok),
+               "jobs": jobs, "chunksize": chunksize,
+               "wall_s": round(wall, 4),
+               "cpu_s": round(sum(r["ms"] for r in results) / 1e3, 4),
+               "files_per_s": round(len(results) / wall, 1) if wall else 0.0,
+               "lines_per_s": round(lines / wall, 1) if wall else 0.0}
+    return results, summary
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RV32I 批量并行汇编")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("assemble-many", help="并行汇编多个源文件")
+    p.add_argument("sources", nargs="+", help="汇编源文件 (.asm / .s)")
+    p.add_argument("-j", "--jobs", type=int, default=None, help="worker 数（默认 CPU 核数）")
+    p.add_argument("--chunksize", type=int, default=None, help="每次派发给 worker 的文件数")
+    p.add_argument("--out-dir", default=None,
+                   help="输出目录，其下保留源文件的相对路径（默认与源文件同目录）")
+    p.add_argument("--rodata", default=None,
+                   help=f"rodata 字节基址（默认 0x{DEFAULT_RODATA_BASE:X}）")
+    p.add_argument("--stack",  default=None,
+                   help=f"sp 初始值（默认 0x{DEFAULT_STACK_TOP:X}）")
+    p.add_argument("--json", default=None, metavar="PATH",
+                   help="把逐文件结果与汇总写成 JSON（'-' 为 stdout）")
+    p.add_argument("--quiet", action="store_true", help="只输出失败与汇总")
+    args = parser.parse_args(argv)
+
+    rodata_base = int(args.rodata, 16) if args.rodata else DEFAULT_RODATA_BASE
+    stack_top   = int(args.stack,  16) if args.stack  else DEFAULT_STACK_TOP
+
+    try:
+        results, summary = assemble_many(args.sources, args.jobs, args.chunksize,
+                                         args.out_dir, rodata_base, stack_top)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.json == "-":
+        json.dump({"summary": summary, "results": results}, sys.stdout, indent=2)
+        print()
+    else:
+        for r in results:
+            if not r["ok"]:
+                print(f"  FAIL  {r['src']}: {r['error']}")
+            elif not args.quiet:
+                print(f"  OK    {r['src']:<40} {r['insts']:5d} insts "
+                      f"{r['slots']:5d} slots  {r['ms']:8.2f} ms")
+        print(f"[BATCH] {summary['ok']}/{summary['files']} ok, {summary['failed']} failed  "
+              f"jobs={summary['jobs']} chunk={summary['chunksize']}  "
+              f"wall {summary['wall_s']:.3f}s  "
+              f"{summary['files_per_s']:.1f} files/s  {summary['lines_per_s']:.0f} lines/s")
+        if args.json:
+            tmp = args.json + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"summary": summary, "results": results}, f, indent=2)
+            os.replace(tmp, args.json)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+rv32i_bench.py  —  汇编器吞吐量基准（合成程序生成器 + JSON 结果）
+=============================================================================
+生成器（固定 seed，可复现）：
+  deps    — 依赖密集链：每条指令读上一条的结果（dist-1 冒险最多）
+  branchy — 分支密集 CFG：4~6 行一个基本块，条件分支跳到附近块
+  rodata  — rodata 重：大量 .word 表 + %hi/%lo 取址
+  o0      — GCC -O0 风格：prologue/epilogue、s0 相对 lw/sw、call、局部循环
+
+被测变体（各自的 assemble()，每次测量在独立子进程中运行）：
+  fixed        bubble_sort_asm/rv32i_asm.py           （核心 + --nops fixed）
+  improved     bubble_sort_asm/rv32i_asm_improved.py  （共享核心，RAW-aware）
+  stream       bubble_sort_asm/rv32i_stream.py        （同 improved，流式、内存有界）
+  netfpga      netfpga/sw/rv32i_asm.py                （核心 + fixed + hex）
+  netfpga_dbg  netfpga/sw/rv32i_asm_dbg.py            （核心 + raw + hex）
+  各 NOP 策略的 slot / 周期对比见 rv32i_policy.py（这里只测汇编速度）。
+
+  每个 (生成器, 规模, 变体) 记录：lines/s、墙钟时间、峰值 RSS 增量（KiB）。
+  生成的程序不保证可运行，只用于测汇编速度；分支目标都在附近，避免偏移溢出。
+
+【命令行】
+  python rv32i_bench.py                                  # 默认 1k,10k,100k
+  python rv32i_bench.py --sizes 1k,10k,100k,1M --gens deps,o0 --variants improved
+  python rv32i_bench.py --json new.json --compare old.json   # 与旧结果对比（默认阈值 10%）
+  python rv32i_bench.py --emit o0 --sizes 10k > big.s        # 只输出生成的源文件
+  python rv32i_bench.py --startup [--repeat 20]              # 冷启动：导入耗时 + 首次汇编延迟
+
+【--startup】
+  每次在全新解释器里：导入变体模块（import_ms）→ 对 200 行 o0 程序调用一次 assemble()（first_ms）；
+  另记整个进程的墙钟时间（process_ms，含解释器启动），以及导入后 argparse / json 是否已被加载。
+  重复 --repeat 次（默认 10）取中位数；导入耗时另给最小值（import_min_ms，受调度噪声影响最小，
+  跨版本比较时看它）。
+"""
+
+import os, sys, json, time, random, argparse, tempfile, subprocess
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+VARIANTS = {
+    "fixed":       os.path.join(_HERE, "rv32i_asm.py"),
+    "improved":    os.path.join(_HERE, "rv32i_asm_improved.py"),
+    "stream":      os.path.join(_HERE, "rv32i_stream.py"),
+    "netfpga":     os.path.join(_HERE, "..", "netfpga", "sw", "rv32i_asm.py"),
+    "netfpga_dbg": os.path.join(_HERE, "..", "netfpga", "sw", "rv32i_asm_dbg.py"),
+}
+
+_TMP = ["t0", "t1", "t2", "a0", "a1", "a2", "a3", "a4", "a5"]
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  生成器：gen(n_lines, rng) → 源文件行列表（约 n_lines 行）
+# ─────────────────────────────────────────────────────────────────────────────
+def gen_deps(n, rng):
+    out = ["\t.text", "\t.globl\tmain", "main:", "\tli\ta0,1"]
+    prev = "a0"
+    while len(out) < n - 1:
+        rd = rng.choice(_TMP)
+        op = rng.choice(("add", "sub", "xor", "or", "addi", "slli"))
+        if op == "addi":   out.append(f"\taddi\t{rd},{prev},{rng.randint(-64, 64)}")
+        elif op == "slli": out.append(f"\tslli\t{rd},{prev},{rng.randint(1, 4)}")
+        else:              out.append(f"\t{op}\t{rd},{prev},{rng.choice(_TMP)}")
+        prev = rd
+    out.append("\tret")
+    return out
+
+def gen_branchy(n, rng):
+    out = ["\t.text", "\t.globl\tmain", "main:", "\tli\tt0,0", "\tli\tt1,100"]
+    k = 0
+    while len(out) < n - 1:
+        out.append(f".Lb{k}:")
+        for _ in range(rng.randint(2, 4)):
+            rd = rng.choice(_TMP[2:])
+            out.append(f"\taddi\t{rd},{rng.choice(_TMP)},{rng.randint(-8, 8)}")
+        tgt = max(0, k + rng.randint(-6, 6))
+        br = rng.choice(("blt", "bge", "bne", "beq", "ble", "bgt"))
+        out.append(f"\t{br}\t{rng.choice(_TMP)},{rng.choice(_TMP)},.Lb{tgt}")
+        k += 1
+    # 补齐向前引用的块
+    for j in range(k, k + 7):
+        out.append(f".Lb{j}:")
+    out.append("\tret")
+    return out
+
+def gen_rodata(n, rng):
+    n_tab = max(1, n // 40)
+    rod = ["\t.section\t.rodata", "\t.align\t2"]
+    text = ["\t.text", "\t.globl\tmain", "main:"]
+    for t in range(n_tab):
+        rod.append(f".LC{t}:")
+        rod.extend(f"\t.word\t{rng.randint(-1000, 1000)}" for _ in range(16))
+    while len(rod) + len(text) < n - 1:
+        t = rng.randrange(n_tab)
+        rd = rng.choice(_TMP[3:])
+        text.append(f"\tlui\t{rd},%hi(.LC{t})")
+        text.append(f"\taddi\t{rd},{rd},%lo(.LC{t})")
+        text.append(f"\tlw\t{rng.choice(_TMP)},{4 * rng.randrange(16)}({rd})")
+    text.append("\tret")
+    return rod + text
+
+def gen_o0(n, rng):
+    out = ["\t.text"]
+    f = 0
+    while len(out) < n - 8:
+        name = "main" if f == 0 else f"fn{f}"
+        out += [f"\t.globl\t{name}", f"{name}:",
+                "\taddi\tsp,sp,-32", "\tsw\tra,28(sp)", "\tsw\ts0,24(sp)", "\taddi\ts0,sp,32",
+                "\tsw\tzero,-20(s0)", f"\tj\t.L{f}_cond", f".L{f}_body:"]
+        for _ in range(rng.randint(4, 30)):
+            off = -4 * rng.randint(5, 7)
+            out += [f"\tlw\ta5,{off}(s0)", f"\taddi\ta5,a5,{rng.randint(1, 9)}",
+                    f"\tsw\ta5,{off}(s0)"]
+            if f and rng.random() < 0.1:
+                out += [f"\tlw\ta0,{off}(s0)", f"\tcall\tfn{rng.randint(max(1, f - 3), f)}"]
+        out += ["\tlw\ta5,-20(s0)", "\taddi\ta5,a5,1", "\tsw\ta5,-20(s0)",
+                f".L{f}_cond:", "\tlw\ta4,-20(s0)", "\tli\ta5,9",
+                f"\tble\ta4,a5,.L{f}_body",
+                "\tlw\ta0,-20(s0)", "\tlw\tra,28(sp)", "\tlw\ts0,24(sp)",
+                "\taddi\tsp,sp,32", "\tjr\tra" if f else "\tret"]
+        f += 1
+    return out
+
+GENERATORS = {"deps": gen_deps, "branchy": gen_branchy, "rodata": gen_rodata, "o0": gen_o0}
+
+
+def generate(gen, n, seed=533):
+    return GENERATORS[gen](n, random.Random(f"{gen}:{n}:{seed}"))
+
+
+def parse_count(s):
+    """'1k' / '1M' / '2500' → int"""
+    s = s.strip()
+    mult = {"k": 1000, "K": 1000, "m": 1000000, "M": 1000000}.get(s[-1:], 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  子进程：加载一个变体，对一个源文件计时
+# ─────────────────────────────────────────────────────────────────────────────
+def _child(variant, src):
+    import importlib.util, resource, contextlib
+    spec = importlib.util.spec_from_file_location(f"_bench_{variant}", VARIANTS[variant])
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    kw = {}
+    if variant.startswith("netfpga"):
+        stem = os.path.splitext(src)[0]
+        kw = {"imem_path": stem + ".imem.hex", "dmem_path": stem + ".dmem.hex"}
+    base_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        t0 = time.perf_counter()
+        mod.assemble(src, **kw)
+        dt = time.perf_counter() - t0
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"s": dt, "base_kb": base_kb, "peak_kb": peak_kb}))
+
+
+def measure(variant, src, repeat=1, timeout=None):
+    """返回 {s, peak_kb, delta_kb}（repeat 次取最快）或 {error}"""
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "_child", variant, src],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                              timeout=timeout)
+        if proc.returncode != 0:
+            err = (proc.stderr.strip().splitlines() or ["?"])[-1]
+            return {"error": err}
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        if best is None or r["s"] < best["s"]:
+            best = r
+    return {"s": round(best["s"], 5), "peak_kb": best["peak_kb"],
+            "delta_kb": best["peak_kb"] - best["base_kb"]}
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  冷启动：全新解释器里的导入 + 首次调用（子进程只用内置模块计时，不导入本文件）
+# ─────────────────────────────────────────────────────────────────────────────
+_STARTUP = """
+import sys, os, time
+t0 = time.perf_counter()
+sys.path.insert(0, {dir!r})
+mod = __import__({mod!r})
+t1 = time.perf_counter()
+heavy = [m for m in ("argparse", "json") if m in sys.modules]
+sys.stdout = open(os.devnull, "w")
+mod.assemble({src!r}, **{kw!r})
+t2 = time.perf_counter()
+sys.__stdout__.write(f"{{(t1 - t0) * 1e3}} {{(t2 - t1) * 1e3}} {{','.join(heavy) or '-'}}\\n")
+"""
+
+def measure_startup(variant, src, repeat=10):
+    """返回 {import_ms, import_min_ms, first_ms, process_ms, heavy}（除 import_min_ms 外取中位数）或 {error}"""
+    path = VARIANTS[variant]
+    kw = {}
+    if variant.startswith("netfpga"):
+        stem = os.path.splitext(src)[0]
+        kw = {"imem_path": stem + ".imem.hex", "dmem_path": stem + ".dmem.hex"}
+    code = _STARTUP.format(dir=os.path.dirname(os.path.abspath(path)),
+                           mod=os.path.splitext(os.path.basename(path))[0], src=src, kw=kw)
+    rows = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, text=True)
+        dt = (time.perf_counter() - t0) * 1e3
+        if proc.returncode != 0:
+            return {"error": (proc.stderr.strip().splitlines() or ["?"])[-1]}
+        imp, first, heavy = proc.stdout.split()
+        rows.append((float(imp), float(first), dt, heavy))
+    med = lambda k: round(sorted(r[k] for r in rows)[len(rows) // 2], 3)
+    return {"import_ms": med(0), "import_min_ms": round(min(r[0] for r in rows), 3),
+            "first_ms": med(1), "process_ms": med(2), "heavy": rows[0][3]}
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  对比：找出变慢 / 变胖超过阈值的条目
+# ─────────────────────────────────────────────────────────────────────────────
+def compare(old, new, threshold):
+    key = lambda r: (r["gen"], r["lines"], r["variant"])
+    prev = {key(r): r for r in old["results"] if "s" in r}
+    regress = []
+    for r in new["results"]:
+        o = prev.get(key(r))
+        if not o or "s" not in r: continue
+        for metric, floor in (("s", 0.1), ("delta_kb", 1024)):
+            # 低于噪声下限（100 ms / 1 MiB）的小规模条目不参与比较
+            if o[metric] >= floor and r[metric] > o[metric] * (1 + threshold):
+                regress.append((key(r), metric, o[metric], r[metric]))
+    return regress
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_HERE,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["_child"]:
+        _child(argv[1], argv[2]); return 0
+
+    parser = argparse.ArgumentParser(description="RV32I 汇编器吞吐量基准")
+    parser.add_argument("--sizes",    default="1k,10k,100k", help="行数列表，如 1k,10k,100k,1M")
+    parser.add_argument("--gens",     default=",".join(GENERATORS), help="生成器列表")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="被测变体列表")
+    parser.add_argument("--seed",     type=int, default=533)
+    parser.add_argument("--repeat",   type=int, default=1, help="每项重复次数（取最快）")
+    parser.add_argument("--timeout",  type=float, default=None, help="单次测量超时（秒）")
+    parser.add_argument("--json",     default=None, metavar="PATH", help="结果 JSON 路径")
+    parser.add_argument("--compare",  default=None, metavar="OLD", help="与旧结果 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=0.10, help="回归阈值（默认 0.10）")
+    parser.add_argument("--startup",  action="store_true",
+                        help="只测冷启动：导入耗时 + 首次汇编延迟（200 行 o0 程序）")
+    parser.add_argument("--emit",     default=None, metavar="GEN",
+                        help="只把生成的源文件输出到 stdout（取 --sizes 第一个）")
+    args = parser.parse_args(argv)
+
+    sizes    = [parse_count(s) for s in args.sizes.split(",")]
+    gens     = args.gens.split(",")
+    variants = args.variants.split(",")
+    for g in gens + ([args.emit] if args.emit else []):
+        if g not in GENERATORS: parser.error(f"未知生成器: {g}")
+    for v in variants:
+        if v not in VARIANTS: parser.error(f"未知变体: {v}")
+
+    if args.emit:
+        sys.stdout.write("\n".join(generate(args.emit, sizes[0], args.seed)) + "\n")
+        return 0
+
+    if args.startup:
+        results = []
+        with tempfile.TemporaryDirectory(prefix="rv32i_bench_") as td:
+            lines = generate("o0", 200, args.seed)
+            for v in variants:
+                src = os.path.join(td, f"startup_{v}.s")
+                with open(src, "w") as f:
+                    f.write("\n".join(lines) + "\n")
+                r = measure_startup(v, src, args.repeat if args.repeat > 1 else 10)
+                r.update(variant=v, lines=len(lines))
+                if "error" in r:
+                    print(f"  {v:<12} ERROR {r['error']}", flush=True)
+                else:
+                    print(f"  {v:<12} import {r['import_ms']:7.2f} ms (min {r['import_min_ms']:6.2f})  first call {r['first_ms']:7.2f} ms"
+                          f"  process {r['process_ms']:7.1f} ms  preloaded: {r['heavy']}", flush=True)
+                results.append(r)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"rev": _git_rev(), "python": sys.version.split()[0],
+                           "startup": results}, f, indent=2)
+            print(f"[输出] {args.json}")
+        return 0
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="rv32i_bench_") as td:
+        for gen in gens:
+            for n in sizes:
+                lines = generate(gen, n, args.seed)
+                for v in variants:
+                    src = os.path.join(td, f"{gen}_{n}_{v}.s")
+                    with open(src, "w") as f:
+                        f.write("\n".join(lines) + "\n")
+                    try:
+                        r = measure(v, src, args.repeat, args.timeout)
+                    except subprocess.TimeoutExpired:
+                        r = {"error": "timeout"}
+                    r.update(gen=gen, lines=len(lines), variant=v)
+                    if "s" in r:
+                        r["lines_per_s"] = round(len(lines) / r["s"], 1) if r["s"] else 0.0
+                        print(f"  {gen:<8} {len(lines):>8} lines  {v:<12} "
+                              f"{r['s']:9.3f} s  {r['lines_per_s']:>10.0f} lines/s  "
+                              f"+{r['delta_kb'] / 1024:7.1f} MiB", flush=True)
+                    else:
+                        print(f"  {gen:<8} {len(lines):>8} lines  {v:<12} ERROR {r['error']}",
+                              flush=True)
+                    results.append(r)
+                    os.remove(src)
+
+    report = {"rev": _git_rev(), "python": sys.version.split()[0],
+              "seed": args.seed, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[输出] {args.json}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        regress = compare(old, report, args.threshold)
+        for (gen, n, v), metric, a, b in regress:
+            print(f"  REGRESS {gen} {n} {v}: {metric} {a} → {b}")
+        print(f"[BENCH] {len(regress)} regressions vs {args.compare} "
+              f"(rev {old.get('rev')}, threshold {args.threshold:.0%})")
+        return 1 if regress else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
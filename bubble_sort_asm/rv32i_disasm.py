@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+rv32i_disasm.py  —  表驱动 RV32I 反汇编器 + 镜像校验
+=============================================================
+解码表直接由 rv32i_asm_improved.INST 反向生成，与汇编器共用同一份指令定义：
+  _OPC_FMT[opcode]          → 格式 (R/I/IS/S/B/U/J/SYS)
+  _F3_TABLE[opcode][funct3] → 助记符，或 {funct7: 助记符}（R / IS）
+
+【支持的镜像格式】
+  .hex      — imem.hex / dmem.hex（顺序格式或 "addr word" 格式，与 run_hw.sh 规则一致）
+  .coe      — Xilinx COE（memory_initialization_vector）
+  .mif      — Xilinx MIF（每行 32 位二进制）
+  .vh       — rv32i_asm.py 生成的 load_icache task（dut.Imm.mem[N] = 32'hXXXX）
+  .bin      — 小端 32 位字流
+  .listing  — rv32i_asm.py 生成的 listing（Slot / Hex 两列）
+
+【命令行】
+  python rv32i_disasm.py  imem.hex                          # objdump 风格反汇编
+  python rv32i_disasm.py  Icache.coe  --verify sort.listing # 镜像 vs listing 逐 slot 比对
+  python rv32i_disasm.py  imem.hex  --pc 0x54               # 标注单个 byte PC
+  python rv32i_disasm.py  imem.hex  --vh-func disasm_rom.vh # 生成 Verilog 函数供 TB 打印 PC 反汇编
+
+【作为模块使用】
+  from rv32i_disasm import load_image, decode_image, annotate_pc
+  words = load_image("imem.hex")
+  print(annotate_pc(words, pc))     # 仿真器 / 板级加载器标注 PC
+"""
+
+import re, sys, os, struct, argparse
+from collections import namedtuple
+
+from rv32i_asm_improved import INST, ABI_NAME, NOP_WORD, HALT_WORD, BYTES_PER_SLOT
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  解码查找表（由 INST 反向生成，只构建一次）
+# ─────────────────────────────────────────────────────────────────────────────
+_OPC_FMT  = [None] * 128           # opcode → fmt
+_F3_TABLE = [None] * 128           # opcode → [8]，元素为 mn 或 {funct7: mn}
+
+for _mn, _info in INST.items():
+    _fmt, _opc = _info[0], _info[1]
+    _OPC_FMT[_opc] = "I" if _fmt == "IS" else _fmt   # IS 与 I 共用 opcode 0x13
+    if _fmt in ("U", "J"):
+        _F3_TABLE[_opc] = _mn      # 无 funct3，直接存助记符
+        continue
+    if _F3_TABLE[_opc] is None:
+        _F3_TABLE[_opc] = [None] * 8
+    _f3 = _info[2]
+    if _fmt in ("R", "IS"):
+        if _F3_TABLE[_opc][_f3] is None:
+            _F3_TABLE[_opc][_f3] = {}
+        _F3_TABLE[_opc][_f3][_info[3]] = _mn
+    elif _fmt == "SYS":
+        _F3_TABLE[_opc][0] = _F3_TABLE[_opc][0] or {}
+        _F3_TABLE[_opc][0][_f3] = _mn          # SYS 用 imm[11:0] 区分 ecall/ebreak
+    else:
+        _F3_TABLE[_opc][_f3] = _mn
+
+_LOADS = frozenset(mn for mn, i in INST.items() if i[0] == "I" and i[1] == 0x03)
+
+Decoded = namedtuple("Decoded", "mn fmt rd rs1 rs2 imm")
+
+
+def _sext(v, bits):
+    return v - (1 << bits) if v & (1 << (bits - 1)) else v
+
+def _rn(r):
+    return ABI_NAME.get(r, f"x{r}")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  单字解码
+# ─────────────────────────────────────────────────────────────────────────────
+def decode(word):
+    """
+    解码一个 32 位字，返回 Decoded(mn, fmt, rd, rs1, rs2, imm)。
+    无法识别的字返回 mn=None；imm 已符号扩展（B/J 为字节偏移）。
+    """
+    opc = word & 0x7F
+    fmt = _OPC_FMT[opc]
+    if fmt is None:
+        return Decoded(None, None, 0, 0, 0, word)
+
+    rd  = (word >> 7)  & 0x1F
+    f3  = (word >> 12) & 0x7
+    rs1 = (word >> 15) & 0x1F
+    rs2 = (word >> 20) & 0x1F
+    f7  = (word >> 25) & 0x7F
+    ent = _F3_TABLE[opc]
+
+    if fmt == "U":
+        return Decoded(ent, fmt, rd, 0, 0, word >> 12)
+    if fmt == "J":
+        imm = (((word >> 31) & 1) << 20) | (((word >> 12) & 0xFF) << 12) \
+            | (((word >> 20) & 1) << 11) | (((word >> 21) & 0x3FF) << 1)
+        return Decoded(ent, fmt, rd, 0, 0, _sext(imm, 21))
+
+    sub = ent[f3] if fmt != "SYS" else ent[0]
+    if sub is None:
+        return Decoded(None, None, 0, 0, 0, word)
+
+    if fmt == "R":
+        mn = sub.get(f7)
+        return Decoded(mn, fmt if mn else None, rd, rs1, rs2, 0)
+    if fmt == "I" and isinstance(sub, dict):        # slli/srli/srai 与 I 共用 opcode 0x13
+        mn = sub.get(f7)
+        return Decoded(mn, "IS" if mn else None, rd, rs1, 0, rs2)
+    if fmt == "I":
+        return Decoded(sub, fmt, rd, rs1, 0, _sext(word >> 20, 12))
+    if fmt == "S":
+        imm = (f7 << 5) | rd
+        return Decoded(sub, fmt, 0, rs1, rs2, _sext(imm, 12))
+    if fmt == "B":
+        imm = (((word >> 31) & 1) << 12) | (((word >> 7) & 1) << 11) \
+            | (((word >> 25) & 0x3F) << 5) | (((word >> 8) & 0xF) << 1)
+        return Decoded(sub, fmt, 0, rs1, rs2, _sext(imm, 13))
+    if fmt == "SYS":
+        mn = sub.get(word >> 20)
+        return Decoded(mn, fmt if mn else None, 0, 0, 0, word >> 20)
+    return Decoded(None, None, 0, 0, 0, word)
+
+
+def format_inst(d, byte_pc=0, word=None):
+    """Decoded → 汇编文本（与 rv32i_asm.py 输入语法一致；B/J 目标写成绝对 byte PC）"""
+    if word == NOP_WORD:  return "nop"
+    if word == HALT_WORD: return "halt"
+    mn = d.mn
+    if mn is None:
+        return f".word 0x{(word if word is not None else d.imm) & 0xFFFFFFFF:08X}"
+    f = d.fmt
+    if f == "R":   return f"{mn} {_rn(d.rd)},{_rn(d.rs1)},{_rn(d.rs2)}"
+    if f == "IS":  return f"{mn} {_rn(d.rd)},{_rn(d.rs1)},{d.imm}"
+    if f == "I":
+        if mn in _LOADS or mn == "jalr":
+            return f"{mn} {_rn(d.rd)},{d.imm}({_rn(d.rs1)})"
+        return f"{mn} {_rn(d.rd)},{_rn(d.rs1)},{d.imm}"
+    if f == "S":   return f"{mn} {_rn(d.rs2)},{d.imm}({_rn(d.rs1)})"
+    if f == "B":   return f"{mn} {_rn(d.rs1)},{_rn(d.rs2)},{byte_pc + d.imm}"
+    if f == "U":   return f"{mn} {_rn(d.rd)},{d.imm}"
+    if f == "J":   return f"{mn} {_rn(d.rd)},{byte_pc + d.imm}"
+    return mn
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  整镜像解码（重复字只解码一次；镜像中大量 NOP）
+# ─────────────────────────────────────────────────────────────────────────────
+def decode_image(words):
+    """返回与 words 等长的 Decoded 列表"""
+    memo = {}
+    out = []
+    for w in words:
+        d = memo.get(w)
+        if d is None:
+            d = memo[w] = decode(w)
+        out.append(d)
+    return out
+
+
+def disassemble(words):
+    """返回 [(slot, byte_pc, word, text)]"""
+    rows = []
+    for slot, (w, d) in enumerate(zip(words, decode_image(words))):
+        bpc = slot * BYTES_PER_SLOT
+        rows.append((slot, bpc, w, format_inst(d, bpc, w)))
+    return rows
+
+
+def annotate_pc(words, byte_pc, symbols=None):
+    """
+    单个 PC 的一行注释，例如 '0x054 [ 21] 0x40068693  addi a3,a3,1024  <main+72>'
+    symbols: {byte_pc: [label,...]}，可由 listing_symbols() 得到。
+    """
+    slot = (byte_pc & 0x7FF) // BYTES_PER_SLOT
+    w    = words[slot] if slot < len(words) else NOP_WORD
+    txt  = format_inst(decode(w), byte_pc, w)
+    sym  = ""
+    if symbols:
+        base = max((p for p in symbols if p <= byte_pc), default=None)
+        if base is not None:
+            off = byte_pc - base
+            sym = f"  <{symbols[base][0]}{'+' + str(off) if off else ''}>"
+    return f"0x{byte_pc:03X} [{slot:3d}] 0x{w:08X}  {txt}{sym}"
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  镜像读取
+# ─────────────────────────────────────────────────────────────────────────────
+def _norm_hex32(tok):
+    """与 run_hw.sh norm_hex32 相同：无 0x 前缀的数值按十六进制解释"""
+    tok = tok.replace("_", "").rstrip(",:").lower()
+    return int(tok if tok.startswith("0x") else "0x" + tok, 16)
+
+def _place(mem, slot, word):
+    if slot >= len(mem):
+        mem.extend([NOP_WORD] * (slot + 1 - len(mem)))
+    mem[slot] = word & 0xFFFFFFFF
+
+def _load_hex(text):
+    mem, addr = [], 0
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].split("//", 1)[0].strip()
+        if not line: continue
+        tok = line.split()
+        if len(tok) >= 2:
+            addr = _norm_hex32(tok[0])
+            word = _norm_hex32(tok[1])
+        else:
+            word = _norm_hex32(tok[0])
+        _place(mem, addr, word)
+        addr += 1
+    return mem
+
+def _load_coe(text):
+    m_rad = re.search(r'memory_initialization_radix\s*=\s*(\d+)', text, re.I)
+    radix = int(m_rad.group(1)) if m_rad else 16
+    m_vec = re.search(r'memory_initialization_vector\s*=([^;]*)', text, re.I | re.S)
+    if not m_vec:
+        raise ValueError("COE 文件缺少 memory_initialization_vector")
+    return [int(t, radix) & 0xFFFFFFFF
+            for t in re.split(r'[\s,]+', m_vec.group(1)) if t]
+
+def _load_mif(text):
+    return [int(t, 2) for t in text.split() if re.fullmatch(r'[01]{32}', t)]
+
+_VH_RE      = re.compile(r"Imm\.mem\[\s*(\d+)\s*\]\s*=\s*32'h([0-9A-Fa-f_]+)")
+_LISTING_RE = re.compile(r'^\s*(?:\d+\s+)?(\d+)\s+0x([0-9A-Fa-f]{8})\b')
+
+def _load_vh(text):
+    mem = []
+    for m in _VH_RE.finditer(text):
+        _place(mem, int(m.group(1)), int(m.group(2).replace("_", ""), 16))
+    return mem
+
+def _load_listing(text):
+    mem = []
+    for line in text.splitlines():
+        m = _LISTING_RE.match(line)
+        if m:
+            _place(mem, int(m.group(1)), int(m.group(2), 16))
+    return mem
+
+def load_image(path):
+    """按扩展名读取指令镜像，返回 word 列表（slot 0 起，空洞填 NOP）"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".bin":
+        with open(path, "rb") as f:
+            data = f.read()
+        data += b"\0" * (-len(data) % 4)
+        return list(struct.unpack(f"<{len(data)//4}I", data))
+    with open(path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    if ext == ".coe":     return _load_coe(text)
+    if ext == ".mif":     return _load_mif(text)
+    if ext == ".vh":      return _load_vh(text)
+    if ext == ".listing": return _load_listing(text)
+    return _load_hex(text)
+
+
+def listing_symbols(listing_path):
+    """从 listing 的 '<label>:' 行提取 {byte_pc: [label,...]}"""
+    syms, pending = {}, []
+    with open(listing_path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            m_l = re.match(r'^\s*<([^>]+)>:\s*$', line)
+            if m_l:
+                pending.append(m_l.group(1)); continue
+            m = _LISTING_RE.match(line)
+            if m and pending:
+                syms.setdefault(int(m.group(1)) * BYTES_PER_SLOT, []).extend(pending)
+                pending = []
+    return syms
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  镜像校验：image vs listing（或任意两个镜像）
+# ─────────────────────────────────────────────────────────────────────────────
+def verify(image, reference):
+    """
+    image / reference: word 列表。reference 之外的 slot 须为 NOP（Icache 默认填充）。
+    返回 mismatch 列表 [(slot, expected, got)]。
+    """
+    bad = []
+    n = max(len(image), len(reference))
+    for slot in range(n):
+        exp = reference[slot] if slot < len(reference) else NOP_WORD
+        got = image[slot]     if slot < len(image)     else NOP_WORD
+        if exp != got:
+            bad.append((slot, exp, got))
+    return bad
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Verilog 反汇编函数（供 testbench 按 PC 打印）
+# ─────────────────────────────────────────────────────────────────────────────
+def write_vh_func(words, path, name="disasm_at", width=40):
+    """
+    生成 function [8*width-1:0] <name>; input [10:0] pc; ...
+    TB 用法：$display("%0s", disasm_at(dut.pc_id));
+    """
+    with open(path, "w", encoding="utf-8") as vf:
+        vf.write(f"// Auto-generated by rv32i_disasm.py — {len(words)} slots\n")
+        vf.write(f"function [8*{width}-1:0] {name};\n")
+        vf.write("input [10:0] pc;\n")
+        vf.write("begin\n")
+        vf.write("    case (pc[10:2])\n")
+        for slot, bpc, w, txt in disassemble(words):
+            if w == NOP_WORD: continue
+            vf.write(f"    9'd{slot}: {name} = \"{txt[:width]}\";\n")
+        vf.write(f"    default: {name} = \"nop\";\n")
+        vf.write("    endcase\n")
+        vf.write("end\nendfunction\n")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RV32I 表驱动反汇编器 / 镜像校验")
+    parser.add_argument("image", help="指令镜像 (.hex/.coe/.mif/.vh/.bin/.listing)")
+    parser.add_argument("--verify", metavar="REF",
+                        help="参考镜像或 listing，逐 slot 比对")
+    parser.add_argument("--symbols", metavar="LISTING",
+                        help="从 listing 读取标签用于注释")
+    parser.add_argument("--pc", action="append", default=[],
+                        help="只标注指定 byte PC（可多次）")
+    parser.add_argument("--vh-func", metavar="OUT",
+                        help="生成 Verilog 反汇编函数文件")
+    parser.add_argument("--all", action="store_true",
+                        help="显示末尾 NOP 填充区（默认省略）")
+    args = parser.parse_args(argv)
+
+    words = load_image(args.image)
+    syms  = listing_symbols(args.symbols) if args.symbols else {}
+    if not syms and args.verify and args.verify.endswith(".listing"):
+        syms = listing_symbols(args.verify)
+
+    if args.vh_func:
+        write_vh_func(words, args.vh_func)
+        print(f"[输出] {args.vh_func}")
+        return 0
+
+    if args.pc:
+        for p in args.pc:
+            print(annotate_pc(words, int(p, 0), syms))
+        return 0
+
+    if args.verify:
+        ref = load_image(args.verify)
+        bad = verify(words, ref)
+        if not bad:
+            print(f"[OK] {args.image} == {args.verify}  ({len(ref)} slots)")
+            return 0
+        print(f"[FAIL] {len(bad)} slot 不一致: {args.image} vs {args.verify}")
+        for slot, exp, got in bad:
+            bpc = slot * BYTES_PER_SLOT
+            print(f"  [{slot:3d}] byte {bpc:4d}  expect 0x{exp:08X} {format_inst(decode(exp), bpc, exp):<28}"
+                  f"  got 0x{got:08X} {format_inst(decode(got), bpc, got)}")
+        return 1
+
+    last = len(words)
+    if not args.all:
+        while last > 0 and words[last - 1] == NOP_WORD:
+            last -= 1
+    print(f"{os.path.basename(args.image)}:  {len(words)} slots\n")
+    for slot, bpc, w, txt in disassemble(words[:last]):
+        for lbl in syms.get(bpc, []):
+            print(f"\n{bpc:08x} <{lbl}>:")
+        print(f"{bpc:8x}:\t{w:08x}\t{txt}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+rv32i_incr.py  —  按函数缓存的增量汇编（rv32i_asm_improved 的前端）
+=============================================================================
+多函数源文件里只改一个函数时，assemble() 会把所有行重新 regex 拆分、展开伪指令、
+做冒险分析并编码。这里把 text 段按函数（非 '.' 开头的标签）切块，逐块缓存：
+
+  expand 缓存 : key = hash(函数源码行)              → 展开后的指令 + 局部标签
+  analyze 缓存: key = hash(展开后的函数体 + 后继 2 条指令 + 版本)
+                → nops / haz + 每条指令的“模板字”和重定位记录
+
+  compute_nops 中 nops[i] 只取决于指令 i, i+1, i+2，因此函数体的分析结果
+  只依赖自身与“下一函数的前 2 条指令”：修改一个函数只会重新分析它本身
+  和它的前一个函数（若它的开头变了）。
+
+  链接：各块按顺序排布得到字节基址，模板字与重定位合成最终编码：
+    B / J      : PC 相对偏移（标签地址 - 指令 byte PC）
+    %hi / %lo  : 绝对地址（rodata 标签随 --rodata 变化也无需重新分析）
+
+  输出与 rv32i_asm_improved.assemble() 完全一致（listing / vh / 返回值）。
+
+【命令行】
+  python rv32i_incr.py  source.s  [--rodata 0x400] [--stack 0x300]
+  缓存默认保存在 <stem>.fncache（pickle），--no-cache-file 只用进程内缓存
+"""
+
+import re, os, sys, pickle, hashlib, argparse
+
+from rv32i_asm_improved import (
+    INST, BYTES_PER_SLOT, DEFAULT_RODATA_BASE, DEFAULT_STACK_TOP,
+    split_args, hi20, lo12, encode_one, compute_nops, layout,
+    preprocess, split_sections, startup_stub, expand_text,
+    make_image, image_result, print_summary, write_listing, write_vh,
+)
+
+CACHE_VERSION = 1
+
+_HILO_RE = re.compile(r'%(hi|lo)\(([^)]+)\)')
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  切块：startup 存根 + 每个全局标签开始一个新块
+# ─────────────────────────────────────────────────────────────────────────────
+def split_functions(text_raw):
+    """返回 [(name, items)]；name 为函数标签，第一个块为 '<startup>'"""
+    chunks = [("<startup>", [])]
+    for item in text_raw:
+        if item[0] == 'LABEL' and not item[1].startswith('.'):
+            chunks.append((item[1], []))
+        chunks[-1][1].append(item)
+    if not chunks[0][1]:
+        chunks.pop(0)
+    return chunks
+
+def _digest(*parts):
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(repr(p).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  模板字 + 重定位
+#    模板 = 把标签地址当作 0（B/J 偏移为 0）时的编码；链接时 OR 上立即数位
+# ─────────────────────────────────────────────────────────────────────────────
+def _reloc_of(emn, eargs):
+    info = INST.get(emn)
+    if info is None:
+        return None
+    fmt = info[0]
+    tok = split_args(eargs) if eargs else []
+    if fmt == "B" and len(tok) >= 3: return ("B", tok[2])
+    if fmt == "J" and len(tok) >= 2: return ("J", tok[1])
+    for t in tok:
+        m = _HILO_RE.match(t)
+        if m: return ("HI" if m.group(1) == "hi" else "LO", m.group(2).strip())
+    return None
+
+def _template(emn, eargs, reloc):
+    fake = {reloc[1]: 0} if reloc else {}
+    return encode_one(emn, eargs, 0, fake)
+
+def _b_bits(imm):
+    return (((imm>>12)&1)<<31)|(((imm>>5)&0x3F)<<25)|(((imm>>1)&0xF)<<8)|(((imm>>11)&1)<<7)
+
+def _j_bits(imm):
+    return (((imm>>20)&1)<<31)|(((imm>>1)&0x3FF)<<21)|(((imm>>11)&1)<<20)|(((imm>>12)&0xFF)<<12)
+
+def _patch(word, reloc, bpc, labels):
+    kind, lbl = reloc
+    if lbl not in labels:
+        raise ValueError(f"未定义标签: {lbl!r}  (at byte_pc={bpc})")
+    addr = labels[lbl]
+    if kind == "B":  return word | _b_bits(addr - bpc)
+    if kind == "J":  return word | _j_bits(addr - bpc)
+    if kind == "HI": return word | ((hi20(addr) & 0xFFFFF) << 12)
+    return word | ((lo12(addr) & 0xFFF) << 20)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  增量汇编器
+# ─────────────────────────────────────────────────────────────────────────────
+class IncrementalAssembler:
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.expand_cache  = {}
+        self.analyze_cache = {}
+        self.stats = {}
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, "rb") as f:
+                    data = pickle.load(f)
+                if data.get("version") == CACHE_VERSION:
+                    self.expand_cache  = data["expand"]
+                    self.analyze_cache = data["analyze"]
+            except Exception:
+                pass    # 缓存损坏时当作冷启动
+
+    def save(self):
+        if not self.cache_path:
+            return
+        # 只保留最近一次用到的条目，避免缓存文件无限增长
+        used_e, used_a = self.stats.get("_used", (set(), set()))
+        data = {"version":  CACHE_VERSION,
+                "expand":  {k: v for k, v in self.expand_cache.items()  if k in used_e},
+                "analyze": {k: v for k, v in self.analyze_cache.items() if k in used_a}}
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.cache_path)
+
+    # ── 单块：展开 ───────────────────────────────────────────────────────────
+    def _expand(self, items, used):
+        key = _digest(CACHE_VERSION, items)
+        used.add(key)
+        ent = self.expand_cache.get(key)
+        if ent is None:
+            ent = self.expand_cache[key] = expand_text(items)
+            self.stats["expand_miss"] += 1
+        else:
+            self.stats["expand_hit"] += 1
+        return ent
+
+    # ── 单块：冒险分析 + 模板编码 ────────────────────────────────────────────
+    def _analyze(self, name, insts, next2, used):
+        key = _digest(CACHE_VERSION, insts, next2)
+        used.add(key)
+        ent = self.analyze_cache.get(key)
+        if ent is not None:
+            self.stats["reused"].append(name)
+            return ent
+        self.stats["reanalyzed"].append(name)
+        if insts:
+            nops, haz = compute_nops(list(insts) + list(next2))
+            nops, haz = nops[:len(insts)], haz[:len(insts)]
+        else:
+            nops, haz = [], []
+        relocs, words = [], []
+        for emn, eargs, orig_mn, orig_args in insts:
+            r = _reloc_of(emn, eargs)
+            try:
+                words.append(_template(emn, eargs, r))
+            except Exception as e:
+                raise RuntimeError(
+                    f"\n[编码错误] <{name}>  {orig_mn} {orig_args}\n"
+                    f"  展开为: {emn} {eargs}\n  {e}"
+                )
+            relocs.append(r)
+        ent = self.analyze_cache[key] = (nops, haz, words, relocs)
+        return ent
+
+    # ── 整个源文件 ──────────────────────────────────────────────────────────
+    def assemble_lines(self, raw, src_name="<memory>",
+                       rodata_base=DEFAULT_RODATA_BASE, stack_top=DEFAULT_STACK_TOP):
+        """与 rv32i_asm_improved.assemble_lines 相同的输入/输出"""
+        self.stats = {"expand_hit": 0, "expand_miss": 0,
+                      "reanalyzed": [], "reused": []}
+        used_e, used_a = set(), set()
+
+        lines = preprocess(raw)
+        text_raw, rodata_data, rodata_labels = split_sections(lines)
+        chunks = split_functions(startup_stub(stack_top) + text_raw)
+
+        expanded = [(name,) + self._expand(items, used_e) for name, items in chunks]
+
+        # 每块的后继 2 条指令（可能跨越多个小函数）
+        analyzed = []
+        for k, (name, insts, _) in enumerate(expanded):
+            nxt = []
+            for _, later, _ in expanded[k + 1:]:
+                nxt.extend(later[:2 - len(nxt)])
+                if len(nxt) == 2: break
+            analyzed.append(self._analyze(name, insts, tuple(nxt), used_a))
+        self.stats["_used"] = (used_e, used_a)
+
+        if not any(insts for _, insts, _ in expanded):
+            return None
+
+        # ── 排布：块基址 + 标签 ────────────────────────────────────────────
+        labels = {lbl: rodata_base + off for lbl, off in rodata_labels.items()}
+        bases, base = [], 0
+        for (name, insts, lbl_idx), (nops, _, _, _) in zip(expanded, analyzed):
+            byte_pcs, size = layout(nops)
+            bases.append((base, byte_pcs))
+            for lbl, idx in lbl_idx.items():
+                labels[lbl] = base + (byte_pcs[idx] if idx < len(insts) else size)
+            base += size
+
+        # ── 重定位 → encoded ──────────────────────────────────────────────
+        encoded = []
+        for (name, insts, _), (nops, haz, words, relocs), (cbase, byte_pcs) \
+                in zip(expanded, analyzed, bases):
+            for i, (emn, eargs, orig_mn, orig_args) in enumerate(insts):
+                bpc  = cbase + byte_pcs[i]
+                word = words[i]
+                if relocs[i]:
+                    try:
+                        word = _patch(word, relocs[i], bpc, labels)
+                    except Exception as e:
+                        raise RuntimeError(
+                            f"\n[编码错误] byte_pc={bpc}  {orig_mn} {orig_args}\n"
+                            f"  展开为: {emn} {eargs}\n  {e}"
+                        )
+                encoded.append((bpc, bpc // BYTES_PER_SLOT, word, orig_mn, orig_args,
+                                emn, eargs, nops[i], haz[i]))
+
+        return make_image(src_name, encoded, labels, rodata_data, rodata_base, stack_top)
+
+    def assemble(self, src_path, rodata_base=DEFAULT_RODATA_BASE, stack_top=DEFAULT_STACK_TOP):
+        """与 rv32i_asm_improved.assemble() 相同的输出文件与返回值"""
+        stem = os.path.splitext(src_path)[0]
+        with open(src_path, encoding="utf-8", errors="replace") as f:
+            raw = f.readlines()
+
+        img = self.assemble_lines(raw, os.path.basename(src_path),
+                                  rodata_base=rodata_base, stack_top=stack_top)
+        self.save()
+        if img is None:
+            print("[WARN] 没有找到任何指令"); return {}
+
+        print_summary(img)
+        st = self.stats
+        print(f"[INCR] {len(st['reanalyzed']) + len(st['reused'])} functions: "
+              f"{len(st['reanalyzed'])} re-analyzed {st['reanalyzed']}, "
+              f"{len(st['reused'])} relocated from cache")
+        write_listing(img, stem + ".listing")
+        write_vh(img, stem + ".vh")
+        print(f"[输出] {stem}.listing")
+        print(f"[输出] {stem}.vh")
+        return image_result(img)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="RV32I incremental assembler (per-function cache)")
+    parser.add_argument("src",      help="汇编源文件 (.asm / .s)")
+    parser.add_argument("--rodata", default=None,
+                        help=f"rodata 字节基址（默认 0x{DEFAULT_RODATA_BASE:X}）")
+    parser.add_argument("--stack",  default=None,
+                        help=f"sp 初始值（默认 0x{DEFAULT_STACK_TOP:X}）")
+    parser.add_argument("--no-cache-file", action="store_true",
+                        help="不读写 <stem>.fncache")
+    args = parser.parse_args()
+
+    rodata_base = int(args.rodata, 16) if args.rodata else DEFAULT_RODATA_BASE
+    stack_top   = int(args.stack,  16) if args.stack  else DEFAULT_STACK_TOP
+    cache_path  = None if args.no_cache_file else os.path.splitext(args.src)[0] + ".fncache"
+
+    IncrementalAssembler(cache_path).assemble(args.src, rodata_base=rodata_base,
+                                              stack_top=stack_top)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+rv32i_isa.py  —  共享指令表：寄存器 / 指令格式 / slot 常量 / 预编译正则 / 基础解析函数
+=============================================================================
+各汇编器变体原本在导入时各自构建 REGS / ABI_NAME / INST，并在热循环里调用
+re.match / re.split / re.sub（字符串模式每次都要查一次 re 的内部缓存）。这里集中一份：
+
+  · 表只构建一次；寄存器名、ABI 名、助记符全部 sys.intern，
+    与 iter_expand 里 intern 过的助记符比较 / 查表时走指针相等的快路径
+  · 逐行都要用的模式在导入时编译为模块级常量（*_RE）；只在 %hi / %lo 操作数上用到的
+    HI_RE / LO_RE 首次访问时才编译（模块 __getattr__），导入开销只付给热路径
+  · 本模块只依赖 re / sys，不导入 argparse / json；CLI 与 writer 的依赖由调用者按需导入
+
+  rv32i_asm_improved / rv32i_asm 从这里导入并原样 re-export，
+  其它脚本继续写 from rv32i_asm_improved import INST, ABI_NAME … 即可。
+
+【命令行】
+  python rv32i_bench.py --startup            # 导入耗时 + 首次汇编延迟（各变体，独立子进程）
+"""
+
+import re, sys
+
+_i = sys.intern
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  寄存器映射
+# ─────────────────────────────────────────────────────────────────────────────
+REGS = {_i(f"x{i}"): i for i in range(32)}
+REGS.update({_i(k): v for k, v in {
+    "zero":0, "ra":1,  "sp":2,  "gp":3,  "tp":4,
+    "t0":5,   "t1":6,  "t2":7,
+    "s0":8,   "fp":8,  "s1":9,
+    "a0":10,  "a1":11, "a2":12, "a3":13, "a4":14, "a5":15, "a6":16, "a7":17,
+    "s2":18,  "s3":19, "s4":20, "s5":21, "s6":22, "s7":23,
+    "s8":24,  "s9":25, "s10":26,"s11":27,
+    "t3":28,  "t4":29, "t5":30, "t6":31,
+}.items()})
+
+ABI_NAME = {k: _i(v) for k, v in {
+    0:"zero",1:"ra",2:"sp",3:"gp",4:"tp",
+    5:"t0",6:"t1",7:"t2",8:"s0",9:"s1",
+    10:"a0",11:"a1",12:"a2",13:"a3",14:"a4",15:"a5",16:"a6",17:"a7",
+    18:"s2",19:"s3",20:"s4",21:"s5",22:"s6",23:"s7",
+    24:"s8",25:"s9",26:"s10",27:"s11",
+    28:"t3",29:"t4",30:"t5",31:"t6",
+}.items()}
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  Icache slot 与特殊指令字
+# ─────────────────────────────────────────────────────────────────────────────
+BYTES_PER_SLOT = 4
+NOP_WORD       = 0x00000013   # addi x0,x0,0
+HALT_WORD      = 0x00000063   # beq x0,x0,0
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  指令表  (fmt, opcode, funct3 [, funct7])
+# ─────────────────────────────────────────────────────────────────────────────
+INST = {_i(k): v for k, v in {
+    "add":  ("R",0x33,0,0x00), "sub":  ("R",0x33,0,0x20),
+    "sll":  ("R",0x33,1,0x00), "slt":  ("R",0x33,2,0x00),
+    "sltu": ("R",0x33,3,0x00), "xor":  ("R",0x33,4,0x00),
+    "srl":  ("R",0x33,5,0x00), "sra":  ("R",0x33,5,0x20),
+    "or":   ("R",0x33,6,0x00), "and":  ("R",0x33,7,0x00),
+    "addi": ("I",0x13,0), "slti": ("I",0x13,2), "sltiu":("I",0x13,3),
+    "xori": ("I",0x13,4), "ori":  ("I",0x13,6), "andi": ("I",0x13,7),
+    "slli": ("IS",0x13,1,0x00),"srli": ("IS",0x13,5,0x00),"srai": ("IS",0x13,5,0x20),
+    "lb":("I",0x03,0),"lh":("I",0x03,1),"lw":("I",0x03,2),
+    "lbu":("I",0x03,4),"lhu":("I",0x03,5),
+    "sb":("S",0x23,0),"sh":("S",0x23,1),"sw":("S",0x23,2),
+    "beq":("B",0x63,0),"bne":("B",0x63,1),
+    "blt":("B",0x63,4),"bge":("B",0x63,5),
+    "bltu":("B",0x63,6),"bgeu":("B",0x63,7),
+    "lui":("U",0x37),"auipc":("U",0x17),
+    "jal":("J",0x6F),
+    "jalr":("I",0x67,0),
+    "ecall":("SYS",0x73,0),"ebreak":("SYS",0x73,1),
+}.items()}
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  预编译正则
+# ─────────────────────────────────────────────────────────────────────────────
+COMMENT_RE  = re.compile(r'(?<!\S)#|//|@')               # 行内注释起点
+SKIP_RE     = re.compile(r'^\.(file|option|attribute|globl|type|size|ident)')
+ALIGN_RE    = re.compile(r'\.(align|p2align|balign)\s')
+LABEL_RE    = re.compile(r'^([\w.]+)\s*:')               # 'name:' 或 'name: inst'
+MNEMONIC_RE = re.compile(r'([\w.]+)(.*)')                # 助记符 + 其余参数
+GLOBL_RE    = re.compile(r'\s*\.globl\s+([\w.$]+)')
+MEMARG_RE   = re.compile(r'(-?[\w.]+)\((\w+)\)')         # imm(rs) → imm,rs
+ARGSEP_RE   = re.compile(r'[\s,]+')
+_LAZY_RE = {                                             # 首次访问时编译
+    "HI_RE": r'%hi\(([^)]+)\)',
+    "LO_RE": r'%lo\(([^)]+)\)',
+}
+
+def _lazy_re(name):
+    pat = globals().get(name)
+    if pat is None:
+        pat = globals()[name] = re.compile(_LAZY_RE[name])
+    return pat
+
+def __getattr__(name):
+    if name in _LAZY_RE:
+        return _lazy_re(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  工具函数
+# ─────────────────────────────────────────────────────────────────────────────
+def R(name):
+    name = name.strip()
+    if name not in REGS:
+        raise ValueError(f"未知寄存器: {name!r}")
+    return REGS[name]
+
+def parse_int(s):
+    s = s.strip()
+    neg = s.startswith('-')
+    if neg: s = s[1:]
+    base = 16 if s.lower().startswith('0x') else 10
+    return (-1 if neg else 1) * int(s, base)
+
+def hi20(addr): return ((addr + 0x800) >> 12) & 0xFFFFF
+def lo12(addr):
+    v = addr & 0xFFF
+    return v - 0x1000 if v >= 0x800 else v
+
+def split_args(s):
+    """把 'rd, rs1, imm' 或 'rd, imm(rs1)' 标准化拆开"""
+    s = MEMARG_RE.sub(r'\1,\2', s)
+    return [p for p in ARGSEP_RE.split(s.strip()) if p]
+
+def resolve_hi_lo(arg, labels):
+    arg = arg.strip()
+    if not arg.startswith('%'):
+        return parse_int(arg)
+    m_hi = _lazy_re("HI_RE").match(arg)
+    m_lo = _lazy_re("LO_RE").match(arg)
+    if m_hi:
+        lbl = m_hi.group(1).strip()
+        if lbl not in labels: raise ValueError(f"未定义标签: {lbl!r} (用于 %hi)")
+        return hi20(labels[lbl])
+    if m_lo:
+        lbl = m_lo.group(1).strip()
+        if lbl not in labels: raise ValueError(f"未定义标签: {lbl!r} (用于 %lo)")
+        return lo12(labels[lbl])
+    return parse_int(arg)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+rv32i_lint.py  —  指令镜像 RAW 冒险检查（hex / coe / mif / vh / bin / listing）
+=============================================================================
+与 rv32i_asm_improved.compute_nops 使用同一流水线模型：
+  5 级、无前递、ID 读寄存器、WB 写回（写穿透），branch/jump 在 ID 解析。
+  生产者 p 与消费者 c 的 ID 周期间距必须 ≥ 3。
+
+不同之处：compute_nops 只看线性顺序；这里先反汇编镜像并建立 CFG，
+沿所有路径计算真实的周期间距：
+  顺序执行 / 分支不跳转 : +1 周期
+  分支跳转 / jal        : +2 周期（ID 中解析，已取的下一条被 wist 冲刷）
+  HALT (beq x0,x0,0)    : 终止
+  jalr                  : 目标未知，路径终止（报告 NOTE）
+
+【报告】
+  UNDER — 间距 < 3 的 producer→consumer 对（沿某条路径会读到旧值）
+  OVER  — 可以删除而不产生新冒险的 NOP slot（贪心，逐个删除并复核所有约束）
+
+【命令行】
+  python rv32i_lint.py  imem.hex
+  python rv32i_lint.py  sort_rv32i_gen.vh  --json
+  退出码：存在 UNDER 时为 1（可作为 run_hw.sh 上板前的门禁）
+"""
+
+import sys, os, json, time, argparse
+
+from rv32i_asm_improved import ABI_NAME, NOP_WORD, HALT_WORD, BYTES_PER_SLOT
+from rv32i_disasm import load_image, decode_image, format_inst
+
+MIN_GAP = 3     # 与 compute_nops 相同：slot 间距 ≥ 3
+
+_JALR_OPC = 0x67
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  每个 slot 的读写寄存器 + 后继（CFG）
+# ─────────────────────────────────────────────────────────────────────────────
+def _defs_uses(d):
+    """Decoded → (dest 或 None, sources 集合)；与 get_dest/get_sources 规则一致"""
+    f = d.fmt
+    if f is None:
+        return None, ()
+    dest = d.rd if f in ("R", "I", "IS", "U", "J") and d.rd else None
+    if f == "R":            uses = (d.rs1, d.rs2)
+    elif f in ("I", "IS"):  uses = (d.rs1,)
+    elif f in ("S", "B"):   uses = (d.rs1, d.rs2)
+    else:                   uses = ()
+    return dest, frozenset(r for r in uses if r)
+
+
+def build_cfg(words):
+    """
+    返回 (dests, uses, succs, notes)
+      succs[s] = [(next_slot, cycles)]，cycles 为 ID 周期增量（顺序 1，跳转 2）
+    NOP slot 视为无读写的普通指令。
+    """
+    n = len(words)
+    decoded = decode_image(words)
+    dests, uses, succs, notes = [None] * n, [()] * n, [None] * n, []
+    for s, (w, d) in enumerate(zip(words, decoded)):
+        if w == NOP_WORD:
+            succs[s] = [(s + 1, 1)] if s + 1 < n else []
+            continue
+        dests[s], uses[s] = _defs_uses(d)
+        if w == HALT_WORD:
+            succs[s] = []
+        elif d.fmt == "B":
+            tgt = s + d.imm // BYTES_PER_SLOT
+            succs[s] = [(s + 1, 1)] if s + 1 < n else []
+            if 0 <= tgt < n:
+                succs[s].append((tgt, 2))
+        elif d.fmt == "J":
+            tgt = s + d.imm // BYTES_PER_SLOT
+            succs[s] = [(tgt, 2)] if 0 <= tgt < n else []
+        elif d.fmt == "I" and (w & 0x7F) == _JALR_OPC:
+            succs[s] = []
+            notes.append((s, "jalr 目标未知，路径在此终止"))
+        else:
+            succs[s] = [(s + 1, 1)] if s + 1 < n else []
+    return dests, uses, succs, notes
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  约束枚举
+#    只需覆盖 p 之后"真实指令步数 ≤ 2"的路径：第三条真实指令距离必然 ≥ 3。
+#    每条路径记为 (p, c, reg, fixed, nops)：
+#      fixed = 真实指令 + 跳转惩罚贡献的周期；nops = 途经的 NOP slot
+#      路径间距 = fixed + len(nops)
+# ─────────────────────────────────────────────────────────────────────────────
+def _constraints(words, dests, uses, succs):
+    out = []
+    for p, rd in enumerate(dests):
+        if rd is None: continue
+        stack = [(nx, cyc, (), 0) for nx, cyc in succs[p]]   # (slot, gap, nops, real)
+        while stack:
+            s, gap, nops, real = stack.pop()
+            if words[s] == NOP_WORD:
+                nops = nops + (s,)
+            else:
+                real += 1
+                if rd in uses[s]:
+                    out.append((p, s, rd, gap - len(nops), nops))
+                if dests[s] == rd or real >= 2:
+                    continue
+            for nx, cyc in succs[s]:
+                stack.append((nx, gap + cyc, nops, real))
+    return out
+
+
+def lint(words):
+    """
+    返回 dict：
+      under     : [(p, c, reg, gap)]
+      removable : [slot]
+      notes     : [(slot, msg)]
+    """
+    last_real = max((s for s, w in enumerate(words) if w != NOP_WORD), default=-1)
+    words = words[:last_real + 1]
+    dests, uses, succs, notes = build_cfg(words)
+    cons = _constraints(words, dests, uses, succs)
+
+    under = sorted({(p, c, r, fixed + len(nops))
+                    for p, c, r, fixed, nops in cons if fixed + len(nops) < MIN_GAP})
+
+    # 贪心删除 NOP：每删一个都要求所有经过它的约束仍满足
+    by_slot = {}
+    for k, (_, _, _, fixed, nops) in enumerate(cons):
+        for s in nops:
+            by_slot.setdefault(s, []).append(k)
+    kept = [len(c[4]) for c in cons]
+    removable = []
+    for s, w in enumerate(words):
+        if w != NOP_WORD: continue
+        ks = by_slot.get(s, [])
+        if all(cons[k][3] + kept[k] - 1 >= MIN_GAP for k in ks):
+            removable.append(s)
+            for k in ks:
+                kept[k] -= 1
+
+    return {"slots": len(words),
+            "insts": sum(1 for w in words if w != NOP_WORD),
+            "nops":  sum(1 for w in words if w == NOP_WORD),
+            "under": under, "removable": removable, "notes": notes}
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RV32I 镜像 RAW 冒险检查")
+    parser.add_argument("image", help="指令镜像 (.hex/.coe/.mif/.vh/.bin/.listing)")
+    parser.add_argument("--json", action="store_true", help="输出 JSON")
+    parser.add_argument("--quiet", action="store_true", help="只输出汇总")
+    args = parser.parse_args(argv)
+
+    words = load_image(args.image)
+    t0 = time.perf_counter()
+    rep = lint(words)
+    ms = (time.perf_counter() - t0) * 1e3
+
+    if args.json:
+        rep["elapsed_ms"] = round(ms, 3)
+        json.dump(rep, sys.stdout, indent=2)
+        print()
+        return 1 if rep["under"] else 0
+
+    def asm(s):
+        return format_inst(decode_image([words[s]])[0], s * BYTES_PER_SLOT, words[s])
+
+    if not args.quiet:
+        for p, c, r, gap in rep["under"]:
+            print(f"  UNDER  [{p:3d}] {asm(p):<28} → [{c:3d}] {asm(c):<28}"
+                  f"  {ABI_NAME.get(r, f'x{r}')} gap {gap} < {MIN_GAP}")
+        for s in rep["removable"]:
+            prev = max((q for q in range(s) if words[q] != NOP_WORD), default=None)
+            ctx = f"after [{prev:3d}] {asm(prev)}" if prev is not None else ""
+            print(f"  OVER   [{s:3d}] NOP removable  {ctx}")
+        for s, msg in rep["notes"]:
+            print(f"  NOTE   [{s:3d}] {msg}")
+
+    print(f"[LINT] {os.path.basename(args.image)}: {rep['insts']} insts, "
+          f"{rep['slots']} slots ({rep['nops']} NOP)  "
+          f"under-padded={len(rep['under'])}  removable NOP={len(rep['removable'])}"
+          f"  ({ms:.2f} ms)")
+    return 1 if rep["under"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1735 @@
+#!/usr/bin/env python3
+"""
+rv32i_opt.py  —  NOP 插入之前的指令级优化（rv32i_asm_improved 的可选 pass）
+=============================================================================
+在 expand_text() 之后、compute_nops() 之前，对展开后的指令列表做变换。
+
+【线性 IR】
+  lin = [('LABEL', name) | (emn, eargs, orig_mn, orig_args), ...]
+  与 (instructions, labels_by_idx) 互转；pass 的输入输出都是 lin。
+  改写后的指令 orig_mn/orig_args 与 emn/eargs 相同（listing 中直接显示新指令）。
+
+【活跃性】
+  指令级后向数据流；分支 → 顺序 + 目标，j → 目标，
+  call(jal ra) / jalr / HALT 视为读取全部寄存器（保守：结束时所有寄存器都可观察）。
+
+【peephole】（规则驱动，每次改写都要求局部 slot 数不增加）
+  fwd   : 同一基本块内 sw/lw 之后再 lw 同一栈槽 → mv（或相同寄存器时直接删除）
+  mv    : op rT,... ; mv rD,rT  且 rT 之后不再活跃 → op rD,...
+  self  : mv x,x → 删除
+  imm   : li rT,imm ; add/sub/and/or/xor/slt/sltu/sll/srl/sra 使用 rT 且 rT 死亡
+          → addi/andi/ori/xori/slti/sltiu/slli/srli/srai
+  ofs   : addi rT,rB,c ; add rX,rT,rY ; lw/sw ..,off(rX)  （-O0 数组下标）
+          → add rX,rB,rY ; lw/sw ..,off+c(rX)   （rT、rX 之后不再活跃）
+  cp    : mv rD,rS 之后同一块内读 rD 改为读 rS
+  dead  : 结果不再活跃的 ALU / 取数指令删除
+
+【promote】（-O0 叶函数：栈槽 → 寄存器，随后跑一遍 peephole 清理）
+  不含 call、s0 由 addi s0,sp,K 建立、帧地址不逃逸的函数里，既读又写的标量栈槽
+  分配到函数内未使用的 t0-t6 / a7-a1（回边区间内的访问按 ×8 加权排序）：
+    sw rS,o(s0) → mv P,rS        lw rD,o(s0) → mv rD,P
+  被改写的访存与占用的寄存器记入 report，compare() 忽略这些栈槽与寄存器的最终值。
+
+【unroll】（计数内层循环展开 N 份 + 余数循环，--unroll N 或 pass 名 unroll=N）
+  归纳变量需在寄存器中（通常在 promote 之后）；副本改读 iv+c·s 后只保留一次 addi iv，
+  展开块做局部列表调度；展开后总 slot 数超过 Icache 512 word 时撤销。
+  只在迭代数可静态求出（初值与界都是 li）且估计周期减少时展开，否则保留原循环。
+
+【modulo】（单基本块计数循环的软件流水，modulo=S 为最多 stage 数，默认 2）
+  迭代 k+1 的前段（如 lw）与迭代 k 的后段（比较 / 选择）在同一 kernel 内交错，
+  生成 guard + 序言 + kernel + 尾声，迭代数不足时落回原循环；
+  报告每个循环的 II（kernel slot + 回边冲刷）、只做列表调度的 II 与原始 NOP 填充的 II。
+
+【layout】（layout=PATH：按 rv32i_sim.py --profile-out 的边计数重排函数内基本块）
+  热边顺序落入（必要时反转分支条件、删去多余 jal / 补 jal），入口块与 call 返回点不动；
+  按“块执行次数 × 块 slot（含 NOP）+ 冲刷”估计，变差的函数保持原样。
+  profile 带指令序列指纹，需与 layout 之前的 pass 使用相同的 --opt 生成。
+
+【dce】（不可达代码 / 函数删除）
+  从入口与 .globl 符号出发沿 CFG + 调用图求可达性，删除 ret(_HALT) 之后的死代码
+  与从未调用的函数；逐段列出删除位置（标签+偏移）与节省的 slot。
+
+【inline】（无栈帧叶函数在 call 处展开，inline=N 为代码增长预算，默认 64 slot）
+  平凡栈帧（只保存 s0/ra）先剥掉；调用者不再含 call 时删掉 ra 的保存恢复。
+  典型组合：promote,inline,promote（展开后调用者变成叶函数，可再提升一次）
+
+【addr】（地址 / 大常数生成：布局前求值 rodata 的 %hi/%lo）
+  12 位放得下 → addi rd,x0,V；否则复用相近的已知基址；访存基址已知 → off(x0)；
+  循环内仍需 lui+addi 的常量提到循环入口前。
+
+【rewrites】（应用 rv32i_superopt.py 的改写库，rewrites=all 时包括仅经测试验证的条目）
+  纯 ALU 窗口按寄存器占位匹配，被改写的临时寄存器须已死亡且局部 slot 数减少。
+
+【命令行】
+  python rv32i_opt.py  risc/sort_rv32i.s  --passes peephole
+  python rv32i_opt.py  risc/*.s           --passes promote
+  python rv32i_opt.py  risc/*.s           --passes promote --unroll 2
+  python rv32i_opt.py  risc/*.s           --passes promote,rewrites
+  python rv32i_opt.py  risc/*.s           --passes promote,modulo
+  python rv32i_opt.py  risc/*.s           --passes promote --profile-layout   # 逐文件 layout 收益
+  python rv32i_opt.py  risc/sort_rv32i.s  --passes peephole --write   # 写优化后的 listing/vh
+  对比优化前后的指令数 / slot / NOP，并用 rv32i_sim 跑两份镜像比较最终状态与动态周期。
+"""
+
+import os, sys, argparse
+
+from rv32i_asm_improved import (
+    REGS, ABI_NAME, INST, DEFAULT_RODATA_BASE, DEFAULT_STACK_TOP,
+    split_args, parse_int, get_dest, get_sources, compute_nops,
+    assemble_lines, image_words, write_listing, write_vh,
+)
+
+ALL_REGS = frozenset(range(1, 32))
+_LOADS   = ("lw", "lh", "lb", "lhu", "lbu")
+_STORES  = ("sw", "sh", "sb")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  线性 IR
+# ─────────────────────────────────────────────────────────────────────────────
+def to_linear(instructions, labels_by_idx):
+    at = {}
+    for lbl, idx in labels_by_idx.items():
+        at.setdefault(idx, []).append(lbl)
+    lin = []
+    for i, ins in enumerate(instructions):
+        lin.extend(('LABEL', l) for l in at.get(i, ()))
+        lin.append(ins)
+    for idx in sorted(k for k in at if k >= len(instructions)):
+        lin.extend(('LABEL', l) for l in at[idx])
+    return lin
+
+def from_linear(lin):
+    instructions, labels_by_idx = [], {}
+    for it in lin:
+        if it[0] == 'LABEL':
+            labels_by_idx[it[1]] = len(instructions)
+        else:
+            instructions.append(it)
+    return instructions, labels_by_idx
+
+def is_label(it):
+    return it[0] == 'LABEL'
+
+def mk(emn, eargs):
+    """新指令（orig 字段与展开后相同）"""
+    return (emn, eargs, emn, eargs)
+
+def reg_name(r):
+    return ABI_NAME.get(r, f"x{r}")
+
+def fmt_of(it):
+    return INST.get(it[0], ("?",))[0] if it[0] != '_HALT' else "HALT"
+
+def is_call(it):
+    return it[0] == "jal" and get_dest(it[0], it[1]) is not None
+
+def is_ctrl(it):
+    """改变控制流的指令（块结尾）"""
+    return it[0] in ("_HALT", "jal", "jalr") or fmt_of(it) == "B"
+
+def branch_target(it):
+    """B / jal 的目标标签；其它返回 None"""
+    tok = split_args(it[1]) if it[1] else []
+    f = fmt_of(it)
+    if f == "B" and len(tok) >= 3: return tok[2]
+    if f == "J" and len(tok) >= 2: return tok[1]
+    return None
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  活跃性（指令级，返回 live_out[k]，k 为 lin 下标；标签项为 None）
+# ─────────────────────────────────────────────────────────────────────────────
+def successors(lin):
+    """succ[k] = [lin 下标]；标签项自身无后继（指向下一条指令即可）"""
+    n = len(lin)
+    label_pos = {it[1]: k for k, it in enumerate(lin) if is_label(it)}
+    nxt_inst = [None] * (n + 1)
+    nxt = None
+    for k in range(n - 1, -1, -1):
+        nxt_inst[k] = nxt
+        if not is_label(lin[k]):
+            nxt = k
+    first_after = lambda k: k if k is not None and not is_label(lin[k]) else (
+        nxt_inst[k] if k is not None else None)
+
+    succ = [[] for _ in range(n)]
+    for k, it in enumerate(lin):
+        if is_label(it): continue
+        mn = it[0]
+        ft = nxt_inst[k]
+        if mn in ("_HALT", "jalr"):
+            continue
+        tgt = branch_target(it)
+        tk = first_after(label_pos[tgt]) if tgt in label_pos else None
+        if fmt_of(it) == "B":
+            succ[k] = [s for s in (ft, tk) if s is not None]
+        elif mn == "jal":
+            succ[k] = [ft] if is_call(it) and ft is not None else ([tk] if tk is not None else [])
+        elif ft is not None:
+            succ[k] = [ft]
+    return succ
+
+def liveness(lin, exit_live=None):
+    """exit_live：出口处视为活跃的寄存器集合（默认全部）"""
+    n = len(lin)
+    succ = successors(lin)
+    use = [0] * n; dfn = [0] * n; exit_ = [False] * n
+    for k, it in enumerate(lin):
+        if is_label(it): continue
+        if it[0] in ("_HALT", "jalr") or is_call(it):
+            exit_[k] = True
+        for r in get_sources(it[0], it[1]):
+            use[k] |= 1 << r
+        d = get_dest(it[0], it[1])
+        if d: dfn[k] = 1 << d
+    ALL = sum(1 << r for r in (ALL_REGS if exit_live is None else exit_live))
+    live_in = [0] * n; live_out = [0] * n
+    changed = True
+    while changed:
+        changed = False
+        for k in range(n - 1, -1, -1):
+            if is_label(lin[k]): continue
+            out = ALL if exit_[k] else 0
+            for s in succ[k]:
+                out |= live_in[s]
+            inn = use[k] | (out & ~dfn[k])
+            if out != live_out[k] or inn != live_in[k]:
+                live_out[k], live_in[k] = out, inn
+                changed = True
+    return live_out
+
+def slot_count(insts):
+    nops, _ = compute_nops(list(insts)) if insts else ([], [])
+    return len(insts) + sum(nops)
+
+def _window_cost(lin, lo, hi, repl=None):
+    """lin[lo:hi] 替换为 repl 后，连同前后各 2 条指令的局部 slot 数"""
+    before, k = [], lo - 1
+    while k >= 0 and len(before) < 2:
+        if not is_label(lin[k]): before.insert(0, lin[k])
+        k -= 1
+    after, k = [], hi
+    while k < len(lin) and len(after) < 2:
+        if not is_label(lin[k]): after.append(lin[k])
+        k += 1
+    mid = [it for it in (lin[lo:hi] if repl is None else repl) if not is_label(it)]
+    return slot_count(before + mid + after)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  peephole
+# ─────────────────────────────────────────────────────────────────────────────
+_IMM_FORM = {"add": "addi", "and": "andi", "or": "ori", "xor": "xori",
+             "slt": "slti", "sltu": "sltiu", "sub": "addi",
+             "sll": "slli", "srl": "srli", "sra": "srai"}
+_COMMUTE  = ("add", "and", "or", "xor")
+
+def _li_value(it):
+    """addi rT,x0,imm → (rT, imm)；否则 None"""
+    if it[0] != "addi": return None
+    tok = split_args(it[1])
+    if len(tok) == 3 and REGS.get(tok[1]) == 0:
+        try: return REGS.get(tok[0]), parse_int(tok[2])
+        except ValueError: return None
+    return None
+
+def _mv_of(it):
+    """addi rD,rS,0 → (rD, rS)；否则 None"""
+    if it[0] != "addi": return None
+    tok = split_args(it[1])
+    if len(tok) == 3 and tok[2].strip() in ("0", "0x0") and tok[0] in REGS and tok[1] in REGS:
+        return REGS[tok[0]], REGS[tok[1]]
+    return None
+
+def _with_dest(it, rd):
+    """把指令的 rd（第一个操作数）改为 rd"""
+    tok = split_args(it[1])
+    f = fmt_of(it)
+    if f in ("I",) and it[0] in _LOADS or it[0] == "jalr":
+        return mk(it[0], f"{reg_name(rd)},{tok[1]}({tok[2]})")
+    return mk(it[0], ",".join([reg_name(rd)] + tok[1:]))
+
+def _mem_ref(it):
+    """lw/sw → (value_reg, base_reg, offset)；其它 None"""
+    if it[0] not in ("lw", "sw"): return None
+    tok = split_args(it[1])
+    try:
+        return REGS[tok[0]], REGS[tok[2]], parse_int(tok[1])
+    except (KeyError, ValueError, IndexError):
+        return None
+
+def _rule_fwd(lin, st):
+    """栈槽值转发：基本块内跟踪 (base, off) → 当前持有该值的寄存器"""
+    avail = {}
+    changed = False
+    for k, it in enumerate(lin):
+        if is_label(it) or is_call(it):
+            avail.clear(); continue
+        ref = _mem_ref(it)
+        if it[0] == "lw" and ref:
+            rd, b, off = ref
+            src = avail.get((b, off))
+            if src is not None:
+                repl = [] if src == rd else [mk("addi", f"{reg_name(rd)},{reg_name(src)},0")]
+                if _window_cost(lin, k, k + 1, repl) <= _window_cost(lin, k, k + 1):
+                    lin[k] = repl[0] if repl else ('LABEL', None)     # 占位，稍后清除
+                    st["fwd"] += 1
+                    changed = True
+                    it = lin[k]
+                    if not repl:
+                        continue
+        d = get_dest(it[0], it[1]) if not is_label(it) else None
+        if d:
+            for key in [key for key, r in avail.items() if r == d or key[0] == d]:
+                del avail[key]
+        if it[0] in _STORES:
+            if ref:
+                rs, b, off = ref
+                for key in [key for key in avail
+                            if key[0] != b or abs(key[1] - off) < 4]:
+                    del avail[key]
+                avail[(b, off)] = rs
+            else:
+                avail.clear()
+        elif it[0] == "lw" and ref and lin[k][0] == "lw":
+            rd, b, off = ref
+            if rd != b:
+                avail[(b, off)] = rd
+    return changed
+
+def _rule_pairs(lin, st):
+    """相邻两条指令的 mv / imm / self 规则（需要活跃性）"""
+    live = liveness(lin)
+    changed = False
+    for k in range(len(lin)):
+        it = lin[k]
+        if is_label(it): continue
+        mv = _mv_of(it)
+        if mv and mv[0] == mv[1]:
+            lin[k] = ('LABEL', None); st["self"] += 1; changed = True
+            continue
+        # 找下一条指令（不跨标签）
+        j = k + 1
+        if j >= len(lin) or is_label(lin[j]): continue
+        nx = lin[j]
+        rT = get_dest(it[0], it[1])
+        if rT is None or it[0] in ("jal", "jalr") or live[j] >> rT & 1:
+            continue
+        # mv 折叠：op rT,... ; mv rD,rT
+        m2 = _mv_of(nx)
+        if m2 and m2[1] == rT and fmt_of(it) in ("R", "I", "IS", "U"):
+            repl = [_with_dest(it, m2[0])]
+            if _window_cost(lin, k, j + 1, repl) <= _window_cost(lin, k, j + 1):
+                lin[k], lin[j] = repl[0], ('LABEL', None)
+                st["mv"] += 1; changed = True
+                live = liveness(lin)
+            continue
+        # li + op → op-imm
+        li = _li_value(it)
+        if li and nx[0] in _IMM_FORM:
+            tok = split_args(nx[1])
+            if len(tok) != 3: continue
+            rd, ra, rb = (REGS.get(t) for t in tok)
+            imm = li[1]
+            if rb == rT and ra != rT:
+                other = tok[1]
+            elif ra == rT and rb != rT and nx[0] in _COMMUTE:
+                other = tok[2]
+            else:
+                continue
+            if nx[0] == "sub": imm = -imm
+            if nx[0] in ("sll", "srl", "sra"):
+                if not 0 <= imm < 32: continue
+            elif not -2048 <= imm < 2048:
+                continue
+            repl = [mk(_IMM_FORM[nx[0]], f"{tok[0]},{other},{imm}")]
+            if _window_cost(lin, k, j + 1, repl) <= _window_cost(lin, k, j + 1):
+                lin[k], lin[j] = ('LABEL', None), repl[0]
+                st["imm"] += 1; changed = True
+                live = liveness(lin)
+            continue
+        # 常量并入访存偏移：addi rT,rB,c ; add rX,rT,rY ; lw/sw ..,off(rX) → add rX,rB,rY ; ..,off+c(rX)
+        if it[0] == "addi" and nx[0] == "add" and j + 1 < len(lin) and not is_label(lin[j + 1]):
+            tok, t2 = split_args(it[1]), split_args(nx[1])
+            th = lin[j + 1]
+            ref = _mem_ref(th)
+            try: c = parse_int(tok[2])
+            except ValueError: continue
+            if not ref or REGS.get(tok[1], 0) == 0: continue
+            rX, ra, rb = (REGS.get(t) for t in t2)
+            if (ra == rT) == (rb == rT): continue
+            rY = t2[2] if ra == rT else t2[1]
+            val, base, off = ref
+            if base != rX or not -2048 <= off + c < 2048: continue
+            if th[0] == "sw" and (val == rX or live[j + 1] >> rX & 1): continue
+            if th[0] == "lw" and val != rX and live[j + 1] >> rX & 1: continue
+            repl = [mk("add", f"{t2[0]},{tok[1]},{rY}"),
+                    mk(th[0], f"{reg_name(val)},{off + c}({reg_name(rX)})")]
+            if _window_cost(lin, k, j + 2, repl) <= _window_cost(lin, k, j + 2):
+                lin[k], lin[j], lin[j + 1] = ('LABEL', None), repl[0], repl[1]
+                st["ofs"] += 1; changed = True
+                live = liveness(lin)
+    return changed
+
+def replace_src(it, old, new):
+    """把指令中作为源操作数的寄存器 old 换成 new（寄存器编号）；返回新指令"""
+    if is_label(it) or old not in get_sources(it[0], it[1]):
+        return it
+    tok = split_args(it[1])
+    f, nm = fmt_of(it), reg_name(new)
+    swap = lambda i: nm if REGS.get(tok[i]) == old else tok[i]
+    if f == "R":
+        return mk(it[0], f"{tok[0]},{swap(1)},{swap(2)}")
+    if f in ("I", "IS") and (it[0] in _LOADS or it[0] == "jalr"):
+        return mk(it[0], f"{tok[0]},{tok[1]}({swap(2)})")
+    if f in ("I", "IS"):
+        return mk(it[0], f"{tok[0]},{swap(1)},{tok[2]}")
+    if f == "S":
+        return mk(it[0], f"{swap(0)},{tok[1]}({swap(2)})")
+    if f == "B":
+        return mk(it[0], f"{swap(0)},{swap(1)},{tok[2]}")
+    return it
+
+def _block_of(lin, k):
+    """包含 lin[k] 的基本块 [lo, hi)（以标签与控制转移指令为界）"""
+    lo = k
+    while lo > 0 and not is_label(lin[lo - 1]) and not is_ctrl(lin[lo - 1]):
+        lo -= 1
+    hi = k
+    while hi < len(lin) and not is_label(lin[hi]):
+        hi += 1
+        if is_ctrl(lin[hi - 1]): break
+    return lo, hi
+
+_FRAME_REGS = (REGS["sp"], REGS["s0"])  # 帧指针的复制（尾声 mv sp,s0）保持原样
+
+def _rule_cp(lin, st):
+    """复制传播：mv rD,rS 之后同一块内对 rD 的读改为读 rS（直到任一方被重定义）"""
+    changed = False
+    for k in range(len(lin)):
+        mv = _mv_of(lin[k]) if not is_label(lin[k]) else None
+        if not mv or mv[0] == mv[1] or mv[0] in _FRAME_REGS: continue
+        rD, rS = mv
+        lo, hi = _block_of(lin, k)
+        new = list(lin[k + 1:hi])
+        hit = False
+        for j, it in enumerate(new):
+            r = replace_src(it, rD, rS)
+            if r is not it:
+                new[j], hit = r, True
+            d = get_dest(it[0], it[1])
+            if d in (rD, rS):
+                break
+        if not hit: continue
+        cand = lin[lo:k + 1] + new
+        if slot_count([it for it in cand if not is_label(it)]) <= \
+           slot_count([it for it in lin[lo:hi] if not is_label(it)]):
+            lin[k + 1:hi] = new
+            st["cp"] += 1; changed = True
+    return changed
+
+def _rule_dead(lin, st):
+    """删除结果不再活跃、且无副作用的指令（ALU / 取数 / lui）"""
+    live = liveness(lin)
+    changed = False
+    for k, it in enumerate(lin):
+        if is_label(it) or fmt_of(it) not in ("R", "I", "IS", "U") or it[0] in ("jalr",):
+            continue
+        d = get_dest(it[0], it[1])
+        if d is None:
+            continue            # 写 x0：源代码里显式的 nop 保留
+        if not live[k] >> d & 1:
+            lin[k] = ('LABEL', None)
+            st["dead"] += 1; changed = True
+    return changed
+
+def _compact(lin):
+    return [it for it in lin if it != ('LABEL', None)]
+
+def peephole(lin, report):
+    st = report.setdefault("peephole", {"fwd": 0, "mv": 0, "self": 0, "imm": 0, "ofs": 0,
+                                        "cp": 0, "dead": 0})
+    for _ in range(16):
+        changed = False
+        for rule in (_rule_fwd, _rule_pairs, _rule_cp, _rule_dead):
+            changed |= rule(lin, st)
+            lin[:] = _compact(lin)
+        if not changed:
+            break
+    return lin
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  promote：-O0 叶函数的栈槽 → 寄存器
+#    仅处理不含 call 的函数；s0 必须由 addi s0,sp,K 建立为帧指针。
+#    s0 / 派生指针（addi rX,s0,C）/ 下标指针（add rY,ptr,idx）只能用作访存基址，
+#    任何其它用法（传参、存入内存、跨标签存活）视为地址逃逸，整个函数放弃。
+#    标量槽 = 仅以 lw/sw o(s0) 直接访问、既读又写、且不是任何数组基址 / 经指针常量访问 /
+#    sp 相对访问的偏移。常量下标的元素（a[1] → lw -36(s0)）与标量无从区分，下标变量本身也可能是
+#    同一数组的元素（a[a[2]+1]），所以变量下标访问把从数组基址到帧顶的整段都标为不可提升。
+#    数组基址 = 指针常量 + 下标移位（slli）之后再加上的常量（gcc -O0 的 slli; addi a5,a5,-16;
+#    add a5,a5,s0）；下标没有经过 slli（字节数组等）时基址不可知，整个函数放弃。
+# ─────────────────────────────────────────────────────────────────────────────
+_PROMOTE_POOL = ("t0", "t1", "t2", "t3", "t4", "t5", "t6",
+                 "a7", "a6", "a5", "a4", "a3", "a2", "a1")
+_LOOP_WEIGHT  = 8
+# 函数出口处调用者能看到的寄存器（ABI）：临时寄存器里残留的栈地址不算逃逸
+_ABI_EXIT     = frozenset(REGS[r] for r in ("ra", "sp", "gp", "tp", "a0", "a1", "s0", "s1",
+                                            "s2", "s3", "s4", "s5", "s6", "s7", "s8", "s9",
+                                            "s10", "s11"))
+
+def _functions(lin):
+    """按非 '.' 开头的标签切分函数：[(name, lo, hi)]，lin[lo] 为函数标签"""
+    heads = [k for k, it in enumerate(lin)
+             if is_label(it) and it[1] and not it[1].startswith(".")]
+    return [(lin[k][1], k, heads[i + 1] if i + 1 < len(heads) else len(lin))
+            for i, k in enumerate(heads)]
+
+def _live_in(it, out):
+    if is_label(it): return out
+    use = sum(1 << r for r in get_sources(it[0], it[1]))
+    d = get_dest(it[0], it[1])
+    return use | (out & ~(1 << d if d else 0))
+
+def _frame_slots(lin, lo, hi, live):
+    """
+    分析一个函数的栈帧访问；地址逃逸或形式不识别时返回 None。
+    返回 {"loads": {o: n}, "stores": {o: n}, "bad": {o}, "used": {reg}}，o 为 s0 相对偏移
+    """
+    SP, FP = REGS["sp"], REGS["s0"]
+    sp_off, s0_ent, fp = 0, None, False
+    ptr, idx = {}, {}                   # reg → s0 相对常量
+    loads, stores, bad, sp_acc = {}, {}, set(), set()
+    used = set()
+    scaled = {}                         # reg → 下标移位（slli）之后加上的常量（字节）
+    var = set()                         # 变量下标访问的数组基址
+    for k in range(lo + 1, hi):
+        it = lin[k]
+        if is_label(it):
+            nxt = next((j for j in range(k + 1, hi) if not is_label(lin[j])), None)
+            if nxt is not None and any(_live_in(lin[nxt], live[nxt]) >> r & 1
+                                       for r in list(ptr) + list(idx)):
+                return None             # 指针跨基本块存活
+            ptr.clear(); idx.clear(); scaled.clear()
+            continue
+        if is_call(it):
+            return None
+        mn = it[0]
+        srcs, d = get_sources(mn, it[1]), get_dest(mn, it[1])
+        used |= srcs | ({d} if d else set())
+        tok = split_args(it[1]) if it[1] else []
+        ref = None
+        if mn in _LOADS + _STORES:
+            try: ref = (REGS[tok[0]], parse_int(tok[1]), REGS[tok[2]])
+            except (KeyError, ValueError, IndexError): return None
+        scaled_in = dict(scaled)        # add 可能改写自己的下标寄存器，先留一份
+        if d:
+            disp = scaled_in.get(REGS.get(tok[1])) if len(tok) == 3 else None
+            scaled.pop(d, None)
+            if mn == "slli":
+                scaled[d] = 0
+            elif mn == "addi" and disp is not None:
+                try: scaled[d] = disp + parse_int(tok[2])
+                except ValueError: pass
+        imm = None
+        P = dict(ptr)
+        if fp: P[FP] = 0
+        if mn == "addi":
+            try: imm = parse_int(tok[2])
+            except ValueError:          # %lo(...) 等符号立即数：不能作用于栈指针
+                if srcs & ({SP} | set(P) | set(idx)): return None
+                ptr.pop(d, None); idx.pop(d, None)
+                continue
+        # ── sp ──
+        if mn == "addi" and d == SP and REGS.get(tok[1]) == SP:
+            sp_off += imm; continue
+        if mn == "addi" and d == FP and REGS.get(tok[1]) == SP:
+            if s0_ent is not None and s0_ent != sp_off + imm: return None
+            s0_ent, fp = sp_off + imm, True
+            continue
+        if mn == "addi" and d == SP and REGS.get(tok[1]) == FP and fp:
+            sp_off = s0_ent + imm; continue     # 尾声 addi sp,s0,K
+        if ref and ref[2] == SP:
+            if mn in _STORES and (ref[0] in P or ref[0] in idx) and ref[0] != FP: return None
+            sp_acc.update(range(sp_off + ref[1] & ~3, sp_off + ref[1] + 4, 4))
+            if mn in _LOADS and ref[0] == FP: fp = False
+            ptr.pop(ref[0], None); idx.pop(ref[0], None)
+            continue
+        if SP in srcs or d == SP or d == FP:
+            return None
+        # ── 访存 ──
+        if ref:
+            val, off, b = ref
+            if mn in _STORES and (val in P or val in idx): return None
+            if b == FP and fp:
+                if mn == "lw":   loads[off]  = loads.get(off, 0) + 1
+                elif mn == "sw": stores[off] = stores.get(off, 0) + 1
+                else:            bad.update((off & ~3,))
+                if off % 4: bad.add(off & ~3)
+            elif b in ptr:
+                bad.add((ptr[b] + off) & ~3)
+            elif b in idx:
+                var.add((idx[b] + off) & ~3)
+            if mn in _LOADS:
+                ptr.pop(val, None); idx.pop(val, None)
+            continue
+        # ── 指针运算 ──
+        if mn == "addi" and REGS.get(tok[1]) in P:
+            c = P[REGS[tok[1]]] + imm
+            idx.pop(d, None); ptr[d] = c
+            continue
+        if mn == "addi" and REGS.get(tok[1]) in idx:
+            c = idx[REGS[tok[1]]] + imm
+            ptr.pop(d, None); idx[d] = c
+            continue
+        if mn == "add" and len(tok) == 3:
+            a, b2 = REGS.get(tok[1]), REGS.get(tok[2])
+            pa, pb = a in P, b2 in P
+            if (pa or pb) and not (pa and pb) and not ({a, b2} & set(idx)):
+                i = b2 if pa else a
+                if i not in scaled_in:
+                    return None         # 下标未移位：数组基址不可知
+                c = (P[a] if pa else P[b2]) + scaled_in[i]
+                ptr.pop(d, None); idx[d] = c
+                continue
+        if srcs & (set(P) | set(idx)):
+            return None                 # 指针的其它用法：逃逸
+        if d:
+            ptr.pop(d, None); idx.pop(d, None)
+    if s0_ent is None:
+        return None
+    for a in sp_acc:                    # 入口 sp 相对 → s0 相对
+        bad.add(a - s0_ent)
+    offs = set(loads) | set(stores) | bad
+    for c in var:                       # 变量下标可达：数组基址之上直到帧顶
+        bad.update(o & ~3 for o in offs | {c} if o >= c)
+    return {"loads": loads, "stores": stores, "bad": bad, "used": used}
+
+def _loop_depth(lin, lo, hi):
+    """depth[k]：lin[k] 所在的回边区间层数"""
+    pos = {it[1]: k for k in range(lo, hi) for it in (lin[k],) if is_label(it)}
+    depth = [0] * len(lin)
+    for k in range(lo, hi):
+        t = branch_target(lin[k]) if not is_label(lin[k]) else None
+        if t in pos and pos[t] < k:
+            for j in range(pos[t], k + 1):
+                depth[j] += 1
+    return depth
+
+def promote(lin, report):
+    orig = report.get("_orig", {})
+    out = report.setdefault("promote", {})
+    scratch = report.setdefault("_scratch_regs", set())
+    watch = report.setdefault("_watch_insts", set())
+    FP = REGS["s0"]
+    live = liveness(lin, _ABI_EXIT)
+    for name, lo, hi in _functions(lin):
+        fr = _frame_slots(lin, lo, hi, live)
+        if fr is None:
+            continue
+        cand = [o for o in fr["loads"] if o in fr["stores"] and o % 4 == 0 and o not in fr["bad"]]
+        pool = [r for r in _PROMOTE_POOL if REGS[r] not in fr["used"]]
+        if not cand or not pool:
+            continue
+        depth = _loop_depth(lin, lo, hi)
+        weight = {o: 0 for o in cand}
+        for k in range(lo, hi):
+            ref = None if is_label(lin[k]) else _mem_ref(lin[k])
+            if ref and ref[1] == FP and ref[2] in weight:
+                weight[ref[2]] += _LOOP_WEIGHT ** min(depth[k], 4)
+        cand.sort(key=lambda o: (-weight[o], o))
+        assign = dict(zip(cand, pool))
+        for k in range(lo, hi):
+            ref = None if is_label(lin[k]) else _mem_ref(lin[k])
+            if not ref or ref[1] != FP or ref[2] not in assign:
+                continue
+            P, v = assign[ref[2]], reg_name(ref[0])
+            if id(lin[k]) in orig:
+                watch.add(orig[id(lin[k])])
+            lin[k] = mk("addi", f"{P},{v},0" if lin[k][0] == "sw" else f"{v},{P},0")
+        out[name] = {o: assign[o] for o in sorted(assign)}
+        scratch.update(REGS[r] for r in assign.values())
+    return peephole(lin, report)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  unroll：计数内层循环展开 N 份 + 余数循环
+#    识别 GCC 的“先跳到判断”形式（promote 之后归纳变量在寄存器里）：
+#
+#          j    .Ltest                    j    .Ltest_u
+#      .Lbody:                        .Lbody_u:   body₁ … body_N（内部标签加 _u<k> 后缀）
+#          body（可含前向分支）         .Ltest_u:   test ; addi rB',rB,-(N-1)·s
+#          addi iv,iv,s          →                blt  iv,rB',.Lbody_u
+#      .Ltest:                                    j    .Ltest
+#          test（不写 iv、无副作用）    .Lbody: … 原循环作为余数循环（≤ N-1 次）
+#          blt iv,rB,.Lbody   （或 ble → bge rB,iv）
+#
+#    条件：body 无 call / 回边 / 跳入跳出，addi iv 每次迭代恰好执行一次，
+#    test 读取的寄存器在 body 中不变，test 写的寄存器不在 body 入口活跃。
+#    展开后的块做一次局部列表调度，让相邻副本互相填充 NOP；
+#    总 slot 数超过 Icache（ICACHE_WORDS）的展开撤销。
+#    收益：n 次迭代 × 原循环一趟 对比 n//N 趟展开体 + 余数 + 入口 / 出口多出的开销；
+#    n 不是常量时（如选择排序的内层 j = i+1）迭代数可能很小，不展开。
+# ─────────────────────────────────────────────────────────────────────────────
+def _label_refs(lin):
+    """label → [引用它的 lin 下标]"""
+    refs = {}
+    for k, it in enumerate(lin):
+        if not is_label(it):
+            t = branch_target(it)
+            if t is not None:
+                refs.setdefault(t, []).append(k)
+    return refs
+
+def _match_counted(lin, kb, refs, live):
+    """lin[kb] 为回边分支时，返回循环描述 dict；不符合条件返回 None"""
+    br = lin[kb]
+    if fmt_of(br) != "B": return None
+    tok = split_args(br[1])
+    pos = {it[1]: k for k, it in enumerate(lin) if is_label(it)}
+    L = tok[2]
+    pb = pos.get(L)
+    if pb is None or pb >= kb or pb == 0: return None
+    entry = lin[pb - 1]
+    if is_label(entry) or entry[0] != "jal" or is_call(entry): return None
+    T = branch_target(entry)
+    pt = pos.get(T)
+    if pt is None or not pb < pt < kb: return None
+    test = lin[pt + 1:kb]
+    if any(is_label(it) or is_ctrl(it) or it[0] in _STORES for it in test): return None
+    ra, rb = REGS.get(tok[0]), REGS.get(tok[1])
+    if br[0] == "blt":   iv, rB, le = ra, rb, False
+    elif br[0] == "bge": iv, rB, le = rb, ra, True      # ble iv,rB 的展开形式
+    else: return None
+    if not iv or iv == rB: return None
+    body = list(range(pb + 1, pt))
+    # 归纳变量：body 中恰好一条 addi iv,iv,s（s>0），test 不写 iv
+    defs = [k for k in body if not is_label(lin[k]) and get_dest(lin[k][0], lin[k][1]) == iv]
+    if len(defs) != 1 or any(get_dest(it[0], it[1]) == iv for it in test): return None
+    kinc = defs[0]
+    itok = split_args(lin[kinc][1])
+    if lin[kinc][0] != "addi" or REGS.get(itok[1]) != iv: return None
+    try: step = parse_int(itok[2])
+    except ValueError: return None
+    if step <= 0: return None
+    # body：无 call / jalr / HALT，分支只能前向且落在 body 内，不跳过 addi iv
+    inner = {lin[k][1] for k in body if is_label(lin[k])}
+    for k in body:
+        it = lin[k]
+        if is_label(it): continue
+        if it[0] in ("_HALT", "jalr") or is_call(it): return None
+        if is_ctrl(it):
+            t = branch_target(it)
+            if t not in inner or pos[t] < k or k < kinc < pos[t]: return None
+    for l in inner | {L, T}:
+        ext = [k for k in refs.get(l, ()) if not pb < k < pt]
+        if ext != ({L: [kb], T: [pb - 1]}.get(l, [])): return None
+    # test 读的寄存器（除 iv 与 test 内部定义）在 body 中不变；test 写的寄存器不在 body 入口活跃
+    tdef, tread = set(), set()
+    for it in test:
+        tread |= get_sources(it[0], it[1]) - tdef
+        d = get_dest(it[0], it[1])
+        if d: tdef.add(d)
+    tread |= {rB} - tdef
+    bdef = {get_dest(lin[k][0], lin[k][1]) for k in body if not is_label(lin[k])}
+    if (tread - {iv}) & bdef: return None
+    first = next(k for k in range(pb + 1, kb + 1) if not is_label(lin[k]))
+    if any(_live_in(lin[first], live[first]) >> r & 1 for r in tdef): return None
+    return {"pb": pb, "pt": pt, "kb": kb, "L": L, "T": T, "iv": iv, "rB": rB,
+            "le": le, "step": step, "kinc": kinc, "rB_local": rB in tdef}
+
+def _schedule_block(insts):
+    """
+    基本块内贪心列表调度：每步从就绪指令中挑需要 NOP 最少的（同分取原顺序）。
+    依赖：寄存器 RAW / WAR / WAW；访存保持 store 与其它访存的相对顺序；
+    末尾的控制转移指令固定在最后；含 auipc（结果取决于自身 PC）或 ecall / ebreak 的块不动。
+    """
+    n = len(insts)
+    tail = [insts[-1]] if n and is_ctrl(insts[-1]) else []
+    body = insts[:n - len(tail)]
+    if any(it[0] == "auipc" or fmt_of(it) == "SYS" for it in body):
+        return list(insts)
+    m = len(body)
+    rd = [get_dest(it[0], it[1]) for it in body]
+    rs = [get_sources(it[0], it[1]) for it in body]
+    mem = [it[0] in _LOADS + _STORES for it in body]
+    st  = [it[0] in _STORES for it in body]
+    preds = [set() for _ in range(m)]
+    for j in range(m):
+        for i in range(j):
+            if ((rd[i] and (rd[i] in rs[j] or rd[i] == rd[j])) or
+                    (rd[j] and rd[j] in rs[i]) or
+                    (mem[i] and mem[j] and (st[i] or st[j]))):
+                preds[j].add(i)
+    return [body[j] for j in _list_order(body, preds)] + tail
+
+def _list_order(insts, preds):
+    """preds[j] = 必须排在 j 之前的下标集合；返回下标顺序，依赖成环时返回 None"""
+    m = len(insts)
+    rd = [get_dest(it[0], it[1]) for it in insts]
+    rs = [get_sources(it[0], it[1]) for it in insts]
+    done, order = set(), []
+    while len(order) < m:
+        ready = [j for j in range(m) if j not in done and preds[j] <= done]
+        if not ready:
+            return None
+        def stall(j):
+            need = 0
+            for back, idx in enumerate(reversed(order[-2:]), 1):
+                if rd[idx] and rd[idx] in rs[j]:
+                    need = max(need, 3 - back)
+            return need
+        j = min(ready, key=lambda j: (stall(j), j))
+        order.append(j); done.add(j)
+    return order
+
+def _schedule_range(lin, lo, hi):
+    """对 lin[lo:hi] 的每个基本块调度；slot 数不减少的块保持原样"""
+    k = lo
+    while k < hi:
+        if is_label(lin[k]):
+            k += 1; continue
+        e = k
+        while e < hi and not is_label(lin[e]):
+            e += 1
+            if is_ctrl(lin[e - 1]): break
+        new = _schedule_block(lin[k:e])
+        if _window_cost(lin, k, e, new) < _window_cost(lin, k, e):
+            lin[k:e] = new
+        k = e
+
+def _fold_iv(copy, iv, delta):
+    """
+    副本中 iv 的读取改为读 iv+delta，使副本之间不必各自 addi iv：
+      addi rX,iv,d                           → addi rX,iv,d+delta
+      slli rX,iv,k ; add rY,rB,rX ; lw/sw off(rY)… → off + (delta<<k)
+    rX / rY 在块内被重定义之前只能这样使用；有任何其它读取返回 None。
+    """
+    out = list(copy)
+    skip = set()
+    for i, it in enumerate(out):
+        if is_label(it) or i in skip or iv not in get_sources(it[0], it[1]):
+            continue
+        if get_dest(it[0], it[1]) == iv:
+            continue                                    # 副本自身的 addi iv,iv,s
+        tok = split_args(it[1])
+        if it[0] == "addi" and REGS.get(tok[1]) == iv:
+            d = parse_int(tok[2]) + delta
+            if not -2048 <= d < 2048: return None
+            out[i] = mk("addi", f"{tok[0]},{tok[1]},{d}")
+            continue
+        if it[0] != "slli" or REGS.get(tok[1]) != iv: return None
+        rX, sh = REGS.get(tok[0]), parse_int(tok[2])
+        j = i + 1               # 下一条读 rX 的指令（中间不能有标签或重定义 rX）
+        while (j < len(out) and not is_label(out[j]) and rX not in get_sources(*out[j][:2])
+               and get_dest(*out[j][:2]) != rX):
+            j += 1
+        if j >= len(out) or is_label(out[j]) or out[j][0] != "add": return None
+        at = split_args(out[j][1])
+        if [REGS.get(at[1]), REGS.get(at[2])].count(rX) != 1: return None
+        rY = REGS.get(at[0])
+        ok = False
+        for k in range(j + 1, len(out)):
+            nx = out[k]
+            if is_label(nx): break
+            ref = _mem_ref(nx)
+            srcs = get_sources(nx[0], nx[1])
+            if rY in srcs:
+                if not ref or ref[1] != rY or (nx[0] == "sw" and ref[0] == rY): return None
+                off = ref[2] + (delta << sh)
+                if not -2048 <= off < 2048: return None
+                out[k] = mk(nx[0], f"{reg_name(ref[0])},{off}({reg_name(rY)})")
+            elif rX != rY and rX in srcs:
+                return None
+            if get_dest(nx[0], nx[1]) == rY:
+                ok = rX == rY or rX == get_dest(nx[0], nx[1]); break
+        if not ok: return None
+        skip.add(j)
+    return out
+
+def _const_before(lin, k, r):
+    """lin[k] 之前（同一基本块内）r 的常量值：li，或经 mv 链到 li；求不出返回 None"""
+    for it in reversed(lin[:k]):
+        if is_label(it) or is_ctrl(it): return None
+        if get_dest(it[0], it[1]) != r: continue
+        li, mv = _li_value(it), _mv_of(it)
+        if li: return li[1]
+        if not mv: return None
+        r = mv[1]
+    return None
+
+def _trip_count(lin, loop):
+    """计数循环的迭代数（初值与界都是常量时），否则 None"""
+    c0 = _const_before(lin, loop["pb"] - 1, loop["iv"])
+    cb = _const_before(lin, loop["kb"] if loop["rB_local"] else loop["pb"] - 1, loop["rB"])
+    if c0 is None or cb is None: return None
+    return max(0, -(-(cb + loop["le"] - c0) // loop["step"]))
+
+def unroll(lin, report, factor=4):
+    from rv32i_asm_improved import ICACHE_WORDS
+    factor = int(factor)
+    out = report.setdefault("unroll", {"factor": factor, "loops": [], "folded": 0, "skipped": []})
+    if factor < 2:
+        return lin
+    scratch = report.setdefault("_scratch_regs", set())
+    done = set()
+    while True:
+        refs, live = _label_refs(lin), liveness(lin, _ABI_EXIT)
+        loop = None
+        for kb, it in enumerate(lin):
+            if not is_label(it) and fmt_of(it) == "B" and (it[1], kb) not in done:
+                loop = _match_counted(lin, kb, refs, live)
+                if loop: break
+                done.add((it[1], kb))
+        if loop is None:
+            break
+        pb, pt, kb, L, T = (loop[k] for k in ("pb", "pt", "kb", "L", "T"))
+        done.add((lin[kb][1], kb))
+        # 调整后的界：寄存器 rB 在 test 内定义时原地减，否则用函数内空闲寄存器
+        fn = next((f for f in _functions(lin) if f[1] <= kb < f[2]), ("", 0, len(lin)))
+        used = set()
+        for it in lin[fn[1]:fn[2]]:
+            if not is_label(it):
+                used |= get_sources(it[0], it[1]) | {get_dest(it[0], it[1])}
+        dec = -(factor - 1) * loop["step"]
+        if loop["rB_local"]:
+            bound = reg_name(loop["rB"])
+        else:
+            free = [r for r in _PROMOTE_POOL if REGS[r] not in used]
+            if not free:
+                out["skipped"].append(L); continue
+            bound = free[0]
+        adj = mk("addi", f"{bound},{reg_name(loop['rB'])},{dec}")
+        iv = reg_name(loop["iv"])
+        br = mk(lin[kb][0], f"{iv},{bound},{L}_u" if not loop["le"] else f"{bound},{iv},{L}_u")
+        per = []
+        for c in range(factor):
+            cp = []
+            for it in lin[pb + 1:pt]:
+                if is_label(it):
+                    cp.append(('LABEL', f"{it[1]}_u{c}"))
+                    continue
+                t = branch_target(it)
+                if t is not None:
+                    tok = split_args(it[1])
+                    tok[-1] = f"{t}_u{c}"
+                    it = mk(it[0], ",".join(tok))
+                cp.append(it)
+            per.append(cp)
+        # 各副本改读 iv+c·s，只在最后一个副本 addi iv,iv,N·s
+        folded = [_fold_iv(cp, loop["iv"], c * loop["step"]) for c, cp in enumerate(per)]
+        fold = all(f is not None for f in folded)
+        if fold:
+            kinc = loop["kinc"] - pb - 1
+            for c, f in enumerate(folded):
+                f[kinc] = (mk("addi", f"{iv},{iv},{factor * loop['step']}")
+                           if c == factor - 1 else ('LABEL', None))
+            per = [_compact(f) for f in folded]
+        copies = [it for cp in per for it in cp]
+        new = ([mk("jal", f"x0,{T}_u"), ('LABEL', f"{L}_u")] + copies +
+               [('LABEL', f"{T}_u")] + lin[pt + 1:kb] + [adj, br, mk("jal", f"x0,{T}")])
+        cand = lin[:pb - 1] + new + lin[pb:]
+        _schedule_range(cand, pb, pb - 1 + len(new))
+        # 收益：估计整个循环的周期。n 次迭代时原循环 n·base，展开后 n//factor 趟展开体、
+        # 余数仍走原循环，另加入口 jal 与展开体出口处多做的一次 test；
+        # 迭代数不是常量（初值 / 界不是 li）时不展开
+        base = slot_count([it for it in lin[pb + 1:kb + 1] if not is_label(it)]) + 1
+        kern = slot_count([it for it in cand[pb + 1:pb + len(new) - 2] if not is_label(it)]) + 1
+        extra = slot_count([it for it in lin[pt + 1:kb] if not is_label(it)] + [adj, br]) + 2
+        n = _trip_count(lin, loop)
+        if n is None or (n // factor) * (factor * base - kern) <= extra:
+            out["skipped"].append(f"{L} (trip ?)" if n is None else
+                                  f"{L} ({n} trips, {kern} vs {factor}×{base})")
+            continue
+        if slot_count([it for it in cand if not is_label(it)]) > ICACHE_WORDS:
+            out["skipped"].append(f"{L} (icache)")
+            continue
+        lin[:] = cand
+        out["loops"].append(L)
+        out["folded"] += fold
+        if not loop["rB_local"]:
+            scratch.add(REGS[bound])
+        done = {(it[1], k) for k, it in enumerate(lin) if not is_label(it) and fmt_of(it) == "B"}
+    return lin
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  modulo：单基本块计数循环的软件流水
+#    每条指令分到一个 stage（0..S-1）；kernel m 执行 stage s 的指令属于迭代 m-s，
+#    于是迭代 k+1 的取数与迭代 k 的比较 / 使用落在同一个 kernel 里，
+#    RAW 间距 ≥ 3 由 kernel 内的行序与回边（分支 + 冲刷）提供，而不是 NOP。
+#  合法性（dep 为两条指令有寄存器 RAW/WAR/WAW 或含 store 的访存冲突）：
+#    迭代内 i<j：s_i ≤ s_j，相等时 i 排在 j 前
+#    跨迭代：|s_i - s_j| ≤ 1；s_i = s_j + 1 时 i（迭代 k）须排在 j（迭代 k+1）前
+# ─────────────────────────────────────────────────────────────────────────────
+def _dep_matrix(body):
+    rd = [get_dest(it[0], it[1]) for it in body]
+    rs = [get_sources(it[0], it[1]) for it in body]
+    mem = [it[0] in _LOADS + _STORES for it in body]
+    st = [it[0] in _STORES for it in body]
+    n = len(body)
+    return [[bool((rd[i] and (rd[i] in rs[j] or rd[i] == rd[j])) or (rd[j] and rd[j] in rs[i])
+                  or (mem[i] and mem[j] and (st[i] or st[j])))
+             for j in range(n)] for i in range(n)]
+
+def _stage_assignments(dep, S):
+    n = len(dep)
+    def rec(st):
+        j = len(st)
+        if j == n:
+            yield list(st); return
+        prev = [st[i] for i in range(j) if dep[i][j]]
+        lo, hi = max(prev + [0]), min([s + 1 for s in prev] + [S - 1])
+        for s_ in range(lo, hi + 1):
+            yield from rec(st + [s_])
+    yield from rec([])
+
+def _kernel_order(body, dep, st):
+    n = len(body)
+    preds = [set() for _ in range(n)]
+    for i in range(n):
+        for j in range(n):
+            if i != j and dep[i][j] and ((i < j and st[i] == st[j]) or st[i] == st[j] + 1):
+                preds[j].add(i)
+    return _list_order(body, preds)
+
+def modulo(lin, report, stages=2):
+    """
+    形如 jal T ; L: body ; T: test ; blt/bge iv,rB,L 的计数循环（body 为单个基本块）：
+      test ; addi B,rB,-(S-1)·s ; bge iv,B,T            # 迭代数 < S：走原循环
+      addi B,rB,-s_inc·s ; 序言（stage < m 的部分 kernel）
+      L_m: kernel ; [test ; addi B,...] ; blt iv,B,L_m
+      尾声（stage ≥ e 的部分 kernel）; jal x0,T          # 原循环的 test 判定结束
+    s_inc 为 addi iv,iv,s 所在 stage；kernel 回边处 iv 比 kernel 内最新迭代落后 s_inc 步。
+    穷举合法 stage 分配，kernel 行序用列表调度；II = kernel slot（含 NOP）+ 回边冲刷 1。
+    """
+    from rv32i_asm_improved import ICACHE_WORDS
+    S = int(stages)
+    out = report.setdefault("modulo", {"stages": S, "loops": [], "skipped": []})
+    if S < 2:
+        return lin
+    scratch = report.setdefault("_scratch_regs", set())
+    seen = set()
+    while True:
+        refs, live = _label_refs(lin), liveness(lin, _ABI_EXIT)
+        loop = None
+        for kb, it in enumerate(lin):
+            if is_label(it) or fmt_of(it) != "B": continue
+            t = branch_target(it)
+            if t in seen or t.endswith(("_m", "_u")): continue
+            loop = _match_counted(lin, kb, refs, live)
+            if loop: break
+            seen.add(t)
+        if loop is None:
+            break
+        pb, pt, kb, L, T = (loop[k] for k in ("pb", "pt", "kb", "L", "T"))
+        seen.add(L)
+        body, test = lin[pb + 1:pt], lin[pt + 1:kb]
+        if any(is_label(it) or is_ctrl(it) for it in body) or len(body) > 12:
+            out["skipped"].append(f"{L} (not a single block)"); continue
+        if loop["rB_local"] and any(loop["iv"] in get_sources(it[0], it[1]) for it in test):
+            out["skipped"].append(f"{L} (bound depends on iv)"); continue
+        fn = next((f for f in _functions(lin) if f[1] <= kb < f[2]), ("", 0, len(lin)))
+        used = set()
+        for it in lin[fn[1]:fn[2]]:
+            if not is_label(it):
+                used |= get_sources(it[0], it[1]) | {get_dest(it[0], it[1])}
+        free = [r for r in _PROMOTE_POOL if REGS[r] not in used]
+        if not free:
+            out["skipped"].append(f"{L} (no free register)"); continue
+        B, iv, step = free[0], reg_name(loop["iv"]), loop["step"]
+        kinc = loop["kinc"] - pb - 1
+        ltest = test if loop["rB_local"] else []
+        def back(adj):
+            return ltest + ([mk("addi", f"{B},{reg_name(loop['rB'])},{adj}")] if ltest else []) + \
+                [mk(lin[kb][0], f"{iv},{B},{L}_m" if not loop["le"] else f"{B},{iv},{L}_m")]
+        base = slot_count(body + test + [lin[kb]]) + 1
+        dep = _dep_matrix(body)
+        best, flat = None, None
+        for st in _stage_assignments(dep, S):
+            order = _kernel_order(body, dep, st)
+            if order is None: continue
+            ii = slot_count([body[j] for j in order] + back(-st[kinc] * step)) + 1
+            key = (ii, sum(st))
+            if max(st) == 0:
+                flat = ii                   # 全部 stage 0：即只做块内列表调度
+            if best is None or key < best[0]:
+                best = (key, st, order)
+        if best is None or best[0][0] >= base or max(best[1]) == 0:
+            out["skipped"].append(f"{L} (II {best[0][0] if best else '?'} ≥ {base})"
+                                  if not best or best[0][0] >= base else f"{L} (no overlap)")
+            continue
+        (ii, _), st, order = best
+        ns = max(st) + 1
+        rB = reg_name(loop["rB"])
+        guard = (mk("bge", f"{iv},{B},{T}") if not loop["le"] else mk("blt", f"{B},{iv},{T}"))
+        new = (ltest + [mk("addi", f"{B},{rB},{-(ns - 1) * step}"), guard,
+                        mk("addi", f"{B},{rB},{-st[kinc] * step}")])
+        for m in range(ns - 1):                                 # 序言
+            new += [body[j] for j in order if st[j] <= m]
+        new += [('LABEL', f"{L}_m")] + [body[j] for j in order] + back(-st[kinc] * step)
+        for e in range(1, ns):                                  # 尾声
+            new += [body[j] for j in order if st[j] >= e]
+        new.append(mk("jal", f"x0,{T}"))
+        cand = lin[:pb - 1] + new + lin[pb:]
+        if slot_count([it for it in cand if not is_label(it)]) > ICACHE_WORDS:
+            out["skipped"].append(f"{L} (icache)"); continue
+        lin[:] = cand
+        scratch.add(REGS[B])
+        out["loops"].append({"label": L, "ops": len(body), "stages": ns,
+                             "ii": ii, "list": flat, "base": base})
+    return lin
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  dce：从入口（slot 0，启动存根之后顺序落入）与 .globl 符号出发，沿 CFG 与调用图
+#    求可达指令；不可达的指令及只指向它们的标签在布局前删除。
+#    地址被取用的文本标签（%hi / %lo / la 等出现在非跳转指令操作数里）也作为根，
+#    因为它们可能经 jalr 间接到达。
+# ─────────────────────────────────────────────────────────────────────────────
+def _reachable(lin, roots):
+    succ = successors(lin)
+    pos = {it[1]: k for k, it in enumerate(lin) if is_label(it)}
+    first = lambda k: next((j for j in range(k, len(lin)) if not is_label(lin[j])), None)
+    seen, work = set(), [k for k in (first(k) for k in roots) if k is not None]
+    while work:
+        k = work.pop()
+        if k in seen: continue
+        seen.add(k)
+        nxt = list(succ[k])
+        if is_call(lin[k]) and branch_target(lin[k]) in pos:
+            nxt.append(first(pos[branch_target(lin[k])]))
+        work.extend(j for j in nxt if j is not None and j not in seen)
+    return seen
+
+def dce(lin, report):
+    import re
+    out = report.setdefault("dce", {"insts": 0, "slots": 0, "removed": []})
+    pos = {it[1]: k for k, it in enumerate(lin) if is_label(it)}
+    roots = [0] + [pos[g] for g in report.get("_globls", ()) if g in pos]
+    word = re.compile(r'[\w.$]+')
+    for it in lin:
+        if not is_label(it) and fmt_of(it) not in ("B", "J") and it[1]:
+            roots += [pos[w] for w in word.findall(it[1]) if w in pos]
+    live = _reachable(lin, roots)
+    before = slot_count([it for it in lin if not is_label(it)])
+    keep, run, cur, ofs = [], None, "<entry>", 0     # run = [位置 "标签+偏移", 指令数]
+    for k, it in enumerate(lin):
+        if is_label(it):
+            cur, ofs, run = it[1], 0, None
+            keep.append((k, it))
+            continue
+        ofs += 1
+        if k in live:
+            run = None
+            keep.append((k, it))
+            continue
+        if run is None:
+            run = [cur if ofs == 1 else f"{cur}+{ofs - 1}", 0]
+            out["removed"].append(run)
+        run[1] += 1
+        out["insts"] += 1
+    # 只指向被删区间的标签一并删除（其后第一条指令不可达）
+    nxt_live, nxt = {}, None
+    for k in range(len(lin) - 1, -1, -1):
+        if not is_label(lin[k]): nxt = k
+        nxt_live[k] = nxt is None or nxt in live
+    lin[:] = [it for k, it in keep if not is_label(it) or nxt_live[k]]
+    out["slots"] += before - slot_count([it for it in lin if not is_label(it)])
+    out["removed"] = [tuple(r) for r in out["removed"]]
+    return lin
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  inline：无栈帧叶函数在 call（jal ra）处展开
+#    叶函数 = 不含 call、只经 jr ra 返回、只从函数标签进入；平凡栈帧
+#    （addi sp,sp,±K、sw/lw s0|ra,o(sp)、addi s0,sp,K，promote 之后常见）先剥掉，
+#    剩下的代码不得再引用 sp / s0 / ra。
+#    代价模型：按 slot 计的代码增长（非 .globl 且调用点全部展开的函数体被删除，
+#    抵扣其大小）累计不超过 budget，总 slot 不超过 Icache。
+#    调用者里已没有 call 时，sw ra / lw ra 这对保存恢复一并删除。
+# ─────────────────────────────────────────────────────────────────────────────
+def _is_ret(it):
+    return it[0] == "jalr" and split_args(it[1]) in (["x0", "0", "ra"], ["zero", "0", "ra"])
+
+def _is_frame(it):
+    """平凡栈帧指令：addi sp,sp,c / addi s0,sp,K / sw|lw s0|ra,o(sp)"""
+    SP, FP, RA = REGS["sp"], REGS["s0"], REGS["ra"]
+    tok = split_args(it[1]) if it[1] else []
+    if it[0] == "addi" and len(tok) == 3 and REGS.get(tok[1]) == SP:
+        return REGS.get(tok[0]) in (SP, FP)
+    if it[0] in ("sw", "lw") and len(tok) == 3:
+        return REGS.get(tok[2]) == SP and REGS.get(tok[0]) in (FP, RA)
+    return False
+
+def _leaf_body(lin, lo, hi, refs):
+    """函数 lin[lo:hi] 可内联时返回 (body, frame_stores)，body 中返回指令保留原样"""
+    SP, FP, RA = REGS["sp"], REGS["s0"], REGS["ra"]
+    body, frame = [], []
+    for k in range(lo + 1, hi):
+        it = lin[k]
+        if is_label(it):
+            if any(not lo < j < hi for j in refs.get(it[1], ())):
+                return None             # 从函数外跳入内部标签
+            body.append(it); continue
+        if _is_frame(it):
+            if it[0] == "sw": frame.append(it)
+            continue
+        if _is_ret(it):
+            body.append(it); continue
+        regs = get_sources(it[0], it[1]) | {get_dest(it[0], it[1])}
+        if it[0] in ("_HALT", "jalr") or is_call(it) or regs & {SP, FP, RA}:
+            return None
+        t = branch_target(it)
+        if t is not None and not any(is_label(x) and x[1] == t for x in lin[lo + 1:hi]):
+            return None                 # 跳出函数（尾调用等）
+        body.append(it)
+    insts = [it for it in body if not is_label(it)]
+    if not insts or not (_is_ret(insts[-1]) or (insts[-1][0] == "jal" and not is_call(insts[-1]))):
+        return None                     # 末尾会顺序落入下一个函数
+    return body, frame
+
+def _expand_at(body, n):
+    """第 n 个展开副本：内部标签加 _i<n> 后缀，返回改为跳到副本末尾"""
+    ret = f".Lret_i{n}"
+    out = []
+    for it in body:
+        if is_label(it):
+            out.append(('LABEL', f"{it[1]}_i{n}")); continue
+        if _is_ret(it):
+            out.append(mk("jal", f"x0,{ret}")); continue
+        t = branch_target(it)
+        if t is not None:
+            tok = split_args(it[1]); tok[-1] = f"{t}_i{n}"
+            it = mk(it[0], ",".join(tok))
+        out.append(it)
+    if out and out[-1] == mk("jal", f"x0,{ret}"):
+        out.pop()                       # 末尾的返回直接顺序落下
+    if any(not is_label(it) and branch_target(it) == ret for it in out):
+        out.append(('LABEL', ret))
+    return out
+
+def _drop_ra_saves(lin, report):
+    """没有 call 的函数里删除 sw ra,o(sp) / lw ra,o(sp)（ra 不再被改写）"""
+    RA = REGS["ra"]
+    orig, watch = report.get("_orig", {}), report.setdefault("_watch_insts", set())
+    n = 0
+    for name, lo, hi in _functions(lin):
+        seg = [it for it in lin[lo:hi] if not is_label(it)]
+        if any(is_call(it) for it in seg): continue
+        saves = [k for k in range(lo, hi) if not is_label(lin[k]) and _is_frame(lin[k])
+                 and split_args(lin[k][1])[0] in ("ra", "x1")]
+        other = [it for it in seg if get_dest(it[0], it[1]) == RA and not _is_frame(it)]
+        if not saves or other: continue
+        for k in saves:
+            if lin[k][0] == "sw" and id(lin[k]) in orig:
+                watch.add(orig[id(lin[k])])
+            lin[k] = ('LABEL', None)
+        n += 1
+    lin[:] = _compact(lin)
+    return n
+
+def inline(lin, report, budget=64):
+    from rv32i_asm_improved import ICACHE_WORDS
+    budget = int(budget)
+    out = report.setdefault("inline", {"budget": budget, "sites": 0, "callees": {},
+                                       "growth": 0, "ra_saves": 0})
+    orig = report.get("_orig", {})
+    watch = report.setdefault("_watch_insts", set())
+    globls = set(report.get("_globls", ()))
+    n_copy = 0
+    while True:
+        refs = _label_refs(lin)
+        size = slot_count([it for it in lin if not is_label(it)])
+        best = None
+        for name, lo, hi in _functions(lin):
+            sites = [k for k in refs.get(name, ()) if is_call(lin[k])]
+            if not sites or any(lo < k < hi for k in sites): continue
+            lb = _leaf_body(lin, lo, hi, refs)
+            if lb is None: continue
+            cost = slot_count([it for it in lb[0] if not is_label(it) and not _is_ret(it)])
+            if best is None or cost < best[0]:
+                best = (cost, name, lo, hi, sites, lb)
+        if best is None:
+            break
+        _, name, lo, hi, sites, (body, frame) = best
+        cand = list(lin)
+        for i, k in reversed(list(enumerate(sorted(sites)))):
+            cand[k:k + 1] = _expand_at(body, n_copy + i)
+        others = [k for k in refs.get(name, ()) if k not in sites]
+        removed = name not in globls and not others
+        if removed:                     # 调用点全部展开：删除函数体
+            pos = next(k for k, it in enumerate(cand) if it == ('LABEL', name))
+            end = next((k for k in range(pos + 1, len(cand)) if is_label(cand[k])
+                        and cand[k][1] and not cand[k][1].startswith(".")), len(cand))
+            del cand[pos:end]
+        growth = slot_count([it for it in cand if not is_label(it)]) - size
+        if out["growth"] + growth > budget or size + growth > ICACHE_WORDS:
+            break
+        lin[:] = cand
+        n_copy += len(sites)
+        out["sites"] += len(sites)
+        out["callees"][name] = len(sites)
+        out["growth"] += growth
+        for it in frame:                # 被剥掉的栈帧保存：基线中写过的栈 word 不比较
+            if id(it) in orig: watch.add(orig[id(it)])
+    if out["sites"]:
+        report.setdefault("_scratch_regs", set()).add(REGS["ra"])
+        out["ra_saves"] += _drop_ra_saves(lin, report)
+    return lin
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  addr：地址 / 大常数的生成
+#    rodata 符号地址在布局前就已确定（rodata_base + 偏移），%hi/%lo 可直接求值。
+#    基本块内跟踪寄存器的已知常量值（lui / addi 链）：
+#      shrink : 结果放得进 12 位有符号立即数 → addi rd,x0,V（rodata 在 0x400 时总是如此）
+#      share  : 否则若另一寄存器已持有相距 12 位以内的值 K → addi rd,rK,V-K（复用 %hi 基址）
+#      mem    : lw/sw 的基址已知且地址放得进 12 位 → off(x0)
+#      fold   : 其它已知输入的 addi 折叠为 addi rd,x0,V
+#    仍需 lui+addi 两条的常量若位于不含 call 的循环内，提到循环入口前的空闲寄存器里（hoist；
+#    空闲寄存器都是 caller-saved，含 call 的循环里会被被调函数改写）。
+#    原来的 lui 等随后由 peephole 的 dead 规则删除。
+# ─────────────────────────────────────────────────────────────────────────────
+_MASK32 = 0xFFFFFFFF
+
+def _fits12(v):
+    return -2048 <= v < 2048
+
+def _s32v(v):
+    v &= _MASK32
+    return v - (1 << 32) if v & 0x80000000 else v
+
+def _imm_value(tok, symbols):
+    """立即数 / %hi(sym) / %lo(sym)（sym 为已知地址的 rodata 符号）→ int；否则 None"""
+    import re
+    from rv32i_asm_improved import hi20, lo12
+    m = re.match(r'%(hi|lo)\(([^)]+)\)$', tok.strip())
+    if m:
+        a = symbols.get(m.group(2).strip())
+        if a is None: return None
+        return hi20(a) if m.group(1) == "hi" else lo12(a)
+    try: return parse_int(tok)
+    except ValueError: return None
+
+def _const_of(it, known, symbols):
+    """lui / addi 的结果在已知输入下的常量值；否则 None"""
+    tok = split_args(it[1]) if it[1] else []
+    if it[0] == "lui" and len(tok) == 2:
+        h = _imm_value(tok[1], symbols)
+        return None if h is None else _s32v(h << 12)
+    if it[0] == "addi" and len(tok) == 3:
+        rs = REGS.get(tok[1])
+        base = 0 if rs == 0 else known.get(rs)
+        imm = _imm_value(tok[2], symbols)
+        if base is None or imm is None: return None
+        return _s32v(base + imm)
+    return None
+
+def _materialize_pairs(lin, lo, hi, symbols):
+    """lin[lo:hi] 中仍为 lui rd,H ; addi rd,rd,L 的常量对 → [(k, rd, V)]"""
+    out = []
+    for k in range(lo, hi - 1):
+        a, b = lin[k], lin[k + 1]
+        if is_label(a) or is_label(b) or a[0] != "lui" or b[0] != "addi": continue
+        rd = get_dest(a[0], a[1])
+        tb = split_args(b[1])
+        if rd is None or REGS.get(tb[0]) != rd or REGS.get(tb[1]) != rd: continue
+        v = _const_of(b, {rd: _const_of(a, {}, symbols)}, symbols)
+        if v is not None and _const_of(a, {}, symbols) is not None:
+            out.append((k, rd, v))
+    return out
+
+def _preheader(lin, p, kb, refs):
+    """循环 [p, kb] 的唯一入口前插入位置；有其它入口时返回 None"""
+    inside = {lin[k][1] for k in range(p, kb + 1) if is_label(lin[k])}
+    ext = [(l, k) for l in inside for k in refs.get(l, ()) if not p <= k <= kb]
+    prev = p - 1
+    if not ext:
+        if prev >= 0 and not is_label(lin[prev]) and lin[prev][0] == "jal" and not is_call(lin[prev]):
+            return None                 # 前一条是无条件跳转：循环不可达或另有入口
+        return p
+    if len(ext) == 1 and ext[0][1] == prev and lin[prev][0] == "jal" and not is_call(lin[prev]):
+        return prev                     # GCC 的 j .Ltest 入口
+    return None
+
+def addr(lin, report):
+    out = report.setdefault("addr", {"shrink": 0, "share": 0, "mem": 0, "fold": 0, "hoist": 0})
+    symbols = report.get("_symbols", {})
+    # ── 块内常量跟踪 ──
+    known = {}
+    for k, it in enumerate(lin):
+        if is_label(it):
+            known.clear(); continue
+        d = get_dest(it[0], it[1])
+        v = _const_of(it, known, symbols)
+        if v is not None and d is not None:
+            tok = split_args(it[1])
+            symbolic = "%" in it[1]
+            new, kind = None, None
+            if _fits12(v):
+                if not (it[0] == "addi" and REGS.get(tok[1]) == 0 and not symbolic):
+                    new = mk("addi", f"{reg_name(d)},x0,{v}")
+                    kind = "shrink" if it[0] == "lui" or symbolic else "fold"
+            else:
+                near = [(r, kv) for r, kv in known.items() if _fits12(v - kv)]
+                if near and it[0] == "lui":
+                    r, kv = near[0]
+                    new, kind = mk("addi", f"{reg_name(d)},{reg_name(r)},{v - kv}"), "share"
+            if new and _window_cost(lin, k, k + 1, [new]) <= _window_cost(lin, k, k + 1):
+                lin[k] = new
+                out[kind] += 1
+            known[d] = v
+        else:
+            ref = _mem_ref(it)
+            if ref and ref[1] in known and _fits12(known[ref[1]] + ref[2]):
+                a = known[ref[1]] + ref[2]
+                new = mk(it[0], f"{reg_name(ref[0])},{a}(x0)")
+                if _window_cost(lin, k, k + 1, [new]) <= _window_cost(lin, k, k + 1):
+                    lin[k] = new
+                    out["mem"] += 1
+            if d is not None: known.pop(d, None)
+            if is_call(it): known.clear()
+    # ── 循环不变的两条式常量外提 ──
+    scratch = report.setdefault("_scratch_regs", set())
+    while True:
+        refs = _label_refs(lin)
+        pos = {it[1]: k for k, it in enumerate(lin) if is_label(it)}
+        loops = sorted(((pos[branch_target(it)], kb) for kb, it in enumerate(lin)
+                        if not is_label(it) and fmt_of(it) in ("B", "J")
+                        and pos.get(branch_target(it), kb + 1) < kb),
+                       key=lambda r: r[0] - r[1])            # 最外层优先
+        done = False
+        for p, kb in loops:
+            # 外提的常量放在 caller-saved 寄存器里：循环体内有 call 时被调函数可能改写它
+            if any(not is_label(it) and is_call(it) for it in lin[p:kb + 1]):
+                continue
+            pairs = _materialize_pairs(lin, p, kb + 1, symbols)
+            at = _preheader(lin, p, kb, refs) if pairs else None
+            if at is None: continue
+            fn = next((f for f in _functions(lin) if f[1] <= p < f[2]), ("", 0, len(lin)))
+            used = set()
+            for it in lin[fn[1]:fn[2]]:
+                if not is_label(it):
+                    used |= get_sources(it[0], it[1]) | {get_dest(it[0], it[1])}
+            free = [REGS[r] for r in _PROMOTE_POOL if REGS[r] not in used]
+            vals = {}
+            for k, rd, v in pairs:
+                if v not in vals and free:
+                    vals[v] = free.pop(0)
+            if not vals: continue
+            for k, rd, v in reversed(pairs):
+                if v in vals:
+                    lin[k] = mk("addi", f"{reg_name(rd)},{reg_name(vals[v])},0")
+                    lin[k + 1] = ('LABEL', None)
+                    out["hoist"] += 1
+            pre = []
+            for v, F in vals.items():
+                pre += [mk("lui", f"{reg_name(F)},{((v + 0x800) >> 12) & 0xFFFFF}"),
+                        mk("addi", f"{reg_name(F)},{reg_name(F)},{_s32v(v - ((v + 0x800) & ~0xFFF))}")]
+                scratch.add(F)
+            lin[at:at] = pre
+            lin[:] = _compact(lin)
+            done = True
+            break
+        if not done:
+            break
+    return peephole(lin, report)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  layout：按 ISS 边计数 profile 重排函数内基本块，让热路径顺序落入
+#    分支在 ID 解析、跳转后 wist 冲刷一个 slot：每次跳转 / 分支跳转多 1 周期。
+#    Pettis-Hansen 式贪心成链：边按执行次数降序，a 为链尾、b 为链头时合并；
+#    call 之后的返回点、函数末尾的落空必须保持相邻。
+# ─────────────────────────────────────────────────────────────────────────────
+_INVERT = {"beq": "bne", "bne": "beq", "blt": "bge", "bge": "blt", "bltu": "bgeu", "bgeu": "bltu"}
+
+def _blocks(lin, lo, hi):
+    """lin[lo:hi] → 基本块列表，每块为 lin 下标列表（前导标签 + 指令，至多以一条控制转移结尾）"""
+    out, cur = [], []
+    for k in range(lo, hi):
+        if is_label(lin[k]) and any(not is_label(lin[x]) for x in cur):
+            out.append(cur); cur = []
+        cur.append(k)
+        if not is_label(lin[k]) and is_ctrl(lin[k]):
+            out.append(cur); cur = []
+    if cur: out.append(cur)
+    return out
+
+def layout(lin, report, path=None):
+    import json
+    from rv32i_sim import fingerprint
+    out = report.setdefault("layout", {"functions": 0, "inverted": 0, "jumps_removed": 0,
+                                       "jumps_added": 0, "taken_before": 0, "taken_after": 0})
+    if not path:
+        raise ValueError("layout 需要 profile：layout=PATH（rv32i_sim.py --profile-out 生成）")
+    with open(path, encoding="utf-8") as f:
+        prof = json.load(f)
+    if prof.get("fingerprint") != fingerprint((it[0], it[1]) for it in lin if not is_label(it)):
+        out["skipped"] = "profile 与指令序列不匹配（生成 profile 时的 --opt 应与 layout 之前的 pass 相同）"
+        return lin
+    pidx = {k: i for i, k in enumerate(k for k, it in enumerate(lin) if not is_label(it))}
+    counts, taken = prof["counts"], prof["taken"]
+    new_lin, last = [], 0
+    for name, lo, hi in _functions(lin):
+        new_lin += lin[last:lo]; last = hi
+        blocks = _blocks(lin, lo, hi)
+        tail = blocks.pop() if all(is_label(lin[k]) for k in blocks[-1]) else []
+        n = len(blocks)
+        end = lin[blocks[-1][-1]] if n else None
+        # 末块必须以 HALT / jalr / 无条件跳转结束（否则落空到下一个函数，不能挪动）
+        if n < 3 or not (end[0] in ("_HALT", "jalr") or end[0] == "jal" and not is_call(end)):
+            new_lin += lin[lo:hi]; continue
+        at = {lin[k][1]: j for j, b in enumerate(blocks) for k in b if is_label(lin[k])}
+        succ = []               # (fallthrough 块, 跳转目标块, ft 次数, 跳转次数, 必须相邻)
+        for j, b in enumerate(blocks):
+            t = lin[b[-1]]
+            ft = j + 1 if j + 1 < n else None
+            c, tk = counts[pidx[b[-1]]], taken[pidx[b[-1]]]
+            if t[0] in ("_HALT", "jalr"):
+                succ.append((None, None, 0, 0, False))
+            elif fmt_of(t) == "B":
+                succ.append((ft, at.get(branch_target(t)), c - tk, tk, False))
+            elif t[0] == "jal" and not is_call(t):
+                succ.append((None, at.get(branch_target(t)), 0, c, False))
+            else:
+                succ.append((ft, None, c, 0, is_call(t)))
+        # ── 成链（入口块固定在最前）──
+        chain = {j: [j] for j in range(n)}
+        head = list(range(n))
+        edges = []
+        for a, (ft, tg, wf, wt, forced) in enumerate(succ):
+            if ft is not None: edges.append((float("inf") if forced else wf, a, ft))
+            if tg is not None: edges.append((wt, a, tg))
+        for w, a, b in sorted(edges, key=lambda e: (-e[0], e[1])):
+            if w <= 0 or b == 0: continue
+            ha = head[a]
+            if ha == b or head[b] != b or chain[ha][-1] != a: continue
+            chain[ha] += chain.pop(b)
+            for x in chain[ha]: head[x] = ha
+        order = [x for h in sorted(chain) for x in chain[h]]
+        # ── 估计：每次非顺序转移多一个冲刷周期 ──
+        def flushes(order):
+            nxt = {a: order[p + 1] if p + 1 < n else None for p, a in enumerate(order)}
+            tot = 0
+            for a, (ft, tg, wf, wt, forced) in enumerate(succ):
+                if tg is not None and ft is not None:
+                    tot += wt if nxt[a] == ft else wf if nxt[a] == tg else wt + wf
+                elif tg is not None:
+                    tot += 0 if nxt[a] == tg else wt
+                elif ft is not None:
+                    tot += 0 if nxt[a] == ft else wf
+            return tot
+        def emit(order):
+            """按 order 排块并修正块尾：反转分支 / 删除多余 jal / 补 jal；返回 (块列表, 统计)"""
+            items = [[lin[k] for k in b] for b in blocks]
+            st = {"inverted": 0, "jumps_removed": 0, "jumps_added": 0}
+            def label_of(j):
+                lbl = next((it[1] for it in items[j] if is_label(it)), None)
+                if lbl is None:
+                    lbl = f".Lpgo{j}_{name}"
+                    items[j].insert(0, ('LABEL', lbl))
+                return lbl
+            for p, a in enumerate(order):
+                nxt = order[p + 1] if p + 1 < n else None
+                ft, tg = succ[a][:2]
+                t = items[a][-1]
+                if fmt_of(t) == "B" and tg is not None:
+                    if nxt == tg and ft != tg:              # 反转条件，热方向落入
+                        tok = split_args(t[1])
+                        items[a][-1] = mk(_INVERT[t[0]], f"{tok[0]},{tok[1]},{label_of(ft)}")
+                        st["inverted"] += 1
+                    elif nxt != ft:
+                        items[a].append(mk("jal", f"x0,{label_of(ft)}")); st["jumps_added"] += 1
+                elif t[0] == "jal" and not is_call(t) and tg is not None:
+                    if nxt == tg:
+                        items[a].pop(); st["jumps_removed"] += 1
+                elif ft is not None and nxt != ft:
+                    items[a].append(mk("jal", f"x0,{label_of(ft)}")); st["jumps_added"] += 1
+            return [items[a] for a in order], st
+        def cycles(order, seq):
+            """估计动态周期：块执行次数 × 块 slot（含与布局前驱之间的 NOP）+ 冲刷"""
+            tot, prev = flushes(order), []
+            for a, items in zip(order, seq):
+                ins = [it for it in items if not is_label(it)]
+                tot += counts[pidx[blocks[a][-1]]] * (slot_count(prev + ins) - slot_count(prev))
+                prev = (prev + ins)[-2:]
+            return tot
+        ident = list(range(n))
+        seq, st = emit(order)
+        before, after = flushes(ident), flushes(order)
+        out["taken_before"] += before
+        if cycles(order, seq) >= cycles(ident, emit(ident)[0]):
+            out["taken_after"] += before
+            new_lin += lin[lo:hi]; continue
+        out["taken_after"] += after
+        out["functions"] += 1
+        for k, v in st.items():
+            out[k] += v
+        for items in seq:
+            new_lin += items
+        new_lin += [lin[k] for k in tail]
+    new_lin += lin[last:]
+    return new_lin
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  rewrites：应用 rv32i_superopt.py 搜出的改写库
+# ─────────────────────────────────────────────────────────────────────────────
+def rewrites(lin, report, mode="symbolic"):
+    from rv32i_superopt import apply_db          # 延迟导入：rv32i_superopt 依赖本模块
+    return apply_db(lin, report, mode)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  pass 注册 & 与汇编器的接口
+# ─────────────────────────────────────────────────────────────────────────────
+PASSES = {
+    "peephole": peephole,
+    "promote":  promote,
+    "unroll":   unroll,
+    "modulo":   modulo,
+    "dce":      dce,
+    "inline":   inline,
+    "addr":     addr,
+    "rewrites": rewrites,
+    "layout":   layout,
+}
+
+def make_hook(names, report=None):
+    """
+    返回 assemble_lines(opt=...) 使用的回调：
+      hook(instructions, labels_by_idx, ctx=None) → (instructions, labels_by_idx)
+    ctx 来自 assemble_lines：.globl 符号与 rodata 符号地址，分别存为 report["_globls"] / ["_symbols"]。
+    各 pass 的统计写入 report（dict）。
+    """
+    names = [n for n in (names.split(",") if isinstance(names, str) else names) if n]
+    specs = []                  # "unroll=4" → ("unroll", ["4"])
+    for n in names:
+        name, _, arg = n.partition("=")
+        if name not in PASSES:
+            raise ValueError(f"未知 pass: {name!r}（可用: {', '.join(PASSES)}）")
+        specs.append((name, [arg] if arg else []))
+    report = {} if report is None else report
+
+    def hook(instructions, labels_by_idx, ctx=None):
+        lin = to_linear(instructions, labels_by_idx)
+        report["_globls"]  = list((ctx or {}).get("globls", ()))
+        report["_symbols"] = dict((ctx or {}).get("symbols", {}))
+        # 原始指令对象 → 基线下标（供 compare() 定位被改写的访存）
+        report["_orig_lin"] = list(instructions)
+        report["_orig"] = {id(ins): i for i, ins in enumerate(instructions)}
+        for name, args in specs:
+            lin = PASSES[name](lin, report, *args)
+        return from_linear(lin)
+    return hook
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  验证：优化前后各汇编一次，ISS 跑两份镜像，比较最终状态与周期
+# ─────────────────────────────────────────────────────────────────────────────
+def compare(raw, names, src_name="<memory>", rodata_base=DEFAULT_RODATA_BASE,
+            stack_top=DEFAULT_STACK_TOP, max_cycles=1_000_000):
+    from rv32i_sim import run, dmem_from_image, diff_state
+    report = {}
+    base = assemble_lines(raw, src_name, rodata_base=rodata_base, stack_top=stack_top)
+    opt  = assemble_lines(raw, src_name, rodata_base=rodata_base, stack_top=stack_top,
+                          opt=make_hook(names, report))
+    if base is None or opt is None:
+        raise ValueError("没有找到任何指令")
+    watch = report.get("_watch_insts", ())
+    # pass 声明为私有的栈槽：只忽略基线中这些指令实际访问过的 Dcache word
+    base_slots = {i: e[1] for i, e in enumerate(base["encoded"])}
+    s0 = run(image_words(base), dmem_from_image(base), max_cycles=max_cycles,
+             watch={base_slots[i] for i in watch if i in base_slots})
+    s1 = run(image_words(opt), dmem_from_image(opt), max_cycles=max_cycles)
+    ign_words = set().union(*s0["accessed"].values()) if s0["accessed"] else set()
+    diffs = diff_state(s0, s1, report.get("_scratch_regs", ()), ign_words)
+    return {"base": base, "opt": opt, "sim_base": s0, "sim_opt": s1,
+            "diffs": diffs, "report": report}
+
+def compare_layout(raw, names, src_name="<memory>", rodata_base=DEFAULT_RODATA_BASE,
+                   stack_top=DEFAULT_STACK_TOP, max_cycles=1_000_000):
+    """
+    按 names 优化并用 ISS 取 profile，再以 names + layout 重新汇编比较。
+    返回 compare() 的结果，另加 layout_cycles = (仅 names 的周期, 加 layout 后的周期)。
+    """
+    import json, tempfile
+    from rv32i_sim import edge_profile
+    c0 = compare(raw, names, src_name, rodata_base, stack_top, max_cycles)
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(edge_profile(c0["opt"], c0["sim_opt"]), f)
+    try:
+        names = [n for n in (names.split(",") if isinstance(names, str) else names) if n]
+        c = compare(raw, names + [f"layout={f.name}"], src_name, rodata_base, stack_top, max_cycles)
+    finally:
+        os.remove(f.name)
+    c["layout_cycles"] = (c0["sim_opt"]["cycles"], c["sim_opt"]["cycles"])
+    return c
+
+def print_compare(c, name):
+    b, o, s0, s1 = c["base"], c["opt"], c["sim_base"], c["sim_opt"]
+    ok = not c["diffs"] and not s1["stale"]
+    print(f"[OPT] {name}")
+    for k, v in c["report"].items():
+        if k.startswith("_"):
+            continue
+        if isinstance(v, dict) and "removed" in v:      # dce：逐段列出删除的指令
+            print(f"  {k:<10} {v['insts']} insts / {v['slots']} slots removed")
+            for where, n in v["removed"]:
+                print(f"  {'':<10}   - {where:<24} {n:4d} insts")
+        else:
+            print(f"  {k:<10} {v}")
+    print(f"  {'':<10} {'insts':>7} {'NOPs':>7} {'slots':>7} {'cycles':>8}")
+    print(f"  {'before':<10} {b['n_insts']:>7} {b['total_nops']:>7} {b['total_slots']:>7} {s0['cycles']:>8}")
+    print(f"  {'after':<10} {o['n_insts']:>7} {o['total_nops']:>7} {o['total_slots']:>7} {s1['cycles']:>8}")
+    dc = s0["cycles"] - s1["cycles"]
+    print(f"  {'saved':<10} {b['n_insts']-o['n_insts']:>7} {b['total_nops']-o['total_nops']:>7}"
+          f" {b['total_slots']-o['total_slots']:>7} {dc:>8}"
+          f"  ({100.0 * dc / s0['cycles'] if s0['cycles'] else 0:.1f}% cycles)")
+    why = "" if ok else "  " + "; ".join(c["diffs"][:5] + [f"stale={len(s1['stale'])}"])
+    if not s0["halted"] and not s1["halted"] and not s1["stale"]:
+        # 截止时刻两份镜像的执行进度不同，最终状态不可比
+        print("  verify     UNVERIFIED  (两份镜像都未在 max_cycles 内 HALT)")
+        return None
+    print(f"  verify     {'PASS' if ok else 'FAIL'}{why}")
+    return ok
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RV32I 汇编前优化 + ISS 验证")
+    parser.add_argument("src", nargs="+", help="汇编源文件 (.asm / .s)")
+    parser.add_argument("--passes", default="peephole",
+                        help=f"逗号分隔的 pass 列表（可用: {', '.join(PASSES)}）")
+    parser.add_argument("--unroll", type=int, default=None, metavar="N",
+                        help="追加 unroll=N（计数内层循环展开 N 份）")
+    parser.add_argument("--profile-layout", action="store_true",
+                        help="先按 --passes 汇编并用 ISS 取边计数 profile，再追加 layout 重排基本块；"
+                             "逐文件报告 layout 本身节省的周期")
+    parser.add_argument("--rodata", default=None)
+    parser.add_argument("--stack",  default=None)
+    parser.add_argument("--write", action="store_true",
+                        help="验证通过后写 <stem>.listing / <stem>.vh（优化后）")
+    args = parser.parse_args(argv)
+
+    rodata_base = int(args.rodata, 16) if args.rodata else DEFAULT_RODATA_BASE
+    stack_top   = int(args.stack,  16) if args.stack  else DEFAULT_STACK_TOP
+    if args.unroll:
+        args.passes += f",unroll={args.unroll}"
+    bad, gains = 0, []
+    for src in args.src:
+        with open(src, encoding="utf-8", errors="replace") as f:
+            raw = f.readlines()
+        if args.profile_layout:
+            c = compare_layout(raw, args.passes, os.path.basename(src), rodata_base, stack_top)
+            gains.append((src, c["layout_cycles"]))
+        else:
+            c = compare(raw, args.passes, os.path.basename(src), rodata_base, stack_top)
+        ok = print_compare(c, src)         # None：无法验证（不计失败，也不写出）
+        bad += ok is False
+        if ok and args.write:
+            stem = os.path.splitext(src)[0]
+            write_listing(c["opt"], stem + ".listing")
+            write_vh(c["opt"], stem + ".vh")
+            print(f"[输出] {stem}.listing")
+            print(f"[输出] {stem}.vh")
+    if gains:
+        print(f"[LAYOUT] 只计 layout 的动态周期（--passes {args.passes or '无'} 之后）")
+        for src, (a, b) in gains:
+            print(f"  {src:<36} {a:>7} → {b:>7}  {a - b:>+6d}  ({100.0 * (a - b) / a if a else 0:.1f}%)")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+rv32i_policy.py  —  NOP 填充策略插件 + 同输入对比基准
+=============================================================================
+四份汇编器（rv32i_asm / rv32i_asm_improved / netfpga/sw 下的两份）只在“指令后补几个 NOP”
+上有本质区别。现在共用 rv32i_asm_improved 的前端 / 编码 / writer，填充策略按名字选择：
+
+  policy(instructions, labels_by_idx) → (instructions, labels_by_idx, nops_after, haz_info)
+
+  fixed      每条指令后固定 2 个 NOP（含最后一条，与原 rv32i_asm.py 的镜像相同）
+  raw        compute_nops 的两遍贪心（默认；rv32i_asm_improved 不导入本模块直接走快路径）
+  optimal    同一组约束下 NOP 总数最少（逐条 DP，状态为上一条后的 NOP 数）
+               dist-1：nops[i] ≥ 2      dist-2：nops[i] + nops[i+1] ≥ 1
+             贪心在 dist-2 链上会多放：i→i+2 与 i+1→i+3 同时存在时，一个 NOP 放在 i+1 之后即可；
+             总数与贪心相同时沿用贪心结果（镜像不变）
+  scheduled  先对每个基本块做列表调度（rv32i_opt._schedule_range，slot 不减少的块不动），
+             再按 optimal 填充
+  barrel     N 线程 barrel 核（part2：4 线程轮转，无冲刷）：同一线程相邻两条指令间隔 N 个周期，
+             约束变为 (距离 + NOP) × N ≥ 3；N ≥ 3 时不需要任何 NOP。barrel=2 可指定线程数
+
+  带参数的写法与 rv32i_opt 的 pass 相同：--nops barrel=2
+
+【对比基准】
+  对同一源文件按各策略汇编，ISS（rv32i_sim.run，barrel 以 threads=N 计时）运行，报告
+  insts / NOPs / slots / cycles，barrel 另给出每个程序摊到的周期（cycles / N）；
+  以 raw 的最终状态为参照检查等价性（ra 保存代码地址，不参与比较），并要求没有 stale read。
+
+【命令行】
+  python rv32i_policy.py  risc/*.s                          # 全部策略
+  python rv32i_policy.py  risc/*.s --policies raw,optimal,barrel=2 --json out.json
+  python rv32i_asm_improved.py  source.s --nops optimal     # 按某个策略汇编
+  python rv32i_sim.py  source.s --nops barrel               # ISS（自动按 4 线程计时）
+"""
+
+import os, sys
+
+from rv32i_asm_improved import (
+    ABI_NAME, DEFAULT_RODATA_BASE, DEFAULT_STACK_TOP,
+    get_dest, get_sources, compute_nops, assemble_lines, image_words,
+)
+
+WB_LAT         = 3        # 写回到可读的 ID 周期间距（同 rv32i_sim.WB_LAT）
+BARREL_THREADS = 4        # part2/src/design.v 的线程数
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  约束与 DP
+# ─────────────────────────────────────────────────────────────────────────────
+def _hazards(insts):
+    """返回 (d1, d2)：d1[i] / d2[i] 为 i→i+1 / i→i+2 的 RAW 寄存器（无则 None）"""
+    N = len(insts)
+    rd = [get_dest(it[0], it[1]) for it in insts]
+    rs = [get_sources(it[0], it[1]) for it in insts]
+    d1 = [rd[i] if i + 1 < N and rd[i] is not None and rd[i] in rs[i + 1] else None
+          for i in range(N)]
+    d2 = [rd[i] if i + 2 < N and rd[i] is not None and rd[i] in rs[i + 2] else None
+          for i in range(N)]
+    return d1, d2
+
+def _haz_str(rd, dist, n):
+    return f"RAW {ABI_NAME.get(rd, f'x{rd}')} (dist-{dist}, +{n} NOP)"
+
+def min_nops(insts, need=WB_LAT):
+    """
+    在 dist-1 / dist-2 约束下使 NOP 总数最少：
+      dist-1：1 + nops[i] ≥ need           dist-2：2 + nops[i] + nops[i+1] ≥ need
+    need = ceil(WB_LAT / 线程数)；最后一条指令（HALT）后不放 NOP。返回 (nops, haz)。
+    """
+    N = len(insts)
+    d1, d2 = _hazards(insts)
+    a1, a2 = need - 1, need - 2
+    vals = range(max(a1, 0) + 1)
+    INF = float("inf")
+    # cost[v]：处理到 i、nops[i] = v 时的最小总数；back[i][v]：nops[i-1]
+    cost = {0: 0}
+    back = []
+    for i in range(N):
+        lo = a1 if d1[i] is not None else 0
+        hi = 0 if i == N - 1 else max(a1, 0)
+        new, bk = {}, {}
+        for v in vals:
+            if not lo <= v <= hi: continue
+            best, arg = INF, None
+            for p, c in cost.items():
+                if i > 0 and d2[i - 1] is not None and p + v < a2: continue
+                if c + v < best: best, arg = c + v, p
+            if arg is not None:
+                new[v], bk[v] = best, arg
+        cost = new
+        back.append(bk)
+    v = min(cost, key=cost.get)
+    nops = [0] * N
+    for i in range(N - 1, -1, -1):
+        nops[i] = v
+        v = back[i][v]
+
+    haz = [''] * N
+    for i in range(N):
+        if d1[i] is not None and nops[i]:
+            haz[i] = _haz_str(d1[i], 1, nops[i])
+        elif nops[i]:
+            if d2[i] is not None:
+                haz[i] = _haz_str(d2[i], 2, nops[i])
+            elif i > 0 and d2[i - 1] is not None:
+                haz[i] = _haz_str(d2[i - 1], 2, nops[i])
+    return nops, haz
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  策略
+# ─────────────────────────────────────────────────────────────────────────────
+def fixed(instructions, labels_by_idx):
+    N = len(instructions)
+    return instructions, labels_by_idx, [2] * N, [''] * N
+
+def raw(instructions, labels_by_idx):
+    nops, haz = compute_nops(instructions)
+    return instructions, labels_by_idx, nops, haz
+
+def optimal(instructions, labels_by_idx):
+    greedy, ghaz = compute_nops(instructions)
+    nops, haz = min_nops(instructions)
+    if sum(nops) == sum(greedy):
+        nops, haz = greedy, ghaz
+    return instructions, labels_by_idx, nops, haz
+
+def scheduled(instructions, labels_by_idx):
+    from rv32i_opt import to_linear, from_linear, _schedule_range
+    lin = to_linear(instructions, labels_by_idx)
+    _schedule_range(lin, 0, len(lin))
+    return optimal(*from_linear(lin))
+
+def barrel(instructions, labels_by_idx, threads=BARREL_THREADS):
+    threads = int(threads)
+    if threads < 1:
+        raise ValueError(f"barrel 线程数须 ≥ 1: {threads}")
+    nops, haz = min_nops(instructions, need=-(-WB_LAT // threads))
+    return instructions, labels_by_idx, nops, haz
+
+POLICIES = {
+    "fixed":     fixed,
+    "raw":       raw,
+    "optimal":   optimal,
+    "scheduled": scheduled,
+    "barrel":    barrel,
+}
+
+def get_policy(spec):
+    """'optimal' / 'barrel=2' → 策略函数"""
+    name, _, arg = spec.partition("=")
+    if name not in POLICIES:
+        raise ValueError(f"未知 NOP 策略: {name!r}（可用: {', '.join(POLICIES)}）")
+    if not arg:
+        return POLICIES[name]
+    if name != "barrel":
+        raise ValueError(f"NOP 策略 {name!r} 不接受参数")
+    return lambda insts, lbi: barrel(insts, lbi, int(arg, 0))
+
+def policy_threads(spec):
+    """按该策略的镜像在 ISS 中计时用的线程数（barrel 为 N，其余为 1）"""
+    name, _, arg = spec.partition("=")
+    if name != "barrel":
+        return 1
+    return int(arg, 0) if arg else BARREL_THREADS
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  对比基准
+# ─────────────────────────────────────────────────────────────────────────────
+def compare(raw_lines, src_name="<memory>", policies=tuple(POLICIES),
+            rodata_base=DEFAULT_RODATA_BASE, stack_top=DEFAULT_STACK_TOP, max_cycles=1_000_000):
+    """各策略汇编 + ISS；返回 {policy: row}，row 含 slots / cycles / verify 等"""
+    from rv32i_sim import run, dmem_from_image, diff_state
+    ref = None
+    rows = {}
+    for p in ["raw"] + [p for p in policies if p != "raw"]:
+        img = assemble_lines(raw_lines, src_name, rodata_base=rodata_base, stack_top=stack_top,
+                             policy=p)
+        if img is None:
+            raise ValueError("没有找到任何指令")
+        th = policy_threads(p)
+        st = run(image_words(img), dmem_from_image(img), max_cycles=max_cycles, threads=th)
+        if ref is None:
+            ref = st
+        diffs = diff_state(ref, st, ignore_regs=(1,))
+        if not st["halted"]:
+            verify = "UNVERIFIED"
+        elif diffs or st["stale"]:
+            verify = "FAIL"
+        else:
+            verify = "PASS"
+        rows[p] = {"insts": img["n_insts"], "nops": img["total_nops"],
+                   "slots": img["total_slots"], "threads": th, "cycles": st["cycles"],
+                   "cycles_per_prog": round(st["cycles"] / th, 2),
+                   "stale": len(st["stale"]), "verify": verify,
+                   "diffs": diffs[:5]}
+    return {p: rows[p] for p in policies}
+
+def print_compare(rows, name):
+    print(f"[POLICY] {name}")
+    print(f"  {'policy':<11} {'insts':>6} {'NOPs':>6} {'slots':>6} {'thr':>4}"
+          f" {'cycles':>8} {'cyc/prog':>9}  verify")
+    for p, r in rows.items():
+        why = "" if r["verify"] == "PASS" else \
+            "  " + "; ".join(r["diffs"] + [f"stale={r['stale']}"])
+        print(f"  {p:<11} {r['insts']:>6} {r['nops']:>6} {r['slots']:>6} {r['threads']:>4}"
+              f" {r['cycles']:>8} {r['cycles_per_prog']:>9}  {r['verify']}{why}")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    import json, argparse
+    parser = argparse.ArgumentParser(description="RV32I NOP 填充策略对比（slots / ISS 周期）")
+    parser.add_argument("src", nargs="+", help="汇编源文件 (.asm / .s)")
+    parser.add_argument("--policies", default=",".join(POLICIES),
+                        help="逗号分隔的策略列表（barrel=N 指定线程数）")
+    parser.add_argument("--max-cycles", type=int, default=1_000_000)
+    parser.add_argument("--json", default=None, metavar="PATH", help="把结果写成 JSON")
+    args = parser.parse_args(argv)
+
+    policies = [p for p in args.policies.split(",") if p]
+    for p in policies:
+        try:
+            get_policy(p)
+        except ValueError as e:
+            parser.error(str(e))
+
+    rc, out, tot = 0, {}, {p: [0, 0.0] for p in policies}
+    for src in args.src:
+        with open(src, encoding="utf-8", errors="replace") as f:
+            raw_lines = f.readlines()
+        rows = compare(raw_lines, os.path.basename(src), policies, max_cycles=args.max_cycles)
+        print_compare(rows, src)
+        out[src] = rows
+        for p, r in rows.items():
+            tot[p][0] += r["slots"]; tot[p][1] += r["cycles_per_prog"]
+            if r["verify"] == "FAIL":
+                rc = 1
+    if len(args.src) > 1:
+        print("[POLICY] total  " + "  ".join(
+            f"{p}: {s} slots / {c:g} cyc" for p, (s, c) in tot.items()))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+        print(f"[输出] {args.json}")
+    return rc
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+rv32i_server.py  —  常驻汇编服务（Unix socket）+ 瘦客户端
+=============================================================================
+Makefile 式流程每个文件启动一次解释器：Python 启动、re 编译、INST 表构建
+每次都要付出。这里让一个常驻进程持有已导入的 rv32i_asm_improved，
+客户端只发送源码文本、接收 listing / vh 文本（"hex": true 时另带板级流程用的 imem / dmem）。
+
+  协议：每个连接一条请求、一条响应，均为一行 JSON
+    请求  {"op": "assemble", "src_name": ..., "text": ..., "rodata": int, "stack": int, "hex": bool,
+           "policy": str}
+          {"op": "ping"} / {"op": "shutdown"}
+    响应  {"ok": true,  "result": {...}, "files": {"listing": str, "vh": str[, "imem": str, "dmem": str]},
+           "server_ms": f}
+          {"ok": false, "error": "..."}
+  "policy" 为 NOP 填充策略名（同 rv32i_asm_improved.py --nops，缺省 raw）。
+  单个连接出错（客户端中途断开、CONN_TIMEOUT 秒内没发完请求、请求不是 JSON 对象）只影响该连接，
+  服务继续运行。
+
+  socket 路径：--sock 或环境变量 RV32I_ASM_SOCK，默认 /tmp/rv32i_asm-<uid>.sock
+  客户端连不上服务时自动回退到进程内汇编，输出完全相同。
+
+【命令行】
+  python rv32i_server.py serve &                       # 启动常驻服务
+  python rv32i_server.py asm  bubble_gcc.s [--rodata 0x400] [--stack 0x300]
+  python rv32i_server.py asm  bubble_sort.s --nops fixed   # 与 rv32i_asm.py 相同的输出
+  python rv32i_server.py asm  bubble_sort.s --imem imem.hex --dmem dmem.hex   # 另写 run_hw.sh 用的 hex
+  python rv32i_server.py bench bubble_gcc.s -n 50      # 服务 vs 每次新进程 的单次延迟
+  python rv32i_server.py stop
+"""
+
+import os, sys, json, time, socket, argparse
+
+DEFAULT_SOCK = os.environ.get("RV32I_ASM_SOCK",
+                              f"/tmp/rv32i_asm-{os.getuid()}.sock")
+CONN_TIMEOUT = 10.0     # 服务端每个连接的收发超时（秒）
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  汇编一次：源码文本 → {result, files}（服务端与回退路径共用）
+#    客户端只在回退时才导入汇编器，保持瘦客户端启动开销最小
+# ─────────────────────────────────────────────────────────────────────────────
+def render(text, src_name, rodata_base=None, stack_top=None, with_hex=False, policy=None):
+    import tempfile
+    import rv32i_asm_improved as asm
+    rodata_base = asm.DEFAULT_RODATA_BASE if rodata_base is None else rodata_base
+    stack_top   = asm.DEFAULT_STACK_TOP   if stack_top   is None else stack_top
+    img = asm.assemble_lines(text.splitlines(True), src_name,
+                             rodata_base=rodata_base, stack_top=stack_top,
+                             policy=policy or "raw")
+    if img is None:
+        raise ValueError("没有找到任何指令")
+    files = {}
+    with tempfile.TemporaryDirectory() as td:
+        for ext, writer in (("listing", asm.write_listing), ("vh", asm.write_vh)):
+            p = os.path.join(td, ext)
+            writer(img, p)
+            with open(p, encoding="utf-8") as f:
+                files[ext] = f.read()
+        if with_hex:
+            paths = {ext: os.path.join(td, ext) for ext in ("imem", "dmem")}
+            asm.write_hex(img, paths["imem"], paths["dmem"])
+            for ext, p in paths.items():
+                with open(p, encoding="utf-8") as f:
+                    files[ext] = f.read()
+    return {"result": asm.image_result(img), "files": files}
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  服务端
+# ─────────────────────────────────────────────────────────────────────────────
+def _recv_line(conn):
+    buf = bytearray()
+    while not buf.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk: break
+        buf += chunk
+    return bytes(buf)
+
+def _handle(req):
+    if not isinstance(req, dict):
+        return {"ok": False, "error": f"request must be a JSON object, got {type(req).__name__}"}
+    op = req.get("op")
+    if op == "ping":
+        return {"ok": True, "pid": os.getpid()}
+    if op != "assemble":
+        return {"ok": False, "error": f"unknown op {op!r}"}
+    t0 = time.perf_counter()
+    try:
+        resp = render(req["text"], req.get("src_name", "<memory>"),
+                      req.get("rodata"), req.get("stack"), bool(req.get("hex")),
+                      req.get("policy"))
+        resp["ok"] = True
+    except Exception as e:
+        resp = {"ok": False, "error": f"{type(e).__name__}: {str(e).strip()}"}
+    resp["server_ms"] = round((time.perf_counter() - t0) * 1e3, 3)
+    return resp
+
+def serve(sock_path=DEFAULT_SOCK):
+    import rv32i_asm_improved     # 预热：导入 + 表构建只做一次
+    if os.path.exists(sock_path):
+        try:                    # 已有服务在运行则退出；否则清理残留 socket 文件
+            request({"op": "ping"}, sock_path, timeout=0.5)
+            print(f"[SERVER] already running on {sock_path}")
+            return 1
+        except OSError:
+            os.remove(sock_path)
+    srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    srv.bind(sock_path)
+    os.chmod(sock_path, 0o600)
+    srv.listen(16)
+    print(f"[SERVER] pid {os.getpid()} listening on {sock_path}", flush=True)
+    n = 0
+    try:
+        while True:
+            conn, _ = srv.accept()
+            with conn:
+                try:
+                    conn.settimeout(CONN_TIMEOUT)
+                    try:
+                        req = json.loads(_recv_line(conn) or b"{}")
+                    except ValueError:
+                        req = {"op": None}
+                    if isinstance(req, dict) and req.get("op") == "shutdown":
+                        conn.sendall(b'{"ok": true}\n')
+                        break
+                    conn.sendall(json.dumps(_handle(req)).encode("utf-8") + b"\n")
+                    n += 1
+                except Exception as e:    # 客户端断开 / 超时 / 畸形请求：只丢弃该连接
+                    print(f"[SERVER] dropped connection: {type(e).__name__}: {e}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.close()
+        if os.path.exists(sock_path):
+            os.remove(sock_path)
+    print(f"[SERVER] stopped after {n} requests")
+    return 0
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  客户端
+# ─────────────────────────────────────────────────────────────────────────────
+def request(req, sock_path=DEFAULT_SOCK, timeout=30.0):
+    """发送一条请求并返回响应 dict；服务不存在时抛 OSError"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(sock_path)
+        s.sendall(json.dumps(req).encode("utf-8") + b"\n")
+        data = _recv_line(s)
+    if not data:
+        raise ConnectionError("server closed connection")
+    return json.loads(data)
+
+def assemble_file(src_path, rodata_base=None, stack_top=None, sock_path=DEFAULT_SOCK,
+                  imem=None, dmem=None, policy=None):
+    """
+    汇编 src_path，写 <stem>.listing / <stem>.vh；给了 imem / dmem 时另写这两个 hex 文件。
+    返回 (resp, via, ms)；via 为 'server' 或 'local'，ms 为本次调用延迟。
+    """
+    t0 = time.perf_counter()
+    with open(src_path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    src_name = os.path.basename(src_path)
+    try:
+        resp = request({"op": "assemble", "src_name": src_name, "text": text,
+                        "rodata": rodata_base, "stack": stack_top,
+                        "hex": bool(imem and dmem), "policy": policy}, sock_path)
+        via = "server"
+    except OSError:
+        via = "local"
+        try:
+            resp = render(text, src_name, rodata_base, stack_top, bool(imem and dmem), policy)
+            resp["ok"] = True
+        except Exception as e:
+            resp = {"ok": False, "error": f"{type(e).__name__}: {str(e).strip()}"}
+    if resp.get("ok"):
+        stem = os.path.splitext(src_path)[0]
+        dest = {"imem": imem, "dmem": dmem}
+        for ext, body in resp["files"].items():
+            path = dest.get(ext) or f"{stem}.{ext}"
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(body)
+            os.replace(tmp, path)
+    return resp, via, (time.perf_counter() - t0) * 1e3
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  延迟对比：服务调用 vs 每次新起解释器
+# ─────────────────────────────────────────────────────────────────────────────
+def bench(src_path, n, sock_path=DEFAULT_SOCK):
+    import subprocess, statistics
+    asm_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rv32i_asm_improved.py")
+
+    def stats(ms):
+        ms = sorted(ms)
+        p90 = ms[min(len(ms) - 1, int(len(ms) * 0.9))]
+        return (f"median {statistics.median(ms):8.2f} ms  p90 {p90:8.2f} ms"
+                f"  min {ms[0]:8.2f} ms")
+
+    srv_ms = []
+    for _ in range(n):
+        resp, via, ms = assemble_file(src_path, sock_path=sock_path)
+        if via != "server":
+            print("[BENCH] server not running — start it with: python rv32i_server.py serve &")
+            return 1
+        srv_ms.append(ms)
+    def spawn(cmd):
+        out = []
+        for _ in range(max(1, n // 5)):
+            t0 = time.perf_counter()
+            subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
+            out.append((time.perf_counter() - t0) * 1e3)
+        return out
+
+    client_ms = spawn([sys.executable, os.path.abspath(__file__), "--sock", sock_path,
+                       "asm", src_path])
+    cold_ms   = spawn([sys.executable, asm_py, src_path])
+    print(f"[BENCH] {os.path.basename(src_path)}")
+    print(f"  server call     ×{len(srv_ms):<4} {stats(srv_ms)}")
+    print(f"  client process  ×{len(client_ms):<4} {stats(client_ms)}")
+    print(f"  full process    ×{len(cold_ms):<4} {stats(cold_ms)}")
+    return 0
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RV32I 常驻汇编服务 / 客户端")
+    parser.add_argument("--sock", default=DEFAULT_SOCK, help=f"socket 路径（默认 {DEFAULT_SOCK}）")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("serve", help="启动常驻服务（前台）")
+    sub.add_parser("stop",  help="停止服务")
+    p = sub.add_parser("asm", help="汇编（服务不在时回退为进程内汇编）")
+    p.add_argument("src")
+    p.add_argument("--rodata", default=None)
+    p.add_argument("--stack",  default=None)
+    p.add_argument("--imem",   default=None, help="另写 imem.hex（run_hw.sh 格式，需同时给 --dmem）")
+    p.add_argument("--dmem",   default=None, help="另写 dmem.hex（run_hw.sh 格式）")
+    p.add_argument("--nops",   default=None, metavar="POLICY",
+                   help="NOP 填充策略（同 rv32i_asm_improved.py --nops，默认 raw）")
+    p = sub.add_parser("bench", help="单次调用延迟对比")
+    p.add_argument("src")
+    p.add_argument("-n", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "serve":
+        return serve(args.sock)
+    if args.cmd == "stop":
+        try:
+            request({"op": "shutdown"}, args.sock, timeout=2.0)
+            print("[SERVER] stopped")
+        except OSError:
+            print("[SERVER] not running")
+        return 0
+    if args.cmd == "bench":
+        return bench(args.src, args.n, args.sock)
+
+    resp, via, ms = assemble_file(args.src,
+                                  int(args.rodata, 16) if args.rodata else None,
+                                  int(args.stack, 16) if args.stack else None,
+                                  args.sock, args.imem, args.dmem, args.nops)
+    if not resp.get("ok"):
+        print(f"[ERROR] {resp['error']}", file=sys.stderr)
+        return 1
+    stem = os.path.splitext(args.src)[0]
+    r = resp["result"]
+    print(f"[输出] {stem}.listing  ({r['total_slots']} slots, HALT @ {r['halt_byte_pc']})")
+    print(f"[输出] {stem}.vh")
+    if args.imem and args.dmem:
+        print(f"[输出] {args.imem}")
+        print(f"[输出] {args.dmem}")
+    print(f"[ASM] via {via}  {ms:.2f} ms"
+          + (f"  (server {resp['server_ms']:.2f} ms)" if via == "server" else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
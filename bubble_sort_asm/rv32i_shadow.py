@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+rv32i_shadow.py  —  分支影子槽模式（实验性）：填槽 + ISS 对比 + RTL 回归输入
+=============================================================================
+基线流水线在 ID 解析分支：跳转时 IF 已取到的下一个 slot 被 wist 冲刷，白白浪费一个周期。
+影子槽模式下该 slot 照常执行（相当于 MIPS 的延迟槽），需要汇编器与 RTL 同时打开：
+
+  RTL  : pipeline_datapath #(.BRANCH_SHADOW(1))  —— if_id_reg 的 wist 恒为 0，
+         jal / jalr 的链接值改为 PC+8（返回时跳过调用者的影子槽）
+  汇编 : rv32i_asm_improved.py --shadow  —— 每条 B / jal / jalr（以及不在末尾的 HALT）后面
+         紧跟一个影子槽，两条路径都会执行它
+  ISS  : rv32i_sim.run(..., shadow=True)
+
+【填槽】（优先级从高到低）
+  hoist  : 同一基本块内、分支之前的独立指令挪进影子槽
+           （不写分支 / 中间指令读写的寄存器，不读它们写的寄存器，访存不越过其它访存，
+             不是 auipc / 控制转移；有目标寄存器时跳转目标的前两条指令不能读它）
+  target : 复制跳转目标块的第一条指令，分支改跳到它之后的新标签 <L>_sh
+           （条件分支要求：不是 store，目标寄存器在落空路径入口不活跃；
+             目标块后续指令读它时在 <L>_sh 处补显式 NOP，只在原填充本来就够时才这样做）
+  fall   : 条件分支的落空路径第一条指令提到影子槽（目标寄存器在跳转目标入口不活跃）
+  nop    : 都不行时填 NOP
+  填完后用 compute_nops 对跳转路径做精确检查：影子槽的结果在跳转目标前 4 个周期内被读到的，
+  逐个降级（hoist / fall 退回原位，target 改填 NOP），直到没有冲突。
+  NOP 插入仍由 compute_nops 完成；原本落在分支之后的填充挪到影子槽之后（影子槽必须紧跟分支）。
+
+【命令行】
+  python rv32i_shadow.py  risc/*.s                      # 填槽统计 + ISS 周期对比 + 等价性
+  python rv32i_shadow.py  risc/*.s --opt promote        # 先跑 rv32i_opt pass
+  python rv32i_shadow.py  risc/*.s --emit out/          # 写 RTL 回归输入（sim/shadow_regress.sh 使用）
+  python rv32i_shadow.py  --check-rtl out/              # 比较 Icarus 结果与 ISS 预期
+"""
+
+import os, sys, json, argparse
+
+from rv32i_asm_improved import (
+    INST, DEFAULT_RODATA_BASE, DEFAULT_STACK_TOP, DCACHE_WORDS,
+    get_dest, get_sources, compute_nops, assemble_lines, image_words,
+)
+from rv32i_opt import (
+    ALL_REGS, is_label, mk, to_linear, from_linear, is_ctrl, branch_target, liveness,
+    slot_count, _live_in,
+)
+
+NOP     = ("addi", "x0,x0,0", "nop", "")
+_LOADS  = ("lw", "lh", "lb", "lhu", "lbu")
+_STORES = ("sw", "sh", "sb")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  填槽条件
+# ─────────────────────────────────────────────────────────────────────────────
+def _movable(it):
+    """可以放进影子槽的指令：非控制转移、结果与自身 PC 无关"""
+    return (not is_label(it) and not is_ctrl(it) and it[0] in INST
+            and it[0] != "auipc" and INST[it[0]][0] != "SYS")
+
+def _independent(c, after):
+    """c 挪到 after（中间指令 + 分支）之后语义不变"""
+    d, srcs = get_dest(c[0], c[1]), get_sources(c[0], c[1])
+    mem = c[0] in _LOADS or c[0] in _STORES
+    for x in after:
+        xd = get_dest(x[0], x[1])
+        if d and (d in get_sources(x[0], x[1]) or d == xd): return False
+        if xd and xd in srcs: return False
+        if mem and (x[0] in _STORES or (c[0] in _STORES and x[0] in _LOADS)): return False
+    return True
+
+def _first_insts(lin, label_pos, label, n=2):
+    """label 之后的前 n 条指令（lin 下标）"""
+    out, k = [], label_pos.get(label)
+    if k is None: return None
+    for k in range(k + 1, len(lin)):
+        if not is_label(lin[k]):
+            out.append(k)
+            if len(out) == n: break
+    return out
+
+def _taken_ok(c, br, lin, label_pos, label=None):
+    """影子槽 c 之后紧接跳转路径：目标的前两条指令不能读 c 的结果（目标未知时 c 不能写寄存器）"""
+    d = get_dest(c[0], c[1])
+    if d is None: return True
+    label = label or branch_target(br)
+    first = _first_insts(lin, label_pos, label) if label else None
+    if first is None: return False
+    return all(d not in get_sources(lin[k][0], lin[k][1]) for k in first)
+
+def _label_pos(lin):
+    return {it[1]: k for k, it in enumerate(lin) if is_label(it)}
+
+def _retarget(br, label):
+    emn, eargs = br[0], br[1]
+    return mk(emn, f"{eargs.rsplit(',', 1)[0]},{label}")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  填槽（汇编器 --shadow 在 opt 之后、compute_nops 之前调用）
+# ─────────────────────────────────────────────────────────────────────────────
+def _entry_live(lin, live, k):
+    """lin[k] 起第一条指令入口处的活跃寄存器位图（没有指令时视为全部活跃）"""
+    nxt = next((j for j in range(k, len(lin)) if not is_label(lin[j])), None)
+    return _live_in(lin[nxt], live[nxt]) if nxt is not None else sum(1 << r for r in ALL_REGS)
+
+def _shift(slots, at, delta):
+    for s in slots:
+        if s[0] >= at: s[0] += delta
+
+def _hoist(lin, orig_pos):
+    """
+    分支之前的独立指令挪进影子槽，其余先填 NOP。
+    返回 (out, slots)，slots 元素 [影子槽在 out 中的下标, kind, 分支在 lin 中的下标]
+    """
+    last = max((k for k, it in enumerate(lin) if not is_label(it)), default=-1)
+    out, fixed, slots = [], [], []        # 控制转移与影子槽都是固定项，向前扫描到它们或标签为止
+    for k, it in enumerate(lin):
+        out.append(it); fixed.append(not is_label(it) and is_ctrl(it))
+        if not fixed[-1] or (it[0] == "_HALT" and k == last):
+            continue
+        lo = len(out) - 1
+        while lo > 0 and not fixed[lo - 1] and not is_label(out[lo - 1]):
+            lo -= 1
+        best, pick = slot_count(out[lo:] + [NOP]), None
+        if it[0] != "_HALT":
+            for j in range(len(out) - 2, lo - 1, -1):
+                c = out[j]
+                if not (_movable(c) and _independent(c, out[j + 1:])
+                        and (it[0] != "jalr" or get_dest(c[0], c[1]) is None)
+                        and _taken_ok(c, it, lin, orig_pos)):
+                    continue
+                cost = slot_count(out[lo:j] + out[j + 1:] + [c])
+                if cost < best or pick is None and cost == best:
+                    best, pick = cost, j
+        if pick is not None:
+            c = out.pop(pick); fixed.pop(pick)
+            out.append(c); fixed.append(True)
+            slots.append([len(out) - 1, "hoist", k])
+        else:
+            out.append(NOP); fixed.append(True)
+            slots.append([len(out) - 1, "nop", k])
+    return out, slots
+
+def _from_target(out, slots, ft_live):
+    """
+    仍是 NOP 的槽复制跳转目标的第一条指令 t0，分支改跳到 t0 之后的新标签 <L>_sh。
+    t0 的结果被紧随其后的指令读取时，把 t0 后本来就会插入的 NOP 显式化并放在新标签之后，
+    这样复制路径与原路径的 RAW 间距相同。
+    """
+    pos = _label_pos(out)
+    new_labels = {}                       # t0 的 out 下标 → (新标签, 显式 NOP 数)
+    for s in slots:
+        p, kind, k = s
+        br = out[p - 1]
+        label = branch_target(br)
+        if kind != "nop" or br[0] not in INST or label not in pos:
+            continue
+        first = _first_insts(out, pos, label, 3)
+        if not first or not _movable(out[first[0]]):
+            continue
+        t0 = out[first[0]]
+        d0 = get_dest(t0[0], t0[1])
+        link = get_dest(br[0], br[1])
+        if link and link in get_sources(t0[0], t0[1]):
+            continue
+        if INST[br[0]][0] == "B" and (t0[0] in _STORES or (d0 and ft_live[k] >> d0 & 1)):
+            continue
+        reads = [d0 is not None and d0 in get_sources(out[j][0], out[j][1]) for j in first[1:]]
+        gap = 2 if reads[:1] == [True] else 1 if True in reads else 0
+        if gap:
+            # 原路径上 t0 之后的 NOP 数（t0 前后各取两条指令的局部估计）
+            lo = [j for j in range(first[0] - 1, -1, -1) if not is_label(out[j])][:2]
+            win = [out[j] for j in reversed(lo)] + [out[j] for j in first]
+            if compute_nops(win)[0][len(lo)] < gap:
+                continue
+        sh, _ = new_labels.setdefault(first[0], (f"{label}_sh", gap))
+        out[p - 1] = _retarget(br, sh)
+        out[p] = t0
+        s[1] = "target"
+    # 新标签（及显式 NOP）插在 t0 之后；从后往前插，下标不失效
+    for j in sorted(new_labels, reverse=True):
+        sh, gap = new_labels[j]
+        out[j + 1:j + 1] = [('LABEL', sh)] + [NOP] * gap
+        _shift(slots, j + 1, 1 + gap)
+
+def _from_fallthrough(out, slots, tgt_live, pos):
+    """条件分支仍是 NOP 的槽：落空路径的第一条指令在跳转路径上无害时直接充当影子槽"""
+    for s in sorted(slots, key=lambda s: -s[0]):
+        p, kind, k = s
+        br = out[p - 1]
+        if kind != "nop" or br[0] not in INST or INST[br[0]][0] != "B" or p + 1 >= len(out):
+            continue
+        f = out[p + 1]
+        if not _movable(f) or f[0] in _STORES or any(t[0] == p + 1 for t in slots):
+            continue
+        d = get_dest(f[0], f[1])
+        if d and tgt_live[k] >> d & 1:
+            continue
+        if not _taken_ok(f, br, out, pos):
+            continue
+        out[p] = f
+        del out[p + 1]
+        _shift(slots, p + 1, -1)
+        s[1] = "fall"
+
+def _violations(out, slots):
+    """按实际 NOP 布局检查跳转路径：影子槽结果在目标处被读时间距须 ≥ 3 个周期"""
+    instructions, labels_by_idx = from_linear(out)
+    nops, haz = compute_nops(instructions)
+    fix_nops(instructions, nops, haz)
+    bad = []
+    for s in slots:
+        p, kind = s[0], s[1]
+        c, br = out[p], out[p - 1]
+        d = get_dest(c[0], c[1])
+        if kind == "nop" or d is None:
+            continue
+        j = labels_by_idx.get(branch_target(br))
+        if j is None:
+            bad.append(s); continue
+        t = 2                             # 分支在 0，影子槽在 1，目标在 2
+        while j < len(instructions) and t < 4:
+            if d in get_sources(instructions[j][0], instructions[j][1]):
+                bad.append(s); break
+            t += 1 + nops[j]; j += 1
+    return bad
+
+def fill(instructions, labels_by_idx, report=None):
+    """
+    每个控制转移之后插入影子槽并尽量填上有用指令；返回 (instructions, labels_by_idx)。
+    report 传入 dict 时写入 {"hoist": n, "target": n, "fall": n, "nop": n}。
+    """
+    lin = to_linear(instructions, labels_by_idx)
+    orig_pos = _label_pos(lin)
+    live = liveness(lin)
+    # 落空 / 跳转路径入口的活跃寄存器（原始 lin 上求；hoist 不改变语义，可以沿用）
+    ft_live, tgt_live = {}, {}
+    for k, it in enumerate(lin):
+        if is_label(it) or not is_ctrl(it): continue
+        ft_live[k] = _entry_live(lin, live, k + 1)
+        label = branch_target(it)
+        if label in orig_pos:
+            tgt_live[k] = _entry_live(lin, live, orig_pos[label])
+
+    out, slots = _hoist(lin, orig_pos)
+    _from_target(out, slots, ft_live)
+    _from_fallthrough(out, slots, tgt_live, _label_pos(out))
+
+    # 违例的槽退回：hoist 放回分支之前，target 恢复原目标，fall 重新补 NOP
+    while True:
+        bad = _violations(out, slots)
+        if not bad:
+            break
+        for s in sorted(bad, key=lambda s: -s[0]):
+            p, kind, k = s
+            if kind == "hoist":
+                out.insert(p - 1, out[p])
+                _shift(slots, p - 1, 1)
+                out[s[0]] = NOP
+            elif kind == "target":
+                out[p - 1] = _retarget(out[p - 1], branch_target(lin[k]))
+                out[p] = NOP
+            else:
+                out.insert(p, NOP)
+                _shift([t for t in slots if t is not s], p, 1)
+            s[1] = "nop"
+
+    if report is not None:
+        for kind in ("hoist", "target", "fall", "nop"):
+            report[kind] = sum(1 for s in slots if s[1] == kind)
+    return from_linear(out)
+
+def fix_nops(instructions, nops_after, haz_info):
+    """影子槽必须紧跟控制转移：分支之后的 NOP 挪到影子槽之后（原地修改）"""
+    for i in range(len(instructions) - 1):
+        if nops_after[i] and is_ctrl(instructions[i]):
+            nops_after[i + 1] = max(nops_after[i + 1], nops_after[i])
+            haz_info[i + 1] = haz_info[i + 1] or haz_info[i]
+            nops_after[i], haz_info[i] = 0, ''
+    return nops_after, haz_info
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  ISS 对比：基线镜像（冲刷）vs 影子槽镜像（shadow=True）
+# ─────────────────────────────────────────────────────────────────────────────
+def compare(raw, src_name="<memory>", opt=None, rodata_base=DEFAULT_RODATA_BASE,
+            stack_top=DEFAULT_STACK_TOP, max_cycles=1_000_000):
+    from rv32i_sim import run, dmem_from_image, diff_state
+    hook = None
+    if opt:
+        from rv32i_opt import make_hook
+        hook = make_hook(opt)
+    base = assemble_lines(raw, src_name, rodata_base=rodata_base, stack_top=stack_top, opt=hook)
+    shd  = assemble_lines(raw, src_name, rodata_base=rodata_base, stack_top=stack_top, opt=hook,
+                          shadow=True)
+    if base is None or shd is None:
+        raise ValueError("没有找到任何指令")
+    s0 = run(image_words(base), dmem_from_image(base), max_cycles=max_cycles)
+    s1 = run(image_words(shd), dmem_from_image(shd), max_cycles=max_cycles, shadow=True)
+    # ra 保存的是代码地址，两份镜像布局不同，不参与比较
+    return {"base": base, "shadow": shd, "sim_base": s0, "sim_shadow": s1,
+            "diffs": diff_state(s0, s1, ignore_regs=(1,))}
+
+def print_compare(c, name):
+    b, o, s0, s1 = c["base"], c["shadow"], c["sim_base"], c["sim_shadow"]
+    rep = o["shadow"]
+    ok = not c["diffs"] and not s1["stale"] and s1["halted"]
+    dc = s0["cycles"] - s1["cycles"]
+    print(f"[SHADOW] {name}")
+    print(f"  slots      hoist={rep['hoist']}  target={rep['target']}  fall={rep['fall']}"
+          f"  nop={rep['nop']}")
+    print(f"  {'':<10} {'insts':>7} {'NOPs':>7} {'slots':>7} {'cycles':>8}")
+    print(f"  {'flush':<10} {b['n_insts']:>7} {b['total_nops']:>7} {b['total_slots']:>7} {s0['cycles']:>8}")
+    print(f"  {'shadow':<10} {o['n_insts']:>7} {o['total_nops']:>7} {o['total_slots']:>7} {s1['cycles']:>8}")
+    print(f"  {'saved':<10} {'':>7} {'':>7} {b['total_slots'] - o['total_slots']:>7} {dc:>8}"
+          f"  ({100.0 * dc / s0['cycles'] if s0['cycles'] else 0:.1f}% cycles)")
+    why = "" if ok else "  " + "; ".join(c["diffs"][:5] + [f"stale={len(s1['stale'])}"])
+    if not s0["halted"] and not s1["halted"] and not s1["stale"]:
+        # 截止时刻两份镜像的执行进度不同，最终状态不可比
+        print("  verify     UNVERIFIED  (两份镜像都未在 max_cycles 内 HALT)")
+        return None
+    print(f"  verify     {'PASS' if ok else 'FAIL'}{why}")
+    return ok
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  RTL 回归输入 / 结果检查（sim/shadow_regress.sh）
+# ─────────────────────────────────────────────────────────────────────────────
+def _write_hex(path, words, n):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(f"{words[i] if i < len(words) else 0:08x}\n")
+
+def emit(c, out_dir, stem):
+    """
+    每种模式（flush / shadow）写：
+      <stem>.<mode>.imem.hex / .dmem.hex   $readmemh 输入
+      <stem>.<mode>.args                   tb_shadow.v 的 plusargs
+    <stem>.expect.json 记录 ISS 预期（Dcache / 寄存器终值、周期）
+    """
+    from rv32i_sim import dmem_from_image
+    expect = {"src": stem, "modes": {}}
+    for mode, img, st in (("flush", c["base"], c["sim_base"]),
+                          ("shadow", c["shadow"], c["sim_shadow"])):
+        p = os.path.abspath(os.path.join(out_dir, f"{stem}.{mode}"))
+        dm = dmem_from_image(img)
+        _write_hex(p + ".imem.hex", image_words(img), 512)
+        _write_hex(p + ".dmem.hex", [dm.get(i, 0) for i in range(DCACHE_WORDS)], DCACHE_WORDS)
+        with open(p + ".args", "w", encoding="utf-8") as f:
+            f.write(f"+imem={p}.imem.hex +dmem={p}.dmem.hex +halt={img['halt_byte_pc']}"
+                    f" +dump={p}.dump.hex +regs={p}.regs.hex +cycles={p}.cycles\n")
+        expect["modes"][mode] = {"cycles": st["cycles"], "mem": st["mem"], "regs": st["regs"]}
+    with open(os.path.join(out_dir, f"{stem}.expect.json"), "w", encoding="utf-8") as f:
+        json.dump(expect, f)
+
+def _read_hex(path):
+    with open(path, encoding="utf-8") as f:
+        return [int(t, 16) for line in f for t in [line.split("//")[0].strip()]
+                if t and not t.startswith("@")]
+
+def check_rtl(out_dir):
+    """
+    读 tb_shadow.v 写出的 <stem>.<mode>.dump.hex / .regs.hex / .cycles，与 ISS 预期比较，
+    并要求两种模式的 Dcache 终值相同；打印 RTL 实测节省的周期
+    """
+    bad = 0
+    for name in sorted(os.listdir(out_dir)):
+        if not name.endswith(".expect.json"): continue
+        stem = name[:-len(".expect.json")]
+        with open(os.path.join(out_dir, name), encoding="utf-8") as f:
+            expect = json.load(f)
+        got, errs = {}, []
+        for mode in ("flush", "shadow"):
+            p, exp = os.path.join(out_dir, f"{stem}.{mode}"), expect["modes"][mode]
+            try:
+                mem, regs = _read_hex(p + ".dump.hex"), _read_hex(p + ".regs.hex")
+                with open(p + ".cycles", encoding="utf-8") as f:
+                    cyc = int(f.read().split()[0])
+            except (OSError, ValueError, IndexError):
+                errs.append(f"{mode}: 无 RTL 结果（未 HALT？）")
+                continue
+            got[mode] = (mem, cyc)
+            if mem != exp["mem"]:
+                errs.append(f"{mode}: Dcache 与 ISS 不一致")
+            if regs[1:32] != exp["regs"][1:32]:
+                errs.append(f"{mode}: 寄存器与 ISS 不一致")
+            if cyc != exp["cycles"]:
+                errs.append(f"{mode}: cycles {cyc} ≠ ISS {exp['cycles']}")
+        if not errs and got["flush"][0] != got["shadow"][0]:
+            errs.append("flush / shadow Dcache 终值不同")
+        if errs:
+            bad += 1
+            print(f"  {stem:<28} FAIL  " + "; ".join(errs))
+        else:
+            c0, c1 = got["flush"][1], got["shadow"][1]
+            print(f"  {stem:<28} PASS  cycles {c0:>6} → {c1:>6}"
+                  f"  saved {c0 - c1:>5} ({100.0 * (c0 - c1) / c0 if c0 else 0:.1f}%)")
+    return 1 if bad else 0
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RV32I 分支影子槽模式：填槽 + ISS / RTL 验证")
+    parser.add_argument("src", nargs="*", help="汇编源文件 (.asm / .s)")
+    parser.add_argument("--opt", default=None, help="填槽前先跑的 rv32i_opt pass（逗号分隔）")
+    parser.add_argument("--emit", default=None, metavar="DIR",
+                        help="写 RTL 回归用的 imem/dmem hex 与 ISS 预期（sim/shadow_regress.sh）")
+    parser.add_argument("--check-rtl", default=None, metavar="DIR",
+                        help="比较 DIR 中 Icarus 的 Dcache 转储 / 周期与 ISS 预期")
+    args = parser.parse_args(argv)
+
+    if args.check_rtl:
+        return check_rtl(args.check_rtl)
+    if not args.src:
+        parser.error("需要源文件或 --check-rtl")
+    if args.emit:
+        os.makedirs(args.emit, exist_ok=True)
+    rc, tot = 0, [0, 0]
+    for src in args.src:
+        with open(src, encoding="utf-8", errors="replace") as f:
+            raw = f.readlines()
+        c = compare(raw, os.path.basename(src), args.opt)
+        if print_compare(c, src) is False:
+            rc = 1
+        tot[0] += c["sim_base"]["cycles"]; tot[1] += c["sim_shadow"]["cycles"]
+        if args.emit:
+            emit(c, args.emit, os.path.splitext(os.path.basename(src))[0])
+    if len(args.src) > 1:
+        print(f"[SHADOW] total cycles {tot[0]} → {tot[1]}  saved {tot[0] - tot[1]}")
+    return rc
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+rv32i_sim.py  —  按流水线时序建模的 RV32I 指令级模拟器（ISS）
+=============================================================================
+与 sim/*.v 的行为对齐，而不是与 RISC-V 规范对齐：
+
+  · 每个 slot 在 ID 周期 t 读寄存器；写回值在 t+3 才可见（WB 写穿透，无前递）
+    → 间距不足时读到旧值，与硬件一致；这类读计入 stale
+  · 分支 / jal / jalr 在 ID 解析；跳转时下一个 slot 被 wist 冲刷，目标在 t+2 进入 ID
+  · shadow=True 对应 RTL 参数 BRANCH_SHADOW=1：跳转后的下一个 slot 照常执行（延迟槽），
+    jal / jalr 的链接值为 PC+8（返回时跳过调用者的影子槽），见 rv32i_shadow.py
+  · threads=N 对应 part2 的 N 线程 barrel 核：同一线程相邻两条指令间隔 N 个周期，跳转不冲刷
+    （见 rv32i_policy.py 的 barrel 策略）；只模拟一个线程，Dcache 分 bank 不建模
+  · HALT（beq x0,x0,0）结束；jalr 跳回 byte PC 0（main 用 jr ra 返回复位地址）也视为结束
+  · Dcache 512 word，地址取 alu[10:2]；与 mm_stage 一致，lb/lh/sb/sh 都按整字访问
+  · PC 为 11 位字节地址
+
+  周期数 cycles = HALT 进入 ID 的周期（slot 0 在周期 0 进入 ID）。
+
+【用法】
+  from rv32i_sim import run, dmem_from_image
+  st = run(image_words(img), dmem_from_image(img))
+  st["cycles"], st["mem"][180:186], st["stale"]
+
+【命令行】
+  python rv32i_sim.py  sort_rv32i.s                    # 源文件：先用 rv32i_asm_improved 汇编
+  python rv32i_sim.py  imem.hex --dmem dmem.hex --dump 180:6
+  python rv32i_sim.py  sort_rv32i.s --opt promote --profile-out sort.prof.json   # 边计数 profile
+  python rv32i_sim.py  sort_rv32i.s --shadow                            # 分支影子槽模式
+  python rv32i_sim.py  sort_rv32i.s --nops barrel                      # 0 NOP 镜像，按 4 线程计时
+"""
+
+import os, sys, json, hashlib, argparse
+from bisect import bisect_left
+from collections import deque
+
+from rv32i_asm_improved import NOP_WORD, HALT_WORD, BYTES_PER_SLOT, ABI_NAME, DCACHE_WORDS
+from rv32i_disasm import decode_image
+
+MASK32  = 0xFFFFFFFF
+PC_MASK = 0x7FF         # 11 位字节 PC
+WB_LAT  = 3             # 写回到可读的 ID 周期间距
+
+def _s32(x):
+    return x - (1 << 32) if x & 0x80000000 else x
+
+def _alu(mn, a, b):
+    if mn in ("add", "addi"):   return (a + b) & MASK32
+    if mn == "sub":             return (a - b) & MASK32
+    if mn in ("xor", "xori"):   return a ^ b
+    if mn in ("or", "ori"):     return a | b
+    if mn in ("and", "andi"):   return a & b
+    if mn in ("sll", "slli"):   return (a << (b & 31)) & MASK32
+    if mn in ("srl", "srli"):   return a >> (b & 31)
+    if mn in ("sra", "srai"):   return (_s32(a) >> (b & 31)) & MASK32
+    if mn in ("slt", "slti"):   return int(_s32(a) < _s32(b))
+    if mn in ("sltu", "sltiu"): return int(a < b)
+    raise ValueError(f"ALU: 未知操作 {mn}")
+
+_BR = {
+    "beq":  lambda a, b: a == b,          "bne":  lambda a, b: a != b,
+    "blt":  lambda a, b: _s32(a) < _s32(b), "bge": lambda a, b: _s32(a) >= _s32(b),
+    "bltu": lambda a, b: a < b,           "bgeu": lambda a, b: a >= b,
+}
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  运行
+# ─────────────────────────────────────────────────────────────────────────────
+def run(words, dmem=None, regs=None, max_cycles=1_000_000, watch=None, stop_at_zero=True,
+        shadow=False, threads=1):
+    """
+    words : Icache word 列表（slot 0 起）
+    dmem  : 初始 Dcache（dict word_idx → value 或长度 512 的 list）
+    watch : 需要记录访存地址的 slot 集合（返回 accessed[slot] = {word_idx}）
+    shadow: 分支影子槽模式（跳转后的 slot 执行而不冲刷，链接值 PC+8）
+    threads: barrel 核的线程数（part2）：本线程每 threads 个周期发射一条，跳转不冲刷；
+            其余线程运行同一程序，周期数为全核周期（每个程序摊到 cycles / threads）
+
+    返回 dict：
+      regs, mem       最终寄存器 / Dcache
+      cycles, insts   周期数 / 执行的非 NOP slot 数
+      halted          是否遇到 HALT（False 表示超出 max_cycles 或 PC 越界）
+      stale           [(slot, reg)] 读到未写回旧值的次数明细
+      edges           {(from_slot, to_slot): count} 控制转移（分支跳转 / 不跳转、jal、jalr）
+      counts          每个 slot 进入 ID 的次数（含 NOP）
+      accessed        watch 中各 slot 访问过的 Dcache word 下标
+    """
+    if threads > 1 and shadow:
+        raise ValueError("shadow 与 barrel（threads > 1）不能同用")
+    n = len(words)
+    dec = decode_image(list(words))
+    R = [0] * 32 if regs is None else list(regs)
+    if isinstance(dmem, dict) or dmem is None:
+        M = [0] * DCACHE_WORDS
+        for k, v in (dmem or {}).items():
+            M[k % DCACHE_WORDS] = v & MASK32
+    else:
+        M = list(dmem) + [0] * (DCACHE_WORDS - len(dmem))
+
+    pending = deque()           # (ready_t, reg, value)
+    inflight = [0] * 32         # 每个寄存器未可见的写个数
+    stale, edges, accessed = [], {}, {}
+    counts = [0] * n
+    watch = set(watch or ())
+
+    def commit(t):
+        while pending and pending[0][0] <= t:
+            _, r, v = pending.popleft()
+            R[r] = v
+            inflight[r] -= 1
+
+    def rd_(t, s, r):
+        if r == 0: return 0
+        if inflight[r]:
+            stale.append((s, r))
+        return R[r]
+
+    def wr(t, r, v):
+        if r:
+            pending.append((t + WB_LAT, r, v & MASK32))
+            inflight[r] += 1
+
+    link = 2 * BYTES_PER_SLOT if shadow else BYTES_PER_SLOT
+    redirect = None             # shadow：影子槽执行完后的跳转目标 slot
+    t, s, insts, halted = 0, 0, 0, False
+    while t <= max_cycles:
+        if not 0 <= s < n:
+            break
+        w = words[s]
+        counts[s] += 1
+        commit(t)
+        if w == HALT_WORD:
+            halted = True
+            break
+        nxt, step = s + 1, 1
+        if w != NOP_WORD:
+            insts += 1
+            d = dec[s]
+            mn, f = d.mn, d.fmt
+            bpc = s * BYTES_PER_SLOT
+            if f == "R":
+                wr(t, d.rd, _alu(mn, rd_(t, s, d.rs1), rd_(t, s, d.rs2)))
+            elif f == "IS":
+                wr(t, d.rd, _alu(mn, rd_(t, s, d.rs1), d.imm))
+            elif f == "I" and mn == "jalr":
+                tgt = ((rd_(t, s, d.rs1) + d.imm) & ~3) & PC_MASK
+                wr(t, d.rd, bpc + link)
+                nxt, step = tgt // BYTES_PER_SLOT, 2
+                edges[(s, nxt)] = edges.get((s, nxt), 0) + 1
+                if tgt == 0 and stop_at_zero and not shadow:
+                    halted = True
+                    t += threads if threads > 1 else step
+                    break
+            elif f == "I" and mn in ("lw", "lh", "lb", "lhu", "lbu"):
+                a = (rd_(t, s, d.rs1) + d.imm) & MASK32
+                wi = (a >> 2) % DCACHE_WORDS
+                if s in watch: accessed.setdefault(s, set()).add(wi)
+                wr(t, d.rd, M[wi])
+            elif f == "I":
+                wr(t, d.rd, _alu(mn, rd_(t, s, d.rs1), d.imm & MASK32))
+            elif f == "S":
+                a = (rd_(t, s, d.rs1) + d.imm) & MASK32
+                wi = (a >> 2) % DCACHE_WORDS
+                if s in watch: accessed.setdefault(s, set()).add(wi)
+                M[wi] = rd_(t, s, d.rs2)
+            elif f == "B":
+                taken = _BR[mn](rd_(t, s, d.rs1), rd_(t, s, d.rs2))
+                if taken:
+                    nxt, step = s + d.imm // BYTES_PER_SLOT, 2
+                edges[(s, nxt)] = edges.get((s, nxt), 0) + 1
+            elif f == "J":
+                wr(t, d.rd, bpc + link)
+                nxt, step = s + d.imm // BYTES_PER_SLOT, 2
+                edges[(s, nxt)] = edges.get((s, nxt), 0) + 1
+            elif f == "U":
+                v = (d.imm << 12) & MASK32
+                wr(t, d.rd, v if mn == "lui" else (bpc + v) & MASK32)
+            else:
+                raise ValueError(f"slot {s}: 无法执行的字 0x{w:08X}")
+        if shadow:
+            # 本 slot 若跳转，目标排在影子槽之后；本 slot 自身是影子槽时先转向上一个目标
+            jump = nxt if step == 2 else None
+            nxt, step = (s + 1 if redirect is None else redirect), 1
+            if redirect == 0 and stop_at_zero:
+                halted = True
+                t += step
+                break
+            redirect = jump
+        if threads > 1:
+            step = threads          # barrel：轮到本线程时 ID 已解析上一条的跳转
+        s, t = nxt, t + step
+
+    commit(float("inf"))
+    return {"regs": R, "mem": M, "cycles": t, "insts": insts, "halted": halted,
+            "stale": stale, "edges": edges, "accessed": accessed, "counts": counts}
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  辅助
+# ─────────────────────────────────────────────────────────────────────────────
+def dmem_from_image(img):
+    """rv32i_asm_improved 镜像 dict → 初始 Dcache（rodata）"""
+    base = img["rodata_base"] // 4
+    return {base + i: v for i, v in enumerate(img["rodata_data"])}
+
+def fingerprint(pairs):
+    """指令序列 [(emn, eargs)] 的指纹：profile 只对同一指令序列有效"""
+    return hashlib.sha1("\n".join(f"{m} {a}" for m, a in pairs).encode()).hexdigest()[:16]
+
+def edge_profile(img, st):
+    """
+    run() 的结果 → 以指令下标（而非 slot）计的边计数 profile（rv32i_opt.layout 的输入）：
+      counts[i] 指令 i 的执行次数；taken[i] 指令 i 非顺序转移的次数；
+      edges [[from, to, n]]；fingerprint 为镜像指令序列的指纹
+    """
+    slots = [e[1] for e in img["encoded"]]
+    taken, edges = [0] * len(slots), {}
+    for (a, b), n in st["edges"].items():
+        i, j = bisect_left(slots, a), bisect_left(slots, b)     # NOP slot 归到其后的指令
+        edges[(i, j)] = edges.get((i, j), 0) + n
+        if b != a + 1:
+            taken[i] += n
+    return {"version": 1, "src": img["src_name"],
+            "fingerprint": fingerprint((e[5], e[6]) for e in img["encoded"]),
+            "insts": len(slots), "cycles": st["cycles"],
+            "counts": [st["counts"][s] for s in slots], "taken": taken,
+            "edges": sorted([i, j, n] for (i, j), n in edges.items())}
+
+def load_dmem(path, base_word=256):
+    """run_hw.sh 格式的 dmem.hex（逐行 word，或 'addr word'）→ dict"""
+    out, addr = {}, base_word
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#")[0].split("//")[0].strip()
+            if not line: continue
+            tok = line.split()
+            if len(tok) >= 2:
+                addr = int(tok[0], 16); tok = tok[1:]
+            out[addr] = int(tok[0].replace("_", ""), 16)
+            addr += 1
+    return out
+
+def diff_state(a, b, ignore_regs=(), ignore_words=()):
+    """比较两次运行的最终状态，返回差异描述列表（空表示等价）"""
+    out = []
+    if a["halted"] != b["halted"]:
+        out.append(f"halted {a['halted']} ≠ {b['halted']}")
+    ig = set(ignore_regs)
+    for r in range(1, 32):
+        if r not in ig and a["regs"][r] != b["regs"][r]:
+            out.append(f"{ABI_NAME[r]}: 0x{a['regs'][r]:08X} ≠ 0x{b['regs'][r]:08X}")
+    igw = set(ignore_words)
+    for i, (x, y) in enumerate(zip(a["mem"], b["mem"])):
+        if i not in igw and x != y:
+            out.append(f"Dcache[{i}]: 0x{x:08X} ≠ 0x{y:08X}")
+    return out
+
+def load_program(path, rodata_base=None, stack_top=None, opt=None, shadow=False, policy="raw"):
+    """源文件（.s/.asm）→ (words, dmem, img)；镜像文件 → (words, {}, None)
+    opt：汇编时使用的 rv32i_opt pass 列表（逗号分隔）；shadow：按分支影子槽模式汇编；
+    policy：NOP 填充策略（rv32i_policy.py）"""
+    if os.path.splitext(path)[1].lower() in (".s", ".asm"):
+        import rv32i_asm_improved as asm
+        hook = None
+        if opt:
+            from rv32i_opt import make_hook
+            hook = make_hook(opt)
+        with open(path, encoding="utf-8", errors="replace") as f:
+            img = asm.assemble_lines(f.readlines(), os.path.basename(path),
+                                     rodata_base=asm.DEFAULT_RODATA_BASE if rodata_base is None else rodata_base,
+                                     stack_top=asm.DEFAULT_STACK_TOP if stack_top is None else stack_top,
+                                     opt=hook, shadow=shadow, policy=policy)
+        if img is None:
+            raise ValueError(f"{path}: 没有找到任何指令")
+        return asm.image_words(img), dmem_from_image(img), img
+    from rv32i_disasm import load_image
+    return load_image(path), {}, None
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RV32I 流水线时序 ISS")
+    parser.add_argument("program", help="源文件 (.s/.asm) 或镜像 (.hex/.coe/.mif/.vh/.bin/.listing)")
+    parser.add_argument("--dmem", default=None, help="dmem.hex（run_hw.sh 格式）")
+    parser.add_argument("--dmem-base", type=int, default=256, help="dmem.hex 起始 word（默认 256）")
+    parser.add_argument("--dump", default="180:6", help="结束后打印的 Dcache 区间 BASE:LEN（word）")
+    parser.add_argument("--max-cycles", type=int, default=1_000_000)
+    parser.add_argument("--opt", default=None,
+                        help="源文件汇编时使用的 rv32i_opt pass（与之后 --profile-layout 汇编时一致）")
+    parser.add_argument("--shadow", action="store_true",
+                        help="分支影子槽模式（源文件按 --shadow 汇编；镜像须来自 --shadow 汇编）")
+    parser.add_argument("--nops", default="raw", metavar="POLICY",
+                        help="源文件汇编时的 NOP 填充策略（rv32i_policy.py，默认 raw）")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="barrel 线程数（默认：--nops barrel[=N] 时为 N，否则 1）")
+    parser.add_argument("--profile-out", default=None, metavar="PATH",
+                        help="写边计数 profile（JSON，供 rv32i_asm_improved.py --profile-layout 使用）")
+    args = parser.parse_args(argv)
+
+    threads = args.threads
+    if threads is None:
+        threads = 1
+        if args.nops != "raw":
+            from rv32i_policy import policy_threads
+            threads = policy_threads(args.nops)
+    words, dmem, img = load_program(args.program, opt=args.opt, shadow=args.shadow,
+                                    policy=args.nops)
+    if args.dmem:
+        dmem.update(load_dmem(args.dmem, args.dmem_base))
+    st = run(words, dmem, max_cycles=args.max_cycles, shadow=args.shadow, threads=threads)
+
+    base, ln = (int(x, 0) for x in args.dump.split(":"))
+    print(f"[SIM] {os.path.basename(args.program)}: {'HALT' if st['halted'] else 'NO HALT'}"
+          f"  cycles={st['cycles']}  insts={st['insts']}  stale reads={len(st['stale'])}")
+    for s, r in st["stale"][:10]:
+        print(f"  STALE  slot {s}: {ABI_NAME[r]}")
+    for i in range(base, base + ln):
+        v = st["mem"][i % DCACHE_WORDS]
+        print(f"  Dcache[{i:3d}] = 0x{v:08X}  ({_s32(v)})")
+    if args.profile_out:
+        if img is None:
+            print("[SIM] --profile-out 需要源文件输入", file=sys.stderr)
+            return 1
+        with open(args.profile_out, "w", encoding="utf-8") as f:
+            json.dump(edge_profile(img, st), f)
+        print(f"[输出] {args.profile_out}")
+    return 0 if st["halted"] and not st["stale"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
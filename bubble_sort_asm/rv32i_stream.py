@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+rv32i_stream.py  —  流式汇编（内存有界，用于超大的生成源文件）
+=============================================================================
+rv32i_asm_improved.assemble() 把整个文件 readlines() 进来，并同时持有 raw / lines /
+text_raw / instructions / encoded 几份完整副本；源文件到几 MB 时内存随之膨胀。
+流式模式把各阶段串成生成器，只常驻：
+
+  · 标签表（text 标签 → 字节 PC，rodata 标签 → 地址）—— 编码分支 / %hi/%lo 必需
+  · compute_nops 的 3 条指令滑动窗口 —— nops[i] 只取决于 i、i+1、i+2
+    （dist-1 看 i+1；dist-2 看 i+2 以及 i+1 的 dist-1 结果），结果与整表计算逐条相同
+
+【流程】（源文件被顺序读三遍，每遍都是 clean → iter_sections → iter_expand → 窗口）
+  扫描     : 累加字节 PC，记录标签地址、NOP / 冒险计数、rodata 字数
+  encoded  : 重读并逐条编码，边编码边交给 writer（listing / .vh 各读一遍）
+  rodata   : load_dcache 时重读，只取 .word
+  镜像 dict 与 assemble_lines() 的字段相同，只是 "encoded" / "rodata_data" 是可重复迭代的
+  惰性视图，所以 print_summary / write_listing / write_vh / image_result 原样复用，
+  输出文件与普通模式逐字节一致。
+
+【限制】
+  --opt / --shadow 需要整个程序的 CFG，不能流式进行；流式模式下不可用（也不自动追加改写库）。
+
+【命令行】
+  python rv32i_stream.py        big.s                   # 同 rv32i_asm_improved.py big.s
+  python rv32i_asm_improved.py  big.s --stream          # 同上
+  python rv32i_bench.py --sizes 100k,1M --variants improved,stream   # 对比峰值 RSS
+"""
+
+import os, sys
+
+from rv32i_asm_improved import (
+    DEFAULT_RODATA_BASE, DEFAULT_STACK_TOP, BYTES_PER_SLOT, ABI_NAME,
+    get_dest, get_sources, encode_one, clean, iter_sections, iter_expand, startup_stub,
+    phase, print_summary, write_listing, write_vh, image_result, metrics,
+)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  生成器管线
+# ─────────────────────────────────────────────────────────────────────────────
+def _sections(path):
+    """源文件 → iter_sections 流（逐行读取，不整体载入）"""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        yield from iter_sections(clean(f))
+
+def _text(items, stack_top, rod=None):
+    """section 流 → text 段条目流（前接启动存根）；rod 非 None 时顺带收集 rodata 标签与字数"""
+    yield from startup_stub(stack_top)
+    for kind, val in items:
+        if kind == 'WORD':
+            if rod is not None: rod["words"] += 1
+        elif kind == 'RLABEL':
+            if rod is not None: rod["labels"][val] = 4 * rod["words"]
+        else:
+            yield kind, val
+
+def _haz(rd, dist):
+    rn = ABI_NAME.get(rd, f"x{rd}")
+    return f"RAW {rn} (dist-1, +2 NOP)" if dist == 1 else f"RAW {rn} (dist-2, +1 NOP)"
+
+def with_nops(lin):
+    """
+    线性 IR 流 → (labels, inst, n_nop, haz) 流；labels 为紧挨在 inst 之前的标签列表。
+    compute_nops 的滑动窗口版本：窗口里最多 3 条指令，输出与 compute_nops 逐条相同。
+    流末尾（最后一条指令之后）的标签以 (labels, None, 0, '') 产出。
+    """
+    win  = []           # [(labels, inst, rd, srcs)]，最多 3 条
+    pend = []
+    def emit(last):
+        labels, inst, rd, _ = win[0]
+        n, h = 0, ''
+        if not last and rd is not None:
+            a = win[1]
+            if rd in a[3]:
+                n, h = 2, _haz(rd, 1)
+            if len(win) > 2 and rd in win[2][3]:
+                # i+1 在 Pass 1 的取值：i+1 与 i+2 之间的 dist-1 冒险
+                n1 = 2 if a[2] is not None and a[2] in win[2][3] else 0
+                if n + n1 < 1:
+                    n = 1
+                    h = h or _haz(rd, 2)
+        del win[0]
+        return labels, inst, n, h
+
+    for it in lin:
+        if len(it) == 2:
+            pend.append(it[1]); continue
+        win.append((pend, it, get_dest(it[0], it[1]), get_sources(it[0], it[1])))
+        pend = []
+        if len(win) == 3:
+            yield emit(False)
+    while win:
+        yield emit(len(win) == 1)
+    if pend:
+        yield pend, None, 0, ''
+
+def _stream(path, stack_top, rod=None):
+    return with_nops(iter_expand(_text(_sections(path), stack_top, rod)))
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  惰性视图：每次迭代重读源文件
+# ─────────────────────────────────────────────────────────────────────────────
+class _Encoded:
+    """img["encoded"] 的流式替身：迭代时逐条产出 encode_all 同格式的 9 元组"""
+    def __init__(self, path, stack_top, labels, n):
+        self.path, self.stack_top, self.labels, self.n = path, stack_top, labels, n
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        bpc = 0
+        for _, inst, n_nop, haz in _stream(self.path, self.stack_top):
+            if inst is None: break
+            emn, eargs, orig_mn, orig_args = inst
+            try:
+                word = encode_one(emn, eargs, bpc, self.labels)
+            except Exception as e:
+                raise RuntimeError(
+                    f"\n[编码错误] byte_pc={bpc}  {orig_mn} {orig_args}\n"
+                    f"  展开为: {emn} {eargs}\n  {e}"
+                )
+            yield (bpc, bpc // BYTES_PER_SLOT, word, orig_mn, orig_args,
+                   emn, eargs, n_nop, haz)
+            bpc += BYTES_PER_SLOT * (1 + n_nop)
+
+class _Rodata:
+    """img["rodata_data"] 的流式替身：len() 为扫描时的字数，迭代时重读 .word"""
+    def __init__(self, path, n):
+        self.path, self.n = path, n
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        for kind, val in _sections(self.path):
+            if kind == 'WORD': yield val
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  扫描 + 汇编
+# ─────────────────────────────────────────────────────────────────────────────
+def scan(path, rodata_base=DEFAULT_RODATA_BASE, stack_top=DEFAULT_STACK_TOP):
+    """
+    第一遍：只累加计数与标签地址，返回与 assemble_lines() 同字段的镜像 dict；
+    没有指令时返回 None。
+    """
+    rod = {"words": 0, "labels": {}}
+    text_labels = {}
+    n = total_nops = d1 = d2 = 0
+    bpc = halt = 0
+    for labels, inst, n_nop, haz in _stream(path, stack_top, rod):
+        for lbl in labels:
+            text_labels[lbl] = bpc
+        if inst is None: break
+        halt = bpc
+        n += 1
+        total_nops += n_nop
+        if 'dist-1' in haz: d1 += 1
+        elif 'dist-2' in haz: d2 += 1
+        bpc += BYTES_PER_SLOT * (1 + n_nop)
+    if n == 0:
+        return None
+
+    # 与 build_labels 相同：rodata 标签在前，同名时 text 标签覆盖
+    labels = {lbl: rodata_base + off for lbl, off in rod["labels"].items()}
+    labels.update(text_labels)
+    return {
+        "src_name":     os.path.basename(path),
+        "encoded":      _Encoded(path, stack_top, labels, n),
+        "labels":       labels,
+        "rodata_data":  _Rodata(path, rod["words"]),
+        "rodata_base":  rodata_base,
+        "stack_top":    stack_top,
+        "n_insts":      n,
+        "total_nops":   total_nops,
+        "total_slots":  n + total_nops,
+        "halt_byte_pc": halt,
+        "haz_d1":       d1,
+        "haz_d2":       d2,
+        "shadow":       None,
+    }
+
+def assemble(src_path, rodata_base=DEFAULT_RODATA_BASE, stack_top=DEFAULT_STACK_TOP,
+             timings=None, quiet=False):
+    """
+    流式汇编并写 <stem>.listing / <stem>.vh，接口与 rv32i_asm_improved.assemble() 相同
+    （不支持 opt / shadow）。编码发生在 writer 迭代时，耗时计入 write_listing / write_vh。
+    """
+    stem = os.path.splitext(src_path)[0]
+    with phase(timings, "scan"):
+        img = scan(src_path, rodata_base, stack_top)
+    if img is None:
+        print("[WARN] 没有找到任何指令", file=sys.stderr if quiet else sys.stdout); return {}
+
+    if not quiet:
+        print_summary(img)
+    with phase(timings, "write_listing"):
+        write_listing(img, stem + ".listing")
+    with phase(timings, "write_vh"):
+        write_vh(img, stem + ".vh")
+    if not quiet:
+        print(f"[输出] {stem}.listing")
+        print(f"[输出] {stem}.vh")
+
+    res = image_result(img)
+    if timings is not None:
+        res["metrics"] = metrics(img, timings)
+    return res
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="RV32I 流式汇编（内存有界）")
+    parser.add_argument("src",      help="汇编源文件 (.asm / .s)")
+    parser.add_argument("--rodata", default=None,
+                        help=f"rodata 字节基址（默认 0x{DEFAULT_RODATA_BASE:X}）")
+    parser.add_argument("--stack",  default=None,
+                        help=f"sp 初始值（默认 0x{DEFAULT_STACK_TOP:X}）")
+    args = parser.parse_args(argv)
+
+    rodata_base = int(args.rodata, 16) if args.rodata else DEFAULT_RODATA_BASE
+    stack_top   = int(args.stack,  16) if args.stack  else DEFAULT_STACK_TOP
+    assemble(args.src, rodata_base=rodata_base, stack_top=stack_top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+rv32i_superopt.py  —  热点小 kernel 的有界搜索超优化（无前递流水线代价模型）
+=============================================================================
+对象是基本块内连续的纯 ALU 指令段（R / I-ALU / 移位立即数 / lui，长度 2..--window），
+例如 findmin 循环体、fibonacci 的一步、sort 比较交换里的下标计算。
+
+  1. 取热点：按 --passes（默认 promote）优化后汇编，rv32i_sim 跑一遍得到每个 slot 的
+     执行次数，窗口权重 = 执行次数 ×（原 slot 数 - 最优 slot 数）
+  2. 规格：输入 = 窗口内先读后写的寄存器；输出 = 窗口结束时仍活跃的被写寄存器；
+     窗口内写过但已死亡的寄存器可作临时寄存器
+  3. 搜索：长度 1..--max-len 的序列，操作码取 RV32I ALU 全集，寄存器取 x0 / 输入 / 输出 / 临时，
+     立即数取窗口内出现的常数及其和差与 0 / ±1；代价 = 指令数 + compute_nops 插入的 NOP
+  4. 等价性：
+       · 随机 + 边界输入（0、±1、0x7FFFFFFF、0x80000000、31、32…）上逐个比较输出
+       · 汇编成独立镜像（stack_top=0，无启动桩）在 rv32i_sim 上复核，要求无 stale 读
+       · 符号检查：两边输出都是输入的线性式（add/sub/addi/slli/lui）时比较系数（mod 2^32），
+         相等记为 proof=symbolic，否则记为 proof=tested
+  5. 胜出序列写入改写库（默认 rv32i_rewrites.json，或环境变量 RV32I_REWRITES）：
+       {"pattern": ["addi R0,R1,1", ...], "replacement": [...], "live": ["R0"],
+        "slots": [before, after], "proof": "symbolic"|"tested", "origin": "file:label+ofs"}
+     寄存器按出现顺序记为 R0、R1…（x0 保持字面），live 之外被写的占位寄存器在命中处必须已死亡。
+
+  改写库只在显式给出 pass rewrites 时应用（rv32i_asm_improved.py --opt ...,rewrites，
+  批量 / 服务 / 缓存等经 assemble_lines(opt=...) 的入口同样如此，输出一致）；
+  rv32i_opt.py --passes ...,rewrites 可用 ISS 对比验证。默认只应用 symbolic 条目，
+  rewrites=all 连同 tested 条目一起应用。
+
+【命令行】
+  python rv32i_superopt.py  risc/*.s                          # 搜索并打印
+  python rv32i_superopt.py  risc/*.s --save                   # 胜出序列并入改写库
+  python rv32i_superopt.py  risc/findmin_rv32i_gen.s --passes peephole --max-len 3 --top 4
+"""
+
+import os, sys, json, time, random, argparse
+
+from rv32i_asm_improved import (
+    REGS, DEFAULT_RODATA_BASE, DEFAULT_STACK_TOP, REWRITES_PATH,
+    split_args, parse_int, assemble_lines, image_words,
+)
+from rv32i_opt import (
+    is_label, mk, reg_name, to_linear, liveness, slot_count, make_hook,
+    _window_cost, _compact, _fits12,
+)
+from rv32i_sim import run, dmem_from_image, _alu
+
+MASK32  = 0xFFFFFFFF
+DB_PATH = REWRITES_PATH
+
+_R_OPS  = ("add", "sub", "and", "or", "xor", "sll", "srl", "sra", "slt", "sltu")
+_I_OPS  = ("addi", "andi", "ori", "xori", "slti", "sltiu")
+_SH_OPS = ("slli", "srli", "srai")
+_COMMUTE = ("add", "and", "or", "xor")
+_EDGES  = (0, 1, 2, 31, 32, MASK32, 0x7FFFFFFF, 0x80000000, 0x55555555, 0xFFFFF800)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  ALU 指令 ⇄ (mn, rd, rs1, rs2, imm)
+# ─────────────────────────────────────────────────────────────────────────────
+def parse_alu(it):
+    """纯 ALU 指令 → (mn, rd, rs1, rs2, imm)；rd 为 x0、符号立即数或其它指令返回 None"""
+    if is_label(it): return None
+    mn, tok = it[0], split_args(it[1]) if it[1] else []
+    if len(tok) < 2 or tok[0] not in REGS or not REGS[tok[0]]:
+        return None
+    rd = REGS[tok[0]]
+    try:
+        if mn in _R_OPS and len(tok) == 3 and tok[1] in REGS and tok[2] in REGS:
+            return (mn, rd, REGS[tok[1]], REGS[tok[2]], None)
+        if mn in _I_OPS + _SH_OPS and len(tok) == 3 and tok[1] in REGS:
+            return (mn, rd, REGS[tok[1]], None, parse_int(tok[2]))
+        if mn == "lui" and len(tok) == 2:
+            return (mn, rd, None, None, parse_int(tok[1]))
+    except ValueError:
+        pass
+    return None
+
+def _text(op, name=reg_name):
+    mn, rd, a, b, imm = op
+    if mn == "lui":     return mn, f"{name(rd)},{imm}"
+    if b is not None:   return mn, f"{name(rd)},{name(a)},{name(b)}"
+    return mn, f"{name(rd)},{name(a)},{imm}"
+
+def to_inst(op):
+    return mk(*_text(op))
+
+def _exec(seq, R):
+    R = dict(R)
+    for mn, rd, a, b, imm in seq:
+        if mn == "lui":
+            v = (imm << 12) & MASK32
+        else:
+            x = R.get(a, 0) if a else 0
+            y = (R.get(b, 0) if b else 0) if b is not None else imm & MASK32
+            v = _alu(mn, x, y)
+        R[rd] = v
+    return R
+
+def _io(seq):
+    """(读前未写的寄存器, 被写的寄存器)，均按首次出现排序"""
+    ins, outs = [], []
+    for mn, rd, a, b, imm in seq:
+        for r in (a, b):
+            if r and r not in outs and r not in ins:
+                ins.append(r)
+        if rd not in outs:
+            outs.append(rd)
+    return ins, outs
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  等价性：测试向量 / ISS 复核 / 线性式符号检查
+# ─────────────────────────────────────────────────────────────────────────────
+def vectors(inputs, n_random=48, seed=533):
+    rng = random.Random(seed)
+    vecs = [{r: e for r in inputs} for e in _EDGES]
+    for i, r in enumerate(inputs):
+        for e in _EDGES:
+            v = {q: rng.getrandbits(32) for q in inputs}
+            v[r] = e
+            vecs.append(v)
+    vecs += [{r: rng.getrandbits(32) for r in inputs} for _ in range(n_random)]
+    return vecs
+
+def iss_equal(a, b, outs, vecs):
+    """两段序列分别汇编成独立镜像，在 ISS 上逐个向量比较输出寄存器"""
+    def image(seq):
+        lines = ["main:\n"] + ["    {} {}\n".format(*_text(op)) for op in seq] + ["    ret\n"]
+        return image_words(assemble_lines(lines, "<superopt>", stack_top=0))
+    wa, wb = image(a), image(b)
+    for v in vecs:
+        R = [0] * 32
+        for r, x in v.items(): R[r] = x
+        sa, sb = run(wa, regs=R, max_cycles=1000), run(wb, regs=R, max_cycles=1000)
+        if sa["stale"] or sb["stale"] or any(sa["regs"][o] != sb["regs"][o] for o in outs):
+            return False
+    return True
+
+def linear_form(seq, inputs):
+    """寄存器 → ({输入寄存器: 系数}, 常数) mod 2^32；非线性结果为 None"""
+    F = {r: ({r: 1}, 0) for r in inputs}
+    def get(r):
+        return ({}, 0) if r == 0 else F.get(r)
+    for mn, rd, a, b, imm in seq:
+        x = get(a) if a is not None else None
+        y = get(b) if b is not None else None
+        v = None
+        if mn == "lui":
+            v = ({}, (imm << 12) & MASK32)
+        elif mn in ("add", "sub") and x is not None and y is not None:
+            s = 1 if mn == "add" else -1
+            c = dict(x[0])
+            for r, k in y[0].items():
+                c[r] = (c.get(r, 0) + s * k) & MASK32
+            v = (c, (x[1] + s * y[1]) & MASK32)
+        elif mn == "addi" and x is not None:
+            v = (dict(x[0]), (x[1] + imm) & MASK32)
+        elif mn == "slli" and x is not None:
+            m = 1 << (imm & 31)
+            v = ({r: k * m & MASK32 for r, k in x[0].items()}, x[1] * m & MASK32)
+        if v is not None:
+            v = ({r: k for r, k in v[0].items() if k}, v[1])
+        F[rd] = v
+    return F
+
+def proof_of(a, b, inputs, outs):
+    fa, fb = linear_form(a, inputs), linear_form(b, inputs)
+    if all(fa.get(o) is not None and fa.get(o) == fb.get(o) for o in outs):
+        return "symbolic"
+    return "tested"
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  有界搜索
+# ─────────────────────────────────────────────────────────────────────────────
+def _imm_pool(window):
+    base = {imm for mn, rd, a, b, imm in window if imm is not None and mn not in _SH_OPS + ("lui",)}
+    pool = set(base) | {0, 1, -1}
+    pool |= {x + y for x in base for y in base} | {x - y for x in base for y in base}
+    sh = {imm for mn, rd, a, b, imm in window if mn in _SH_OPS} | {1, 2}
+    sh |= {x + y for x in sh for y in sh}
+    return sorted(v for v in pool if _fits12(v)), sorted(v for v in sh if 0 < v < 32)
+
+def _reorders(window):
+    """保持数据依赖（RAW / WAR / WAW）的全部重排，原顺序除外"""
+    n = len(window)
+    def dep(i, j):          # j 必须在 i 之后
+        a, b = window[i], window[j]
+        return a[1] in (b[2], b[3]) or b[1] in (a[2], a[3]) or a[1] == b[1]
+    def rec(order, left):
+        if not left:
+            if order != list(range(n)): yield [window[i] for i in order]
+            return
+        for j in left:
+            if not any(dep(i, j) for i in left if i != j and i < j):
+                yield from rec(order + [j], [i for i in left if i != j])
+    yield from rec([], list(range(n)))
+
+def _candidates(dests, srcs, imms):
+    imms, shamts = imms
+    for rd in dests:
+        for mn in _R_OPS:
+            for a in srcs:
+                for b in srcs:
+                    if mn in _COMMUTE and b < a: continue
+                    yield (mn, rd, a, b, None)
+        for a in srcs:
+            for mn in _I_OPS:
+                for imm in imms:
+                    yield (mn, rd, a, None, imm)
+            for mn in _SH_OPS:
+                for imm in shamts:
+                    yield (mn, rd, a, None, imm)
+
+def search(window, outs, max_len=2, budget_s=20.0):
+    """
+    window : [(mn, rd, rs1, rs2, imm)]
+    outs   : 必须保持的输出寄存器
+    返回 (best_seq, slots, proof)；没有更优序列时返回 None。
+    """
+    inputs, written = _io(window)
+    temps = [r for r in written if r not in outs]
+    dests = list(outs) + temps
+    imms = _imm_pool(window)
+    # 被写寄存器的初值也随机化：没有写到的输出不会“碰巧”等于期望值
+    vecs = vectors(list(dict.fromkeys(inputs + dests)))
+    want = [tuple(_exec(window, v).get(o, 0) for o in outs) for v in vecs]
+    first = vecs[0]
+    best, best_cost = None, slot_count([to_inst(op) for op in window])
+    deadline = time.perf_counter() + budget_s
+
+    def check(seq):
+        return all(tuple(_exec(seq, v).get(o, 0) for o in outs) == w for v, w in zip(vecs, want))
+
+    def dfs(seq, state, written_, L):
+        nonlocal best, best_cost
+        if len(seq) == L:
+            if tuple(state.get(o, 0) for o in outs) != want[0] or not check(seq):
+                return
+            c = slot_count([to_inst(op) for op in seq])
+            if c < best_cost and iss_equal(window, seq, outs, vecs):
+                best, best_cost = list(seq), c
+            return
+        if time.perf_counter() > deadline:
+            return
+        srcs = [0] + [r for r in dict.fromkeys(inputs + written_)]
+        last = len(seq) == L - 1
+        for op in _candidates(outs if last and len(outs) == 1 else dests, srcs, imms):
+            if seq and op[1] == seq[-1][1] and seq[-1][1] not in (op[2], op[3]):
+                continue            # 覆盖上一条结果而不读它：等价于更短的序列
+            dfs(seq + [op], _exec([op], state), written_ + [op[1]], L)
+
+    for seq in _reorders(window):          # 先试重排：只调度、不换指令
+        c = slot_count([to_inst(op) for op in seq])
+        if c < best_cost and check(seq) and iss_equal(window, seq, outs, vecs):
+            best, best_cost = seq, c
+    for L in range(len(outs), max_len + 1):
+        if L >= best_cost or L >= len(window) and best is not None \
+                or time.perf_counter() > deadline:
+            break
+        found = best
+        dfs([], dict(first), [], L)
+        if best is not found:
+            break                   # 更短的序列 slot 下界更低，找到即停
+    if best is None:
+        return None
+    return best, best_cost, proof_of(window, best, inputs, outs)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  取热点窗口
+# ─────────────────────────────────────────────────────────────────────────────
+def _where(lin, k):
+    lbl, ofs = "<entry>", 0
+    for j in range(k - 1, -1, -1):
+        if is_label(lin[j]) and lin[j][1]:
+            lbl = lin[j][1]; break
+        if not is_label(lin[j]): ofs += 1
+    return f"{lbl}+{ofs}"
+
+def hot_windows(raw, src_name, passes="promote", max_window=4,
+                rodata_base=DEFAULT_RODATA_BASE, stack_top=DEFAULT_STACK_TOP):
+    """返回 [(hits, where, window_ops, outs)]，按执行次数降序"""
+    report, got = {}, {}
+    inner = make_hook(passes, report)
+    def hook(instructions, labels_by_idx, ctx=None):
+        ins, lbls = inner(instructions, labels_by_idx, ctx)
+        got["lin"] = to_linear(ins, lbls)
+        return ins, lbls
+    img = assemble_lines(raw, src_name, rodata_base=rodata_base, stack_top=stack_top, opt=hook)
+    lin = got["lin"]
+    st = run(image_words(img), dmem_from_image(img))
+    slot_of, i = {}, 0
+    for k, it in enumerate(lin):
+        if not is_label(it):
+            slot_of[k] = img["encoded"][i][1]; i += 1
+    live = liveness(lin)
+    out, seen = [], set()
+    k = 0
+    while k < len(lin):
+        run_ = []
+        while k < len(lin) and parse_alu(lin[k]) is not None:
+            run_.append(k); k += 1
+        k += 1
+        for lo in range(len(run_)):
+            for hi in range(lo + 2, min(len(run_), lo + max_window) + 1):
+                ks = run_[lo:hi]
+                ops = [parse_alu(lin[j]) for j in ks]
+                _, written = _io(ops)
+                outs = [r for r in written if live[ks[-1]] >> r & 1]
+                key = (tuple(ops), tuple(outs))
+                if not outs or key in seen: continue
+                seen.add(key)
+                out.append((st["counts"][slot_of[ks[0]]], f"{src_name}:{_where(lin, ks[0])}", ops, outs))
+    out.sort(key=lambda w: -w[0])
+    return out
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  改写库
+# ─────────────────────────────────────────────────────────────────────────────
+def _canon(ops, names=None):
+    """寄存器 → 占位 R0、R1…（x0 保持字面）；返回 (文本列表, names)"""
+    names = {} if names is None else names
+    def name(r):
+        if r == 0: return "x0"
+        return names.setdefault(r, f"R{len(names)}")
+    return [" ".join(_text(op, name)) for op in ops], names
+
+def make_entry(window, outs, best, slots, proof, origin):
+    pat, names = _canon(window)
+    rep, _ = _canon(best, names)
+    return {"pattern": pat, "replacement": rep, "live": [names[o] for o in outs],
+            "slots": [slot_count([to_inst(op) for op in window]), slots],
+            "proof": proof, "origin": origin}
+
+def load_db(path=None):
+    path = path or DB_PATH
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("rewrites", [])
+
+def save_db(entries, path=None):
+    path = path or DB_PATH
+    db = {(tuple(e["pattern"]), tuple(e["live"])): e for e in load_db(path)}
+    for e in entries:
+        k = (tuple(e["pattern"]), tuple(e["live"]))
+        if k not in db or e["slots"][1] < db[k]["slots"][1]:
+            db[k] = e
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "rewrites": list(db.values())}, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(tmp, path)
+    return len(db)
+
+def _match(entry, ops):
+    """pattern 与具体指令序列匹配 → 占位名 → 寄存器号；不匹配返回 None"""
+    if len(ops) != len(entry["pattern"]):
+        return None
+    pat, names = _canon(ops)
+    if pat != entry["pattern"]:
+        return None
+    return {v: r for r, v in names.items()}
+
+def _subst(text, bind):
+    mn, _, args = text.partition(" ")
+    toks = [bind.get(t, t) for t in args.split(",")]
+    return mk(mn, ",".join(reg_name(t) if isinstance(t, int) else t for t in toks))
+
+def apply_db(lin, report, mode="symbolic", path=None):
+    """
+    rv32i_opt 的 pass rewrites：在 lin 上应用改写库。
+    命中要求：live 之外被写的占位寄存器在窗口之后不活跃，且替换后局部 slot 数减少。
+    """
+    entries = [e for e in load_db(path) if mode == "all" or e.get("proof") == "symbolic"]
+    out = report.setdefault("rewrites", {"entries": len(entries), "applied": 0})
+    if not entries:
+        return lin
+    lens = sorted({len(e["pattern"]) for e in entries}, reverse=True)
+    changed = True
+    while changed:
+        changed = False
+        live = liveness(lin)
+        for k in range(len(lin)):
+            for n in lens:
+                ks = lin[k:k + n]
+                ops = [parse_alu(it) for it in ks]
+                if len(ks) < n or None in ops: continue
+                for e in entries:
+                    bind = _match(e, ops)
+                    if bind is None: continue
+                    dead = {bind[p] for p in bind if p not in e["live"]} & {op[1] for op in ops}
+                    if any(live[k + n - 1] >> r & 1 for r in dead): continue
+                    repl = [_subst(t, bind) for t in e["replacement"]]
+                    if _window_cost(lin, k, k + n, repl) >= _window_cost(lin, k, k + n):
+                        continue
+                    lin[k:k + n] = repl
+                    out["applied"] += 1
+                    changed = True
+                    break
+                if changed: break
+            if changed: break
+    return _compact(lin)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RV32I 小 kernel 有界搜索超优化")
+    parser.add_argument("src", nargs="+", help="汇编源文件 (.asm / .s)")
+    parser.add_argument("--passes", default="promote", help="取热点前先跑的 pass（默认 promote）")
+    parser.add_argument("--window", type=int, default=4, help="窗口最大指令数（默认 4）")
+    parser.add_argument("--max-len", type=int, default=2, help="搜索序列最大长度（默认 2）")
+    parser.add_argument("--top", type=int, default=8, help="每个文件搜索的热点窗口数（默认 8）")
+    parser.add_argument("--budget", type=float, default=20.0, help="每个窗口的搜索时间上限（秒）")
+    parser.add_argument("--db", default=None, help=f"改写库路径（默认 {os.path.basename(DB_PATH)}）")
+    parser.add_argument("--save", action="store_true", help="把胜出序列并入改写库")
+    args = parser.parse_args(argv)
+
+    found = []
+    for src in args.src:
+        with open(src, encoding="utf-8", errors="replace") as f:
+            raw = f.readlines()
+        wins = [w for w in hot_windows(raw, os.path.basename(src), args.passes, args.window) if w[0]]
+        print(f"[SUPEROPT] {src}: {len(wins)} executed ALU windows, searching top {args.top}")
+        for hits, where, ops, outs in wins[:args.top]:
+            t0 = time.perf_counter()
+            res = search(ops, outs, args.max_len, args.budget)
+            before = slot_count([to_inst(op) for op in ops])
+            ms = (time.perf_counter() - t0) * 1e3
+            print(f"  {where:<28} ×{hits:<6} {before} slots  live-out "
+                  f"{','.join(reg_name(o) for o in outs):<10} {ms:8.1f} ms")
+            for op in ops:
+                print(f"      {' '.join(_text(op))}")
+            if res is None:
+                continue
+            best, slots, proof = res
+            print(f"    → {slots} slots  [{proof}]  ≈{(before - slots) * hits} cycles")
+            for op in best:
+                print(f"      {' '.join(_text(op))}")
+            found.append(make_entry(ops, outs, best, slots, proof, where))
+    print(f"[SUPEROPT] {len(found)} rewrites found")
+    if args.save and found:
+        n = save_db(found, args.db)
+        print(f"[输出] {args.db or DB_PATH}  ({n} entries)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+rv32i_watch.py  —  watch：源文件保存即重新汇编、只推送变化的字、重跑并打印结果
+=============================================================================
+上板调试的循环是：改 .s → 汇编 → run_hw.sh（整块 imem / dmem 逐字写入）→ 手动读结果。
+watch 常驻一个进程把这些串起来：
+
+  监视   : 轮询源文件 (mtime_ns, size)，默认每 50 ms 一次；发现变化后等待 debounce
+           （默认 100 ms）内不再变化才处理，编辑器的“写临时文件 + rename”也能正确识别
+  汇编   : rv32i_incr.IncrementalAssembler（进程内缓存，只重新分析改动的函数）
+  diff   : 新镜像与上次加载的镜像逐字比较
+             imem : slot → word（镜像外的 slot 视为 NOP）
+             dmem : Dcache word → value（.rodata，基址 = rodata_base / 4；镜像外视为 0）
+  推送   : 只写变化的字
+             --target sim   : 修补常驻的 word 列表 / dmem，rv32i_sim.run() 从复位开始重跑
+             --target board : pip_reg freeze → imem_write / dmem_write（仅变化的字）
+                              → unfreeze → 运行 --run-secs → freeze → dmem_read 结果区
+  结果   : 打印 Dcache[--result BASE:LEN]（默认 180:6，同 run_hw.sh）和保存→结果的延迟
+
+  板子上的 dmem 在两次运行之间不会复位：程序写过的栈 / 结果区保留上次的值，
+  只有镜像本身（.rodata）变化的字会被重写；程序若依赖未初始化的 Dcache，请用 --full。
+
+【命令行】
+  python rv32i_watch.py  risc/sort_rv32i.s                              # ISS，默认
+  python rv32i_watch.py  risc/sort_rv32i.s --result 180:6 --once        # 只跑一次
+  python rv32i_watch.py  bubble.s --target board --pip-reg ../netfpga/sw/pip_reg --run-secs 0.05
+  python rv32i_watch.py  bubble.s --target board --full                 # 每次整块写入（同 run_hw.sh）
+"""
+
+import os, sys, time, argparse, subprocess
+
+from rv32i_asm_improved import (
+    DEFAULT_RODATA_BASE, DEFAULT_STACK_TOP, NOP_WORD, ICACHE_WORDS, DCACHE_WORDS, image_words,
+)
+from rv32i_incr import IncrementalAssembler
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  镜像 → 字表，diff
+# ─────────────────────────────────────────────────────────────────────────────
+def image_mem(img):
+    """镜像 dict → (imem, dmem)，均为 {word 地址: 值}"""
+    imem = dict(enumerate(image_words(img)))
+    base = img["rodata_base"] // 4
+    dmem = {base + i: v for i, v in enumerate(img["rodata_data"])}
+    return imem, dmem
+
+def diff_mem(old, new, fill):
+    """old 为 None（首次加载）时返回 new 的全部字；否则返回变化的字（消失的字写回 fill）"""
+    if old is None:
+        return dict(new)
+    out = {a: v for a, v in new.items() if old.get(a, fill) != v}
+    for a in old:
+        if a not in new and old[a] != fill:
+            out[a] = fill
+    return out
+
+def parse_range(s):
+    """'180:6' → (180, 6)"""
+    base, _, n = s.partition(":")
+    return int(base, 0), int(n or "1", 0)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  目标：ISS / 板子（pip_reg）
+# ─────────────────────────────────────────────────────────────────────────────
+class SimTarget:
+    """常驻的 Icache / Dcache 镜像，由 rv32i_sim 从复位开始重跑"""
+    name = "sim"
+
+    def __init__(self, max_cycles=1_000_000):
+        self.imem = [NOP_WORD] * ICACHE_WORDS
+        self.dmem = {}
+        self.max_cycles = max_cycles
+
+    def push(self, imem_diff, dmem_diff):
+        for a, v in imem_diff.items():
+            if a >= len(self.imem):
+                self.imem.extend([NOP_WORD] * (a + 1 - len(self.imem)))
+            self.imem[a] = v
+        for a, v in dmem_diff.items():
+            if v: self.dmem[a] = v
+            else: self.dmem.pop(a, None)
+
+    def run(self, result):
+        from rv32i_sim import run
+        st = run(self.imem, dict(self.dmem), max_cycles=self.max_cycles)
+        base, n = result
+        vals = [st["mem"][(base + i) % DCACHE_WORDS] for i in range(n)]
+        note = f"cycles={st['cycles']}" + ("" if st["halted"] else "  (未 HALT)")
+        if st["stale"]:
+            note += f"  stale reads={len(st['stale'])}"
+        return vals, note
+
+class BoardTarget:
+    """通过 pip_reg（regwrite / regread 的 Perl 包装）访问 NetFPGA 上的核"""
+    name = "board"
+
+    def __init__(self, pip_reg, run_secs=0.05):
+        self.pip_reg, self.run_secs = pip_reg, run_secs
+
+    def _pip(self, *args):
+        out = subprocess.run([self.pip_reg, *map(str, args)], stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(f"pip_reg {' '.join(map(str, args))} 失败:\n{out.stdout}")
+        return out.stdout
+
+    def push(self, imem_diff, dmem_diff):
+        self._pip("freeze")
+        for a, v in sorted(imem_diff.items()):
+            self._pip("imem_write", f"0x{a:X}", f"0x{v:08x}")
+        for a, v in sorted(dmem_diff.items()):
+            self._pip("dmem_write", f"0x{a:X}", f"0x{v:08x}")
+
+    def run(self, result):
+        self._pip("unfreeze")
+        time.sleep(self.run_secs)
+        self._pip("freeze")
+        base, n = result
+        vals = []
+        for i in range(n):
+            out = self._pip("dmem_read", f"0x{base + i:X}")
+            # 输出格式：DMEM[<addr>] = 0x%08x
+            vals.append(int(out.split("=")[-1].split()[0], 16))
+        return vals, f"ran {self.run_secs}s"
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  watch 主循环
+# ─────────────────────────────────────────────────────────────────────────────
+def _stamp(path):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+class Watcher:
+    def __init__(self, src, target, result=(180, 6), rodata_base=DEFAULT_RODATA_BASE,
+                 stack_top=DEFAULT_STACK_TOP, full=False, out=sys.stdout):
+        self.src, self.target, self.result = src, target, result
+        self.rodata_base, self.stack_top = rodata_base, stack_top
+        self.full, self.out = full, out
+        self.asm = IncrementalAssembler()        # 只用进程内缓存
+        self.loaded = (None, None)               # 上次推送的 (imem, dmem)
+
+    def rebuild(self, t_change=None):
+        """
+        重新汇编 → diff → 推送 → 运行 → 打印；返回结果值列表（汇编失败时 None）。
+        t_change 为发现变化的时刻，延迟从它算起（含 debounce 等待）
+        """
+        t0 = time.perf_counter()
+        t_change = t0 if t_change is None else t_change
+        name = os.path.basename(self.src)
+        try:
+            with open(self.src, encoding="utf-8", errors="replace") as f:
+                raw = f.readlines()
+            img = self.asm.assemble_lines(raw, name, rodata_base=self.rodata_base,
+                                          stack_top=self.stack_top)
+            if img is None:
+                raise ValueError("没有找到任何指令")
+        except Exception as e:
+            print(f"[WATCH] {name}: 汇编失败，保留上次镜像\n  {str(e).strip()}", file=self.out)
+            return None
+        t_asm = time.perf_counter()
+
+        imem, dmem = image_mem(img)
+        old_i, old_d = (None, None) if self.full else self.loaded
+        di = diff_mem(old_i, imem, NOP_WORD)
+        dd = diff_mem(old_d, dmem, 0)
+        self.target.push(di, dd)
+        self.loaded = (imem, dmem)
+        t_push = time.perf_counter()
+
+        vals, note = self.target.run(self.result)
+        t_run = time.perf_counter()
+
+        st = self.asm.stats
+        base, n = self.result
+        print(f"[WATCH] {name}: {img['n_insts']} insts / {img['total_slots']} slots, "
+              f"re-analyzed {st['reanalyzed'] or '[]'}; "
+              f"push imem {len(di)} dmem {len(dd)} words → {self.target.name}", file=self.out)
+        print(f"  Dcache[{base}..{base + n - 1}] = "
+              f"{' '.join(str(v - (1 << 32) if v & 0x80000000 else v) for v in vals)}"
+              f"   {note}", file=self.out)
+        print(f"  latency {1e3 * (t_run - t_change):.0f} ms  (debounce {1e3 * (t0 - t_change):.0f}, "
+              f"asm {1e3 * (t_asm - t0):.0f}, "
+              f"push {1e3 * (t_push - t_asm):.0f}, run {1e3 * (t_run - t_push):.0f})",
+              file=self.out, flush=True)
+        return vals
+
+    def loop(self, interval=0.05, debounce=0.1):
+        """轮询 + debounce；Ctrl-C 退出"""
+        last = _stamp(self.src)
+        self.rebuild()
+        print(f"[WATCH] watching {self.src}（Ctrl-C 退出）", file=self.out, flush=True)
+        try:
+            while True:
+                time.sleep(interval)
+                cur = _stamp(self.src)
+                if cur == last or cur is None:
+                    continue
+                t_change = time.perf_counter()
+                # debounce：直到 debounce 时间内不再变化
+                while True:
+                    time.sleep(debounce)
+                    nxt = _stamp(self.src)
+                    if nxt == cur: break
+                    cur = nxt
+                last = cur
+                self.rebuild(t_change)
+        except KeyboardInterrupt:
+            print("\n[WATCH] stop", file=self.out)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  命令行入口
+# ─────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RV32I watch：保存即汇编、增量推送、重跑")
+    parser.add_argument("src",      help="汇编源文件 (.asm / .s)")
+    parser.add_argument("--target", choices=["sim", "board"], default="sim")
+    parser.add_argument("--pip-reg", default=os.path.join("..", "netfpga", "sw", "pip_reg"),
+                        help="pip_reg 路径（--target board）")
+    parser.add_argument("--run-secs", type=float, default=0.05, help="板上运行时间（秒）")
+    parser.add_argument("--result", default="180:6", metavar="BASE:LEN",
+                        help="打印的 Dcache 结果区（word 地址，默认 180:6）")
+    parser.add_argument("--rodata", default=None,
+                        help=f"rodata 字节基址（默认 0x{DEFAULT_RODATA_BASE:X}）")
+    parser.add_argument("--stack",  default=None,
+                        help=f"sp 初始值（默认 0x{DEFAULT_STACK_TOP:X}）")
+    parser.add_argument("--interval", type=float, default=0.05, help="轮询间隔（秒）")
+    parser.add_argument("--debounce", type=float, default=0.1, help="debounce 时间（秒）")
+    parser.add_argument("--max-cycles", type=int, default=1_000_000, help="ISS 周期上限")
+    parser.add_argument("--full", action="store_true", help="每次写入整个镜像（不做 diff）")
+    parser.add_argument("--once", action="store_true", help="只汇编、推送、运行一次")
+    args = parser.parse_args(argv)
+
+    rodata_base = int(args.rodata, 16) if args.rodata else DEFAULT_RODATA_BASE
+    stack_top   = int(args.stack,  16) if args.stack  else DEFAULT_STACK_TOP
+    if args.target == "board":
+        target = BoardTarget(args.pip_reg, args.run_secs)
+    else:
+        target = SimTarget(args.max_cycles)
+    w = Watcher(args.src, target, parse_range(args.result), rodata_base, stack_top,
+                full=args.full)
+    if args.once:
+        return 0 if w.rebuild() is not None else 1
+    w.loop(args.interval, args.debounce)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
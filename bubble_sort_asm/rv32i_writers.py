@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+rv32i_writers.py  —  镜像 dict 的输出：终端摘要 / .listing / .vh / imem.hex + dmem.hex
+=============================================================================
+输入是 rv32i_asm_improved.make_image() 产出的镜像 dict，这里只做格式化与写文件。
+从 rv32i_asm_improved 拆出来是为了启动：python rv32i_asm_improved.py 每次运行都要
+重新编译脚本本身（__main__ 不走 __pycache__），writer 放在独立模块里则直接加载字节码。
+
+  rv32i_asm_improved 从这里导入并原样 re-export，
+  其它脚本继续写 from rv32i_asm_improved import write_vh … 即可。
+"""
+
+from rv32i_isa import BYTES_PER_SLOT, NOP_WORD
+
+def slot_labels(img):
+    """slot → [label,...]（仅 text 标签）"""
+    slot2lbl = {}
+    for lbl, bpc_ in img["labels"].items():
+        if bpc_ < img["rodata_base"]:
+            slot2lbl.setdefault(bpc_ // BYTES_PER_SLOT, []).append(lbl)
+    return slot2lbl
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  统计 & 打印
+# ─────────────────────────────────────────────────────────────────────────────
+def print_summary(img):
+    N           = img["n_insts"]
+    total_nops  = img["total_nops"]
+    total_slots = img["total_slots"]
+    halt_byte_pc = img["halt_byte_pc"]
+    stack_top   = img["stack_top"]
+    rodata_base = img["rodata_base"]
+    rodata_data = img["rodata_data"]
+
+    print(f"\n{'='*65}")
+    policy = img.get("policy", "raw")
+    if policy == "raw":
+        print(f" assemble succeed（RAW dependency of NOP insert）")
+    else:
+        print(f" assemble succeed（NOP policy: {policy}）")
+    print(f"  real instr  : {N}")
+    print(f"  inserts NOPs : {total_nops}  (compared {N*2}，save {N*2 - total_nops} )")
+    print(f"  total slots    : {total_slots}  (compared {N*3}，decreased {N*3 - total_slots} slots)")
+    print(f"  HALT byte PC: {halt_byte_pc}  (slot {halt_byte_pc//4})")
+    if img.get("shadow") is not None:
+        sh = img["shadow"]
+        print(f"  branch shadow: hoist {sh['hoist']}  target {sh['target']}  nop {sh['nop']}"
+              f"  （需要 RTL BRANCH_SHADOW=1）")
+    print(f"  STACK_TOP   : 0x{stack_top:04X} = {stack_top}")
+    print(f"  RODATA_BASE : 0x{rodata_base:04X} → Dcache word {rodata_base//4}")
+    if rodata_data:
+        print(f"  .rodata     : {len(rodata_data)} words → Dcache[{rodata_base//4}..{rodata_base//4+len(rodata_data)-1}]")
+    print(f"\n  RAW hazard counts:")
+    print(f"    dist-1（+2 NOP）: {img['haz_d1']} ")
+    print(f"    dist-2（+1 NOP）: {img['haz_d2']} ")
+    print(f"\n  tag address:")
+    for k, v in sorted(img["labels"].items(), key=lambda x: x[1]):
+        if v < rodata_base:
+            print(f"    {k:25s} byte={v:5d}  slot={v//4:4d}")
+        else:
+            print(f"    {k:25s} byte=0x{v:04X}  Dcache word {v//4}")
+    print(f"{'='*65}\n")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  生成 Listing
+# ─────────────────────────────────────────────────────────────────────────────
+def write_listing(img, path):
+    N           = img["n_insts"]
+    total_nops  = img["total_nops"]
+    total_slots = img["total_slots"]
+    slot2lbl    = slot_labels(img)
+    prov        = img.get("provenance")
+
+    with open(path, "w", encoding="utf-8") as lf:
+        lf.write(f"RV32I Listing — {img['src_name']}\n")
+        lf.write(f"  RODATA_BASE=0x{img['rodata_base']:04X}  STACK_TOP=0x{img['stack_top']:04X}\n")
+        lf.write(f"  {N} insts  {total_nops} NOPs  {total_slots} slots  "
+                 f"HALT byte PC={img['halt_byte_pc']}\n")
+        lf.write(f"  dist-1 hazards={img['haz_d1']}(+2NOP)  dist-2 hazards={img['haz_d2']}(+1NOP)\n")
+        if img.get("policy", "raw") != "raw":
+            lf.write(f"  NOP policy: {img['policy']}\n")
+        lf.write("─" * 82 + "\n")
+        lf.write(f"{'BytePC':>7} {'Slot':>5}  {'Hex':>10}  {'Assembly':<36} Hazard\n")
+        lf.write("─" * 82 + "\n")
+
+        for i, (bpc, slot_idx, word, orig_mn, orig_args,
+                emn, eargs, n_nop, haz) in enumerate(img["encoded"]):
+            for lbl in slot2lbl.get(slot_idx, []):
+                lf.write(f"{'':>7} {'':>5}  {'':>10}  <{lbl}>:\n")
+            asm_str = f"{orig_mn} {orig_args}".strip()
+            src = f"  ← L{prov[i][0]}" if prov and prov[i] else ""
+            lf.write(f"{bpc:7d} {slot_idx:5d}  0x{word:08X}  {asm_str:<36} {haz}{src}\n")
+            for k in range(n_nop):
+                lf.write(f"{'':>7} {slot_idx+1+k:5d}  0x{NOP_WORD:08X}  (NOP)\n")
+
+        lf.write("─" * 82 + "\n")
+        lf.write(f"Total: {N} instructions, {total_slots} slots"
+                 f"  (fixed-2-NOP would be {N*3} slots, saved {N*3-total_slots})\n")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  生成 Verilog .vh
+# ─────────────────────────────────────────────────────────────────────────────
+def write_vh(img, path):
+    N            = img["n_insts"]
+    total_slots  = img["total_slots"]
+    halt_byte_pc = img["halt_byte_pc"]
+    stack_top    = img["stack_top"]
+    rodata_base  = img["rodata_base"]
+    rodata_data  = img["rodata_data"]
+    slot2lbl     = slot_labels(img)
+
+    with open(path, "w", encoding="utf-8") as vf:
+        vf.write(f"// {'='*60}\n")
+        policy = img.get("policy", "raw")
+        vf.write(f"// Auto-generated by rv32i_asm.py "
+                 f"({'RAW-aware NOP insertion' if policy == 'raw' else 'NOP policy: ' + policy})\n")
+        vf.write(f"// Source : {img['src_name']}\n")
+        vf.write(f"// Insts  : {N}   NOPs inserted: {img['total_nops']}   Slots: {total_slots}\n")
+        vf.write(f"// HALT byte PC = {halt_byte_pc}  (slot {halt_byte_pc//4})\n")
+        if img.get("shadow") is not None:
+            vf.write("// BRANCH SHADOW: 需以 pipeline_datapath #(.BRANCH_SHADOW(1)) 运行\n")
+        vf.write(f"// STACK_TOP    = 0x{stack_top:04X} = {stack_top}\n")
+        vf.write(f"// RODATA_BASE  = 0x{rodata_base:04X} → Dcache word {rodata_base//4}\n")
+        if rodata_data:
+            s0_est  = stack_top - 4
+            arr_est = s0_est - 44
+            vf.write(f"// Array result (bubble sort): arr_base≈0x{arr_est:04X}"
+                     f" → Dcache word {arr_est//4}..{arr_est//4+len(rodata_data)-1}\n")
+        vf.write(f"// {'='*60}\n\n")
+
+        # ── load_icache ───────────────────────────────────────────────────────
+        vf.write("// ─────────────────────────────────────────────\n")
+        vf.write("// Task: load_icache\n")
+        vf.write("// ─────────────────────────────────────────────\n")
+        vf.write("task load_icache;\n")
+        vf.write("integer _ki;\n")
+        vf.write("begin\n")
+        vf.write("    for (_ki = 0; _ki < 512; _ki = _ki + 1)\n")
+        vf.write("        dut.Imm.mem[_ki] = 32'h00000013; // NOP\n\n")
+
+        for (bpc, slot_idx, word, orig_mn, orig_args,
+             emn, eargs, n_nop, haz) in img["encoded"]:
+            lbls = slot2lbl.get(slot_idx, [])
+            if lbls:
+                vf.write(f"    // ── {'  '.join('<'+l+'>' for l in lbls)}"
+                         f" (byte {bpc}) ──\n")
+            asm_str = f"{orig_mn} {orig_args}".strip()
+            haz_com = f"  // {haz}" if haz else ""
+            vf.write(f"    dut.Imm.mem[{slot_idx:3d}] = 32'h{word:08X};"
+                     f" // {asm_str}{haz_com}\n")
+            for k in range(n_nop):
+                vf.write(f"    dut.Imm.mem[{slot_idx+1+k:3d}] = 32'h{NOP_WORD:08X}; // NOP\n")
+
+        vf.write(f"\n    $display(\"[ICACHE] {N} insts, {total_slots} slots,"
+                 f" HALT byte PC={halt_byte_pc}\");\n")
+        vf.write("end\nendtask\n\n")
+
+        # ── load_dcache ───────────────────────────────────────────────────────
+        vf.write("// ─────────────────────────────────────────────\n")
+        vf.write("// Task: load_dcache\n")
+        if rodata_data:
+            vf.write(f"// .rodata → Dcache word {rodata_base//4}"
+                     f"..{rodata_base//4+len(rodata_data)-1}\n")
+        vf.write("// ★ 修改测试数据只需改此 task ★\n")
+        vf.write("// ─────────────────────────────────────────────\n")
+        vf.write("task load_dcache;\n")
+        vf.write("integer _kd;\n")
+        vf.write("begin\n")
+        vf.write("    for (_kd = 0; _kd < 512; _kd = _kd + 1)\n")
+        vf.write("        dut.mm_stage_inst.Dmm.mem[_kd] = 32'h00000000;\n\n")
+
+        if rodata_data:
+            vf.write(f"    // .rodata (.LC0 等) → Dcache word {rodata_base//4} 起\n")
+            vf.write(f"    // ★ 修改测试输入请改这里 ★\n")
+            bw = rodata_base // 4
+            for idx, val in enumerate(rodata_data):
+                sv = val if val < 0x80000000 else val - 0x100000000
+                vf.write(f"    dut.mm_stage_inst.Dmm.mem[{bw+idx}]"
+                         f" = 32'h{val & 0xFFFFFFFF:08X}; // {sv}\n")
+            vf.write(f"\n    // ★ 输入快照（用于完整性验证）★\n")
+            vf.write(f"    for (i = 0; i < ARR_LEN; i = i + 1)\n")
+            vf.write(f"        input_snapshot[i] = dut.mm_stage_inst.Dmm.mem[{bw} + i];\n")
+        else:
+            vf.write("    // 无 .rodata；如需预设数据请在此添加\n")
+
+        vf.write(f"\n    $display(\"[DCACHE] 数据预加载完成\");\n")
+        vf.write("end\nendtask\n")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  生成 imem.hex / dmem.hex（netfpga/sw/run_hw.sh 经 pip_reg 逐字写入）
+#
+#  bash norm_hex 规则：无 0x 前缀的数值被当作十六进制，带地址的行地址也按十六进制解析，
+#  因此使用【无地址顺序格式】：每行一个 0x<WORD>，bash 从 base word 起自动递增地址。
+#    imem : load_mem_file imem imem.hex 0
+#    dmem : load_mem_file dmem dmem.hex $DMEM_BASE_WORD（须等于 rodata_base // 4）
+# ─────────────────────────────────────────────────────────────────────────────
+def write_hex(img, imem_path, dmem_path):
+    N            = img["n_insts"]
+    halt_byte_pc = img["halt_byte_pc"]
+    rodata_base  = img["rodata_base"]
+    rodata_data  = img["rodata_data"]
+    slot2lbl     = slot_labels(img)
+
+    with open(imem_path, "w", encoding="utf-8") as hf:
+        hf.write(f"# imem.hex — generated from {img['src_name']}\n")
+        hf.write(f"# {N} insts  {img['total_nops']} NOPs  {img['total_slots']} slots"
+                 f"  (NOP policy: {img.get('policy', 'raw')})\n")
+        hf.write(f"# HALT byte PC={halt_byte_pc}  (word slot {halt_byte_pc//4})\n")
+        hf.write(f"# STACK_TOP=0x{img['stack_top']:04X}  RODATA_BASE=0x{rodata_base:04X}\n")
+        hf.write(f"# Format: 0x<word>  # comment  (sequential, bash auto-increments from word 0)\n")
+        hf.write(f"# bash: load_mem_file imem imem.hex 0\n")
+        hf.write("#\n")
+        for (bpc, slot_idx, word, orig_mn, orig_args,
+             emn, eargs, n_nop, haz) in img["encoded"]:
+            lbls = slot2lbl.get(slot_idx, [])
+            if lbls:
+                hf.write(f"# <{'  '.join(lbls)}> (byte {bpc}, slot {slot_idx})\n")
+            asm_str = f"{orig_mn} {orig_args}".strip()
+            haz_str = f"  [{haz}]" if haz else ""
+            hf.write(f"0x{word:08X}  # [{slot_idx}] {asm_str}{haz_str}\n")
+            for k in range(n_nop):
+                hf.write(f"0x{NOP_WORD:08X}  # [{slot_idx+1+k}] NOP\n")
+
+    with open(dmem_path, "w", encoding="utf-8") as hf:
+        hf.write(f"# dmem.hex — generated from {img['src_name']}\n")
+        hf.write(f"# .rodata: {len(rodata_data)} words\n")
+        hf.write(f"# Dcache word base = {rodata_base//4}  (RODATA_BASE=0x{rodata_base:04X})\n")
+        hf.write(f"# bash: DMEM_BASE_WORD={rodata_base//4} load_mem_file dmem dmem.hex {rodata_base//4}\n")
+        hf.write(f"# Format: 0x<word>  # comment  (sequential, auto-increments from DMEM_BASE_WORD)\n")
+        hf.write("#\n")
+        if rodata_data:
+            for idx, val in enumerate(rodata_data):
+                sv = val if val < 0x80000000 else val - 0x100000000
+                hf.write(f"0x{val & 0xFFFFFFFF:08X}  # [{rodata_base//4 + idx}] {sv}\n")
+        else:
+            hf.write("# (no .rodata data)\n")
@@ -10,6 +10,9 @@ DMEM_BASE_WORD="${DMEM_BASE_WORD:-256}"
 RESULT_BASE_WORD="${RESULT_BASE_WORD:-180}"
 RESULT_LEN="${RESULT_LEN:-6}"
 
+# 可选：上板前 RAW 冒险检查（RV32I_LINT=path/to/rv32i_lint.py）
+RV32I_LINT="${RV32I_LINT:-}"
+
 norm_hex32() {
   local x="$1"
   x="${x//_/}"
@@ -60,6 +63,11 @@ load_mem_file_seq_or_addr() {
   done < "$file"
 }
 
+if [[ -n "$RV32I_LINT" ]]; then
+  echo "[0] lint $IMEM_FILE"
+  python3 "$RV32I_LINT" --quiet "$IMEM_FILE"
+fi
+
 echo "[1] freeze"
 "$PIP_REG" freeze
 
@@ -1,4 +1,6 @@
-module id_stage (
+module id_stage #(
+  parameter BRANCH_SHADOW = 0     // 1: jal/jalr link PC+8 (skip the caller's shadow slot)
+) (
   input  wire        clk,
   input  wire        rst,
 
@@ -84,8 +86,8 @@ assign is_jalr = (opcode == 7'b1100111) && (funct3 == 3'b000);
 
 assign jal_jalr = is_jal | is_jalr | is_lui | is_auipc;
 
-// CHANGED: pc+4 (byte)
-assign pc_plus4     = pc_in + 11'd4;
+// CHANGED: pc+4 (byte); branch-shadow mode links past the shadow slot
+assign pc_plus4     = pc_in + (BRANCH_SHADOW ? 11'd8 : 11'd4);
 assign pc_u32       = {21'd0, pc_in};
 assign pc_plus4_u32 = {21'd0, pc_plus4};
 
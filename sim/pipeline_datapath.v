@@ -2,6 +2,12 @@
 //`include "../include/registers.v"
 
 module pipeline_datapath
+#(
+    // 1: branch-shadow mode. The slot fetched behind a taken branch/jump is NOT
+    //    flushed (executes like a delay slot) and jal/jalr link PC+8.
+    //    Only for images built with rv32i_asm_improved.py --shadow.
+    parameter BRANCH_SHADOW = 0
+)
 (
     input clk,
     input rst
@@ -115,7 +121,7 @@ if_id_reg if_id_reg_inst (
   .clk      (clk),
   .rst      (rst),
   .enable   (en_reg),
-  .wist     (flush_in),
+  .wist     (BRANCH_SHADOW ? 1'b0 : flush_in),
   .pc_in    (pc_if),
   .inst_in  (instr_in),
   .pc_out   (pc_id),
@@ -124,7 +130,7 @@ if_id_reg if_id_reg_inst (
 );
 
 // -------------------- ID stage --------------------
-id_stage id_stage_inst (
+id_stage #(.BRANCH_SHADOW(BRANCH_SHADOW)) id_stage_inst (
   .clk        (clk),
   .rst        (rst),
   .pc_in      (pc_id),
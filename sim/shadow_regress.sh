@@ -0,0 +1,58 @@
+#!/usr/bin/env bash
+# 分支影子槽模式的 Icarus 回归：同一源文件按基线（冲刷）与 BRANCH_SHADOW=1 各汇编 / 仿真一次，
+# Dcache / 寄存器终值与周期须与 rv32i_sim 预期一致，两种模式的 Dcache 终值须相同，并报告节省的周期。
+#
+#   ./shadow_regress.sh                         # 默认 ../bubble_sort_asm/risc/*.s
+#   ./shadow_regress.sh a.s b.s                 # 指定源文件
+#   OPT=promote ./shadow_regress.sh             # 先跑 rv32i_opt pass
+#   SIM=verilator ./shadow_regress.sh           # 用 Verilator（≥ 5，--timing）代替 Icarus；没有 iverilog 时自动选用
+set -euo pipefail
+
+cd "$(dirname "$0")"
+ASM_DIR="../bubble_sort_asm"
+OUT="${OUT:-build/shadow}"
+PASSES="${OPT:-}"; unset OPT     # verilated.mk 把 OPT 当编译选项，不能传下去
+PY="${PYTHON:-python3}"
+
+if [ "$#" -gt 0 ]; then SRCS=("$@"); else SRCS=("$ASM_DIR"/risc/*.s); fi
+if [ -z "${SIM:-}" ]; then
+  if command -v iverilog >/dev/null; then SIM=iverilog
+  elif command -v verilator >/dev/null; then SIM=verilator
+  else echo "[SHADOW] neither iverilog nor verilator found" >&2; exit 2; fi
+fi
+command -v "$SIM" >/dev/null || { echo "[SHADOW] $SIM not found" >&2; exit 2; }
+
+RTL=(pipeline_datapath.v pc.v if_id_reg.v id_stage.v reg_files.v id_ex_reg.v ex_stage.v alu.v
+     ex_mm_reg.v mm_stage.v mm_wb_reg.v wb_stage.v I_Dmm/Icache.v I_Dmm/Dcache.v)
+
+rm -rf "$OUT" && mkdir -p "$OUT"
+"$PY" "$ASM_DIR/rv32i_shadow.py" "${SRCS[@]}" --emit "$OUT" ${PASSES:+--opt "$PASSES"}
+
+# GCC 的 <coroutine> 需显式 -fcoroutines（Verilator --timing 生成的 C++ 用到协程）
+VL_CFLAGS=()
+if [ "$SIM" = verilator ] &&
+   echo 'int main(){}' | "${CXX:-g++}" -fcoroutines -x c++ -fsyntax-only - 2>/dev/null; then
+  VL_CFLAGS=(-CFLAGS -fcoroutines)
+fi
+
+for mode in flush shadow; do
+  p=0; [ "$mode" = shadow ] && p=1
+  if [ "$SIM" = iverilog ]; then
+    iverilog -g2005 -s tb_shadow -P "tb_shadow.SHADOW=$p" -o "$OUT/tb_$mode.vvp" \
+      testbench/tb_shadow.v "${RTL[@]}"
+  else
+    verilator --binary --timing -Wno-fatal -Wno-lint -Wno-style "${VL_CFLAGS[@]}" \
+      --top-module tb_shadow -GSHADOW=$p -Mdir "$OUT/vl_$mode" -o tb \
+      testbench/tb_shadow.v "${RTL[@]}" >"$OUT/vl_$mode.log"
+  fi
+done
+
+for args in "$OUT"/*.args; do
+  mode="${args%.args}"; mode="${mode##*.}"
+  if [ "$SIM" = iverilog ]; then run=(vvp -n "$OUT/tb_$mode.vvp"); else run=("$OUT/vl_$mode/tb"); fi
+  # shellcheck disable=SC2046
+  "${run[@]}" $(cat "$args") >"${args%.args}.log"
+done
+
+echo "[SHADOW] RTL ($SIM) vs ISS"
+"$PY" "$ASM_DIR/rv32i_shadow.py" --check-rtl "$OUT"
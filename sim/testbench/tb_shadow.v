@@ -0,0 +1,84 @@
+`timescale 1ns/1ps
+
+// ============================================================================
+//  tb_shadow.v
+//  Generic image runner for the branch-shadow regression (shadow_regress.sh).
+//  Build once per mode:
+//    iverilog -P tb_shadow.SHADOW=0 ...   (baseline: shadow slot flushed)
+//    iverilog -P tb_shadow.SHADOW=1 ...   (BRANCH_SHADOW: shadow slot executes)
+//    (or verilator --binary --timing -GSHADOW=0/1, see SIM=verilator in shadow_regress.sh)
+//  Run per program (files written by rv32i_shadow.py --emit):
+//    vvp tb.vvp +imem=X.imem.hex +dmem=X.dmem.hex +halt=<byte pc>
+//               +dump=X.dump.hex +regs=X.regs.hex +cycles=X.cycles
+//
+//  cycles = ID cycle of the HALT slot, slot 0 in ID = cycle 0 (same as rv32i_sim).
+//  A jump to byte PC 0 (main returning with jr ra) also stops, at +2 cycles.
+//  +halt is the last slot of the image; it only stops the run if that slot holds the
+//  HALT word (a program ending in jr ra has its jr there and stops on the jump instead).
+// ============================================================================
+
+module tb_shadow;
+
+parameter CLK_PERIOD = 10;
+parameter MAX_CYCLES = 200000;
+parameter SHADOW     = 0;
+localparam HALT_WORD = 32'h00000063;   // beq x0,x0,0
+
+reg clk, rst;
+initial clk = 1'b0;
+always #(CLK_PERIOD/2) clk = ~clk;
+
+pipeline_datapath #(.BRANCH_SHADOW(SHADOW)) dut (
+  .clk (clk),
+  .rst (rst)
+);
+
+reg [8*512-1:0] imem_path, dmem_path, dump_path, regs_path, cycles_path;
+integer halt_pc, n, fd, stop;
+
+initial begin
+  if (!$value$plusargs("imem=%s", imem_path) || !$value$plusargs("dmem=%s", dmem_path) ||
+      !$value$plusargs("halt=%d", halt_pc)   || !$value$plusargs("dump=%s", dump_path) ||
+      !$value$plusargs("regs=%s", regs_path) || !$value$plusargs("cycles=%s", cycles_path)) begin
+    $display("usage: +imem= +dmem= +halt= +dump= +regs= +cycles=");
+    $finish;
+  end
+
+  rst = 1'b1;
+  @(posedge clk); #1;
+  @(posedge clk); #1;
+  $readmemh(imem_path, dut.Imm.mem);
+  $readmemh(dmem_path, dut.mm_stage_inst.Dmm.mem);
+  rst = 1'b0;
+
+  // the first edge after reset moves slot 0 into ID
+  stop = 0;
+  for (n = 0; n < MAX_CYCLES && !stop; n = n + 1) begin
+    @(posedge clk); #1;
+    if (dut.pc_id == halt_pc[10:0] && !dut.flush_out &&
+        dut.Imm.mem[dut.pc_id[10:2]] == HALT_WORD) begin
+      stop = 1;
+    end else if (dut.jump_valid_id && dut.addr_id == 11'd0) begin
+      stop = 2;
+    end
+  end
+
+  if (!stop) begin
+    $display("[SHADOW=%0d] TIMEOUT after %0d cycles", SHADOW, MAX_CYCLES);
+    $finish;
+  end
+  n = n - 1 + (stop == 2 ? 2 : 0);
+
+  // let the instructions ahead of the stop slot drain through MEM / WB
+  repeat (4) @(posedge clk);
+  #1;
+  $writememh(dump_path, dut.mm_stage_inst.Dmm.mem);
+  $writememh(regs_path, dut.id_stage_inst.u_reg_files.regs);
+  fd = $fopen(cycles_path, "w");
+  $fdisplay(fd, "%0d", n);
+  $fclose(fd);
+  $display("[SHADOW=%0d] stop=%0d cycles=%0d", SHADOW, stop, n);
+  $finish;
+end
+
+endmodule